@@ -44,6 +44,8 @@ class User(AbstractUser):
         indexes = [
             models.Index(fields=['email']),
             models.Index(fields=['username']),
+            # Patient directory and name lookups
+            models.Index(fields=['last_name', 'first_name']),
         ]
 
     def __str__(self):
@@ -108,7 +108,7 @@ class ActivityLogAdmin(admin.ModelAdmin):
 
 from website.archive_models import (
     ArchivedPatientInfo, ArchivedDependentPatient, ArchivedAppointment,
-    ArchivedMedicalRecord, ArchivedDoctorInfo, DeletedRecord
+    ArchivedMedicalRecord, ArchivedDoctorInfo, DeletedRecord, ArchiveJob
 )
 
 @admin.register(ArchivedPatientInfo)
@@ -147,4 +147,10 @@ class DeletedRecordAdmin(admin.ModelAdmin):
     list_display = ['model_name', 'original_id', 'object_repr', 'deleted_at', 'deleted_by']
     search_fields = ['object_repr', 'model_name', 'original_id']
     list_filter = ['deleted_at', 'model_name']
-    readonly_fields = ['deleted_at', 'data_snapshot']
\ No newline at end of file
+    readonly_fields = ['deleted_at', 'data_snapshot']
+
+@admin.register(ArchiveJob)
+class ArchiveJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'days', 'archived_count', 'total_estimate', 'created_at', 'heartbeat_at']
+    list_filter = ['status']
+    readonly_fields = ['last_appointment_id', 'last_dependent_appointment_id', 'heartbeat_at']
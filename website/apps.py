@@ -1,6 +1,60 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 class WebsiteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'website'  
 
+    def ready(self):
+        from website.services.search import install_search_indexes
+        post_migrate.connect(install_search_indexes, sender=self)
+        from website.services.record_search import install_record_search
+        post_migrate.connect(install_record_search, sender=self)
+
+        # Calendar/availability ETags
+        from website.models import (
+            Appointment, DependentAppointment, DoctorAvailability, CustomDoctorAvailability
+        )
+        from website.services import calendar_sync, versioning
+        for model in (Appointment, DependentAppointment):
+            post_save.connect(versioning.appointment_changed, sender=model)
+            post_delete.connect(versioning.appointment_changed, sender=model)
+            # Delta sync tombstones
+            post_save.connect(calendar_sync.appointment_saved, sender=model)
+            post_delete.connect(calendar_sync.appointment_deleted, sender=model)
+        for model in (DoctorAvailability, CustomDoctorAvailability):
+            post_save.connect(versioning.availability_changed, sender=model)
+            post_delete.connect(versioning.availability_changed, sender=model)
+
+        # People typeahead index
+        from accounts.models import Phone, User
+        from website.models import PatientInfo, DependentPatient, DoctorInfo
+        from website.services import person_search
+        post_save.connect(person_search.patient_saved, sender=PatientInfo)
+        post_save.connect(person_search.dependent_saved, sender=DependentPatient)
+        post_save.connect(person_search.doctor_saved, sender=DoctorInfo)
+        for model in (PatientInfo, DependentPatient, DoctorInfo):
+            post_delete.connect(person_search.person_deleted, sender=model)
+        post_save.connect(person_search.user_saved, sender=User)
+        post_save.connect(person_search.phone_changed, sender=Phone)
+        post_delete.connect(person_search.phone_changed, sender=Phone)
+
+        # Patient details fragment cache
+        from website.models import (
+            PatientVitals, PatientMedication, PatientAllergy,
+            DependentPatientVitals, DependentPatientMedication, DependentPatientAllergy,
+            MedicalRecord,
+        )
+        for model in (PatientInfo, DependentPatient):
+            post_save.connect(versioning.patient_changed, sender=model)
+            post_delete.connect(versioning.patient_changed, sender=model)
+        for model in (
+            PatientVitals, PatientMedication, PatientAllergy,
+            DependentPatientVitals, DependentPatientMedication, DependentPatientAllergy,
+            MedicalRecord,
+        ):
+            post_save.connect(versioning.patient_data_changed, sender=model)
+            post_delete.connect(versioning.patient_data_changed, sender=model)
+        for model in (User, Phone):
+            post_save.connect(versioning.patient_user_changed, sender=model)
+        post_delete.connect(versioning.patient_user_changed, sender=Phone)
@@ -35,6 +35,10 @@ class ArchivedPatientInfo(models.Model):
         ordering = ['-archived_at']
         verbose_name = 'Archived Patient Info'
         verbose_name_plural = 'Archived Patient Info'
+        indexes = [
+            # Keyset pagination: ORDER BY archived_at DESC, id DESC
+            models.Index(fields=['archived_at', 'id'], name='archived_patient_at_idx'),
+        ]
     
     def __str__(self):
         return f"Archived: {self.original_patient_id} - {self.user_full_name}"
@@ -70,6 +74,10 @@ class ArchivedDependentPatient(models.Model):
         ordering = ['-archived_at']
         verbose_name = 'Archived Dependent Patient'
         verbose_name_plural = 'Archived Dependent Patients'
+        indexes = [
+            # Keyset pagination: ORDER BY archived_at DESC, id DESC
+            models.Index(fields=['archived_at', 'id'], name='archived_dependent_at_idx'),
+        ]
     
     def __str__(self):
         return f"Archived: {self.original_patient_id} - {self.first_name} {self.last_name}"
@@ -88,6 +96,11 @@ class ArchivedAppointment(models.Model):
     end_time = models.DateTimeField()
     status = models.CharField(max_length=20)
     
+    # Indexed links to the original patient / dependent / doctor
+    original_patient_id = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    original_dependent_id = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    original_doctor_id = models.IntegerField(blank=True, null=True, db_index=True)
+    
     # Audit fields
     archived_at = models.DateTimeField(default=timezone.now)
     archived_by = models.ForeignKey(
@@ -104,6 +117,10 @@ class ArchivedAppointment(models.Model):
         ordering = ['-archived_at']
         verbose_name = 'Archived Appointment'
         verbose_name_plural = 'Archived Appointments'
+        indexes = [
+            # Keyset pagination: ORDER BY archived_at DESC, id DESC
+            models.Index(fields=['archived_at', 'id'], name='archived_appt_at_idx'),
+        ]
     
     def __str__(self):
         return f"Archived Appointment #{self.original_appointment_id}: {self.patient_name}"
@@ -120,6 +137,11 @@ class ArchivedMedicalRecord(models.Model):
     diagnosis = models.TextField()
     created_at = models.DateTimeField()
     
+    # Indexed links to the original patient / dependent / doctor
+    original_patient_id = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    original_dependent_id = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    original_doctor_id = models.IntegerField(blank=True, null=True, db_index=True)
+    
     # Store prescriptions as JSON
     prescriptions = models.JSONField(default=list, blank=True)
     
@@ -139,6 +161,10 @@ class ArchivedMedicalRecord(models.Model):
         ordering = ['-archived_at']
         verbose_name = 'Archived Medical Record'
         verbose_name_plural = 'Archived Medical Records'
+        indexes = [
+            # Keyset pagination: ORDER BY archived_at DESC, id DESC
+            models.Index(fields=['archived_at', 'id'], name='archived_record_at_idx'),
+        ]
     
     def __str__(self):
         return f"Archived Record #{self.original_record_id}: {self.patient_name}"
@@ -177,6 +203,10 @@ class ArchivedDoctorInfo(models.Model):
         ordering = ['-archived_at']
         verbose_name = 'Archived Doctor Info'
         verbose_name_plural = 'Archived Doctor Info'
+        indexes = [
+            # Keyset pagination: ORDER BY archived_at DESC, id DESC
+            models.Index(fields=['archived_at', 'id'], name='archived_doctor_at_idx'),
+        ]
     
     def __str__(self):
         return f"Archived Doctor: {self.user_full_name}"
@@ -204,6 +234,63 @@ class DeletedRecord(models.Model):
         ordering = ['-deleted_at']
         verbose_name = 'Deleted Record'
         verbose_name_plural = 'Deleted Records'
+        indexes = [
+            # Keyset pagination: ORDER BY deleted_at DESC, id DESC
+            models.Index(fields=['deleted_at', 'id'], name='deleted_record_at_idx'),
+        ]
     
     def __str__(self):
-        return f"Deleted {self.model_name} #{self.original_id} at {self.deleted_at}"
\ No newline at end of file
+        return f"Deleted {self.model_name} #{self.original_id} at {self.deleted_at}"
+
+class ArchiveJob(models.Model):
+    """Background appointment archival job processed by the archive_worker command"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    days = models.PositiveIntegerField(default=90)
+    cutoff = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+
+    # Resumable cursors: highest primary key already scanned in each table
+    # (rows skipped while locked sit below it until the worker rewinds)
+    last_appointment_id = models.BigIntegerField(default=0)
+    last_dependent_appointment_id = models.BigIntegerField(default=0)
+
+    total_estimate = models.PositiveIntegerField(default=0)
+    archived_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archive_jobs'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Archive Job'
+        verbose_name_plural = 'Archive Jobs'
+
+    def __str__(self):
+        return f"Archive job #{self.pk} ({self.status}): older than {self.days} days"
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    @property
+    def progress_percent(self):
+        if not self.total_estimate:
+            return 100 if self.status == 'completed' else 0
+        return min(100, round(self.archived_count * 100 / self.total_estimate))
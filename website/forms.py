@@ -312,12 +312,12 @@ class DependentPatientVitalsForm(forms.ModelForm):
 class PatientAllergyForm(forms.ModelForm):
     class Meta:
         model = PatientAllergy
-        exclude = ("patient", "created_by")
+        exclude = ("patient", "created_by", "recorded_at")
 
 class DependentPatientAllergyForm(forms.ModelForm):
     class Meta:
         model = DependentPatientAllergy
-        exclude = ("dependent_patient", "created_by")
+        exclude = ("dependent_patient", "created_by", "recorded_at")
 
 # Medications
 class PatientMedicationForm(forms.ModelForm):
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from website.services.archive_worker import ArchiveWorker, parse_quiet_hours
+
+
+class Command(BaseCommand):
+    help = "Process queued appointment archival jobs in throttled batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows-per-sec', type=float,
+            default=getattr(settings, 'ARCHIVE_WORKER_ROWS_PER_SEC', 50),
+            help="Maximum appointments archived per second (0 disables throttling)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'ARCHIVE_WORKER_BATCH_SIZE', 200),
+            help="Appointments archived per transaction"
+        )
+        parser.add_argument(
+            '--quiet-hours',
+            default=getattr(settings, 'ARCHIVE_WORKER_QUIET_HOURS', ''),
+            help='Comma separated local-time windows, e.g. "22:00-06:00". Empty means any time.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=int, default=30,
+            help="Seconds to sleep when there is nothing to do"
+        )
+        parser.add_argument(
+            '--enqueue-days', type=int,
+            help="Queue a job for appointments older than this many days before starting"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Process the pending jobs and exit instead of running as a daemon"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            quiet_hours = parse_quiet_hours(options['quiet_hours'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        worker = ArchiveWorker(
+            rows_per_second=options['rows_per_sec'],
+            batch_size=options['batch_size'],
+            quiet_hours=quiet_hours,
+            log=self.stdout.write,
+        )
+
+        if options['enqueue_days'] is not None:
+            job = worker.enqueue(options['enqueue_days'])
+            self.stdout.write(f"Queued {job}")
+
+        if not options['once']:
+            self.stdout.write("Archive worker started")
+            worker.run_forever(poll_interval=options['poll_interval'])
+            return
+
+        if not worker.in_quiet_hours():
+            self.stdout.write("Outside quiet hours, nothing to do")
+            return
+
+        while True:
+            job = worker.next_job()
+            if job is None:
+                break
+            worker.run_job(job)
+            if job.status == 'running':
+                break  # paused at the end of the quiet-hours window
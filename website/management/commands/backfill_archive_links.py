@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from website.models import PatientInfo
+from website.archive_models import ArchivedPatientInfo, ArchivedAppointment, ArchivedMedicalRecord
+
+
+class Command(BaseCommand):
+    help = "Fill the indexed patient/dependent/doctor link columns of archived rows from additional_data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Rows updated per transaction"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Archived appointments store the patient's User id; map it to the PatientInfo id,
+        # whether the patient is still active or has been archived too
+        patient_ids = dict(ArchivedPatientInfo.objects.values_list('user_id', 'original_patient_id'))
+        patient_ids.update(PatientInfo.objects.values_list('user_id', 'patient_id'))
+
+        updated = self._backfill(
+            ArchivedAppointment.objects.filter(
+                original_patient_id__isnull=True,
+                original_dependent_id__isnull=True,
+                original_doctor_id__isnull=True,
+            ),
+            lambda archived: self._appointment_links(archived, patient_ids),
+            batch_size,
+        )
+        self.stdout.write(f"Archived appointments linked: {updated}")
+
+        updated = self._backfill(
+            ArchivedMedicalRecord.objects.filter(
+                original_patient_id__isnull=True,
+                original_dependent_id__isnull=True,
+            ).exclude(Q(patient_id_str='') | Q(patient_id_str__isnull=True)),
+            self._medical_record_links,
+            batch_size,
+        )
+        self.stdout.write(f"Archived medical records linked: {updated}")
+
+    def _backfill(self, queryset, resolve, batch_size):
+        """Resolve links for every row of `queryset` and bulk_update them in batches"""
+        fields = ['original_patient_id', 'original_dependent_id', 'original_doctor_id']
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                return updated
+            last_pk = batch[-1].pk
+
+            changed = []
+            for archived in batch:
+                for field, value in resolve(archived).items():
+                    setattr(archived, field, value)
+                if any(getattr(archived, field) is not None for field in fields):
+                    changed.append(archived)
+
+            with transaction.atomic():
+                queryset.model.objects.bulk_update(changed, fields)
+            updated += len(changed)
+
+    @staticmethod
+    def _appointment_links(archived, patient_ids):
+        data = archived.additional_data or {}
+        links = {'original_doctor_id': data.get('doctor_id')}
+        if archived.appointment_type == 'dependent':
+            links['original_dependent_id'] = data.get('dependent_patient_id')
+        else:
+            links['original_patient_id'] = patient_ids.get(data.get('patient_id'))
+        return links
+
+    @staticmethod
+    def _medical_record_links(archived):
+        # Patient ids are prefixed "P", dependent ids "D" (see generate_patient_id)
+        if archived.patient_id_str.startswith('D'):
+            return {'original_dependent_id': archived.patient_id_str}
+        return {'original_patient_id': archived.patient_id_str}
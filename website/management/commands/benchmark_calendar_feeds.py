@@ -0,0 +1,84 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from website.models import Appointment, DependentAppointment, DoctorInfo
+from website.services import calendar_feeds
+from website.services.calendar_sync import event_id
+
+
+def _instance_events(querysets, limit):
+    """The previous instance-based feed, kept here as the baseline"""
+    events = []
+    for appointment_type, _, relation in calendar_feeds.SOURCES:
+        for a in querysets[appointment_type].select_related(relation).order_by('start_time')[:limit]:
+            patient = getattr(a, relation)
+            name = patient.get_full_name() if appointment_type == 'self' else patient.full_name
+            events.append({
+                "id": event_id(appointment_type, a.id),
+                "title": f"{name} ({a.status})",
+                "start": a.start_time.isoformat(),
+                "end": a.end_time.isoformat(),
+                "color": calendar_feeds.STATUS_COLORS.get(a.status, calendar_feeds.DEFAULT_COLOR),
+            })
+    return events
+
+
+class Command(BaseCommand):
+    help = "Time the calendar event feed builders (instances, values, columnar) per event, with payload size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, help="DoctorInfo id; default is the whole clinic")
+        parser.add_argument('--days', type=int, default=31, help="Window length from today")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per builder")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=options['days'])
+        filters = {'start_time__gte': start, 'start_time__lt': end}
+        if options['doctor']:
+            if not DoctorInfo.objects.filter(pk=options['doctor']).exists():
+                raise CommandError(f"Doctor {options['doctor']} does not exist")
+            filters['doctor_id'] = options['doctor']
+
+        def querysets():
+            return {
+                'self': Appointment.objects.filter(**filters),
+                'dependent': DependentAppointment.objects.filter(**filters),
+            }
+
+        limit = getattr(settings, 'CALENDAR_MAX_EVENTS', 2000)
+        builders = (
+            ('instances', _instance_events),
+            ('values', calendar_feeds.calendar_events),
+            ('columnar', calendar_feeds.calendar_columns),
+        )
+        for label, build in builders:
+            with CaptureQueriesContext(connection) as captured:
+                payload = build(querysets(), limit)
+            queries = len(captured)
+            count = len(payload['id']) if isinstance(payload, dict) else len(payload)
+
+            timings = []
+            for _ in range(options['repeat']):
+                began = time.perf_counter()
+                body = json.dumps(build(querysets(), limit), cls=DjangoJSONEncoder)
+                timings.append(time.perf_counter() - began)
+                reset_queries()
+
+            best = min(timings)
+            per_event = best / count * 1e6 if count else 0.0
+            self.stdout.write(
+                f"{label:<10} {count} events, {queries} queries, {len(body)} bytes, "
+                f"best {best * 1000:.2f} ms, {per_event:.1f} µs/event"
+            )
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from website.services import partitioning
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions and detach/drop expired ones (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table', choices=sorted(partitioning.TABLES), action='append',
+            help="Only process this table (repeatable); default is all tables"
+        )
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="Rebuild unpartitioned tables as partitioned ones first (locks the table during the copy)"
+        )
+        parser.add_argument(
+            '--months-ahead', type=int,
+            default=getattr(settings, 'PARTITION_MONTHS_AHEAD', 3),
+            help="Keep partitions ready for this many future months"
+        )
+        parser.add_argument(
+            '--drop', action='store_true',
+            help="Drop expired partitions instead of only detaching them"
+        )
+
+    def handle(self, *args, **options):
+        if not partitioning.supported():
+            raise CommandError("Table partitioning requires PostgreSQL")
+        if options['months_ahead'] < 0:
+            raise CommandError("--months-ahead cannot be negative")
+
+        retention = getattr(settings, 'PARTITION_RETENTION_MONTHS', {})
+        for name in options['table'] or sorted(partitioning.TABLES):
+            partitioned = partitioning.TABLES[name]
+
+            if not partitioning.is_partitioned(partitioned):
+                if not options['convert']:
+                    self.stdout.write(f"{name}: not partitioned (run with --convert)")
+                    continue
+                try:
+                    partitioning.convert(partitioned, options['months_ahead'])
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(f"{name}: converted to monthly partitions")
+
+            for created in partitioning.ensure_partitions(partitioned, options['months_ahead']):
+                self.stdout.write(f"{name}: created {created}")
+
+            keep_months = retention.get(name)
+            if keep_months is None:
+                continue
+            for expired in partitioning.expire_partitions(partitioned, keep_months, drop=options['drop']):
+                self.stdout.write(f"{name}: {'dropped' if options['drop'] else 'detached'} {expired}")
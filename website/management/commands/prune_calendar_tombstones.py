@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from website.services import calendar_sync
+
+
+class Command(BaseCommand):
+    help = "Delete calendar delta-sync tombstones older than the sync retention window"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            default=getattr(settings, 'CALENDAR_SYNC_RETENTION_DAYS', 7),
+            help="Delete tombstones older than this many days"
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        deleted = calendar_sync.prune(cutoff)
+        self.stdout.write(f"Deleted {deleted} tombstones older than {cutoff:%Y-%m-%d}")
@@ -0,0 +1,58 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from website.services.archive_service import DELETE_CHUNK_SIZE, DeleteService
+
+
+class Command(BaseCommand):
+    help = "Permanently delete test or duplicate rows of a website model, with the usual deletion audit trail"
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help="Model name, e.g. Appointment or MedicalRecord")
+        parser.add_argument(
+            '--ids', nargs='+', default=[],
+            help="Primary keys to delete"
+        )
+        parser.add_argument(
+            '--ids-file',
+            help="File with one primary key per line"
+        )
+        parser.add_argument('--reason', default='', help="Deletion reason recorded on every row")
+        parser.add_argument('--user', help="Username recorded as the deleting user")
+        parser.add_argument(
+            '--chunk-size', type=int, default=DELETE_CHUNK_SIZE,
+            help="Rows snapshotted and deleted per statement"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only count the matching rows")
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model('website', options['model'])
+        except LookupError:
+            raise CommandError(f"Unknown model '{options['model']}'")
+
+        ids = list(options['ids'])
+        if options['ids_file']:
+            with open(options['ids_file']) as f:
+                ids.extend(line.strip() for line in f if line.strip())
+        if not ids:
+            raise CommandError("Pass --ids or --ids-file")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user '{options['user']}'")
+
+        queryset = model._base_manager.filter(pk__in=ids)
+        if options['dry_run']:
+            self.stdout.write(f"{queryset.count()} {model.__name__} rows would be deleted")
+            return
+
+        deleted = DeleteService.delete_queryset_with_audit(
+            queryset, user, options['reason'], chunk_size=options['chunk_size']
+        )
+        self.stdout.write(f"Deleted {deleted} {model.__name__} rows")
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from website.services import person_search
+
+
+class Command(BaseCommand):
+    help = "Regenerate the people typeahead index (PersonSearchToken) from patients, dependents and doctors"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            people = person_search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f"Indexed {people} people in {time.monotonic() - started:.1f}s")
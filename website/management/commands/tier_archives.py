@@ -0,0 +1,60 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from website.services import cold_storage
+
+
+class Command(BaseCommand):
+    help = "Move aged archive rows into compressed cold-storage segments, or look rows up there"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            default=getattr(settings, 'ARCHIVE_COLD_AFTER_DAYS', 365),
+            help="Tier rows archived/deleted more than this many days ago"
+        )
+        parser.add_argument(
+            '--tier', choices=sorted(cold_storage.TIERS), action='append',
+            help="Only process this tier (repeatable); default is all tiers"
+        )
+        parser.add_argument(
+            '--segment-rows', type=int, default=cold_storage.SEGMENT_ROWS,
+            help="Maximum rows per segment file"
+        )
+        parser.add_argument(
+            '--find', nargs=3, metavar=('TIER', 'KEY', 'VALUE'),
+            help='Print cold rows instead of tiering, e.g. --find appointments id 42'
+        )
+
+    def handle(self, *args, **options):
+        if options['find']:
+            self._find(*options['find'])
+            return
+
+        if options['segment_rows'] < 1:
+            raise CommandError("--segment-rows must be at least 1")
+
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        for tier_name in options['tier'] or sorted(cold_storage.TIERS):
+            moved = cold_storage.tier_rows(
+                tier_name, cutoff,
+                segment_rows=options['segment_rows'],
+                log=self.stdout.write,
+            )
+            self.stdout.write(f"{tier_name}: moved {moved} rows older than {cutoff:%Y-%m-%d}")
+
+    def _find(self, tier_name, key_name, value):
+        tier = cold_storage.TIERS.get(tier_name)
+        if tier is None:
+            raise CommandError(f"Unknown tier '{tier_name}'")
+        if key_name not in tier.keys:
+            raise CommandError(f"Tier '{tier_name}' is indexed by: {', '.join(tier.keys)}")
+
+        if value.isdigit() and (key_name == 'pk' or (key_name == 'id' and tier_name != 'deleted_records')):
+            value = int(value)
+        for row in cold_storage.find(tier_name, key_name, value):
+            self.stdout.write(json.dumps(row.data, indent=2))
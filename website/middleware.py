@@ -0,0 +1,12 @@
+from website.services import activity_log
+
+
+class ActivityLogMiddleware:
+    """Write each request's activity log entries with one bulk insert at the end of the request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with activity_log.buffered():
+            return self.get_response(request)
@@ -2,8 +2,9 @@ from django.db import models
 from django.db.models import Avg
 from django.conf import settings
 from django.utils import timezone
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone as datetime_timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+import secrets
 import uuid
 
 # Patient ID Generator
@@ -91,6 +92,12 @@ class DependentPatient(models.Model):
         related_name='dependents_created'
     )
 
+    class Meta:
+        indexes = [
+            # Patient directory keyset order
+            models.Index(fields=['last_name', 'first_name', 'patient_id'], name='dep_patient_name_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.patient_id:
             self.patient_id = generate_patient_id("D")
@@ -126,6 +133,10 @@ class PatientVitals(models.Model):
     class Meta:
         ordering = ["-recorded_at"]
         verbose_name_plural = "Patient Vitals"
+        indexes = [
+            # Patient timeline: newest first per patient
+            models.Index(fields=['patient', 'recorded_at', 'id'], name='vitals_timeline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.patient_id} - {self.recorded_at:%Y-%m-%d %H:%M}"
@@ -133,6 +144,7 @@ class PatientVitals(models.Model):
 class PatientAllergy(models.Model):
     patient = models.ForeignKey(PatientInfo, on_delete=models.CASCADE, related_name="allergies")
     allergy_name = models.CharField(max_length=255)
+    recorded_at = models.DateTimeField(default=timezone.now)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         null=True,
@@ -144,6 +156,9 @@ class PatientAllergy(models.Model):
     class Meta:
         ordering = ["allergy_name"]
         verbose_name_plural = "Patient Allergies"
+        indexes = [
+            models.Index(fields=['patient', 'recorded_at', 'id'], name='allergy_timeline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.patient_id} - {self.allergy_name}"
@@ -165,6 +180,9 @@ class PatientMedication(models.Model):
     class Meta:
         ordering = ["-prescribed_at"]
         verbose_name_plural = "Patient Medications"
+        indexes = [
+            models.Index(fields=['patient', 'prescribed_at', 'id'], name='medication_timeline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.patient_id} - {self.medication_name}"
@@ -188,6 +206,9 @@ class DependentPatientVitals(models.Model):
     class Meta:
         ordering = ["-recorded_at"]
         verbose_name_plural = "Dependent Patient Vitals"
+        indexes = [
+            models.Index(fields=['dependent_patient', 'recorded_at', 'id'], name='dep_vitals_timeline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.dependent_patient.patient_id} - {self.recorded_at:%Y-%m-%d %H:%M}"
@@ -195,6 +216,7 @@ class DependentPatientVitals(models.Model):
 class DependentPatientAllergy(models.Model):
     dependent_patient = models.ForeignKey(DependentPatient, on_delete=models.CASCADE, related_name="allergies")
     allergy_name = models.CharField(max_length=255)
+    recorded_at = models.DateTimeField(default=timezone.now)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         null=True,
@@ -206,6 +228,9 @@ class DependentPatientAllergy(models.Model):
     class Meta:
         ordering = ["allergy_name"]
         verbose_name_plural = "Dependent Patient Allergies"
+        indexes = [
+            models.Index(fields=['dependent_patient', 'recorded_at', 'id'], name='dep_allergy_timeline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.dependent_patient.patient_id} - {self.allergy_name}"
@@ -245,6 +270,9 @@ class DependentPatientMedication(models.Model):
         ordering = ["-prescribed_at"]
         verbose_name = "Dependent Patient Medication"
         verbose_name_plural = "Dependent Patient Medications"
+        indexes = [
+            models.Index(fields=['dependent_patient', 'prescribed_at', 'id'], name='dep_medication_timeline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.dependent_patient.patient_id} - {self.medication_name}"
@@ -307,6 +335,13 @@ class DoctorInfo(models.Model):
 
 
 # -------------------- APPOINTMENTS --------------------
+class LiveAppointmentManager(models.Manager):
+    """Appointments that have not been soft-archived (ARCHIVE_STRATEGY = 'flag')"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(archived_at__isnull=True)
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -329,6 +364,44 @@ class Appointment(models.Model):
         related_name='appointments_created'
     )
 
+    # Set when soft-archived in place; such rows are hidden from `objects`
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    # Change tracking for calendar delta sync
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LiveAppointmentManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='appt_updated_idx'),
+            models.Index(fields=['doctor', 'updated_at'], name='appt_doctor_updated_idx'),
+            # Partial indexes: hot queries only ever touch live rows
+            models.Index(
+                fields=['doctor', 'start_time'],
+                condition=models.Q(archived_at__isnull=True),
+                name='appt_live_doctor_idx',
+            ),
+            models.Index(
+                fields=['patient', 'start_time'],
+                condition=models.Q(archived_at__isnull=True),
+                name='appt_live_patient_idx',
+            ),
+            models.Index(
+                fields=['status', 'start_time'],
+                condition=models.Q(archived_at__isnull=True),
+                name='appt_live_status_idx',
+            ),
+            models.Index(
+                fields=['archived_at'],
+                condition=models.Q(archived_at__isnull=False),
+                name='appt_archived_at_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.patient.get_full_name()} - {self.start_time}"
 
@@ -359,6 +432,44 @@ class DependentAppointment(models.Model):
         related_name='dependent_appointments_created'
     )
 
+    # Set when soft-archived in place; such rows are hidden from `objects`
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    # Change tracking for calendar delta sync
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LiveAppointmentManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='dep_appt_updated_idx'),
+            models.Index(fields=['doctor', 'updated_at'], name='dep_appt_doctor_updated_idx'),
+            # Partial indexes: hot queries only ever touch live rows
+            models.Index(
+                fields=['doctor', 'start_time'],
+                condition=models.Q(archived_at__isnull=True),
+                name='dep_appt_live_doctor_idx',
+            ),
+            models.Index(
+                fields=['dependent_patient', 'start_time'],
+                condition=models.Q(archived_at__isnull=True),
+                name='dep_appt_live_patient_idx',
+            ),
+            models.Index(
+                fields=['status', 'start_time'],
+                condition=models.Q(archived_at__isnull=True),
+                name='dep_appt_live_status_idx',
+            ),
+            models.Index(
+                fields=['archived_at'],
+                condition=models.Q(archived_at__isnull=False),
+                name='dep_appt_archived_at_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.dependent_patient.full_name} - {self.start_time}"
 
@@ -446,6 +557,12 @@ class MedicalRecord(models.Model):
         related_name='medical_records_created'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'created_at', 'id'], name='record_timeline_idx'),
+            models.Index(fields=['dependent_patient', 'created_at', 'id'], name='dep_record_timeline_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if self.patient:
             self.patient_id_str = self.patient.patient_id
@@ -479,28 +596,28 @@ class Prescription(models.Model):
     def __str__(self):
         return f"{self.medical_record.patient_id_str} - {self.medication_name}"
 
+    def build_medication(self):
+        """Unsaved patient/dependent medication for this prescription, or None"""
+        if not self.create_medication:
+            return None
+        fields = {
+            'medication_name': self.medication_name,
+            'dosage': self.dosage,
+            'frequency': self.frequency,
+            'prescribed_at': self.prescribed_at,
+            'created_by': self.created_by,
+        }
+        if self.medical_record.patient:
+            return PatientMedication(patient=self.medical_record.patient, **fields)
+        if self.medical_record.dependent_patient:
+            return DependentPatientMedication(dependent_patient=self.medical_record.dependent_patient, **fields)
+        return None
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        if self.create_medication:
-            from .models import PatientMedication, DependentPatientMedication
-            if self.medical_record.patient:
-                PatientMedication.objects.create(
-                    patient=self.medical_record.patient,
-                    medication_name=self.medication_name,
-                    dosage=self.dosage,
-                    frequency=self.frequency,
-                    prescribed_at=self.prescribed_at,
-                    created_by=self.created_by
-                )
-            elif self.medical_record.dependent_patient:
-                DependentPatientMedication.objects.create(
-                    dependent_patient=self.medical_record.dependent_patient,
-                    medication_name=self.medication_name,
-                    dosage=self.dosage,
-                    frequency=self.frequency,
-                    prescribed_at=self.prescribed_at,
-                    created_by=self.created_by
-                )
+        medication = self.build_medication()
+        if medication is not None:
+            medication.save()
 
 
 # -------------------- DOCTOR RATINGS --------------------
@@ -535,6 +652,38 @@ class DoctorRating(models.Model):
 
 
 # -------------------- ACTIVITY LOG --------------------
+class ActivityLogQuerySet(models.QuerySet):
+    def recent(self, limit):
+        """
+        Newest `limit` entries.
+
+        On a monthly partitioned table (see services.partitioning) they are
+        read one calendar month (UTC) at a time, so every query is bounded by
+        timestamp and touches a single partition; usually the first one is
+        enough, and one last query picks up anything older than
+        RECENT_ACTIVITY_MONTHS. A plain table is read with a single query.
+        """
+        from website.services import partitioning
+        if not (partitioning.supported() and partitioning.is_partitioned(partitioning.TABLES['activity_log'])):
+            return list(self.order_by('-timestamp')[:limit])
+
+        end = None
+        start = timezone.now().astimezone(datetime_timezone.utc).replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        entries = []
+        for _ in range(getattr(settings, 'RECENT_ACTIVITY_MONTHS', 12)):
+            month = self.filter(timestamp__gte=start)
+            if end is not None:
+                month = month.filter(timestamp__lt=end)
+            entries += month.order_by('-timestamp')[:limit - len(entries)]
+            if len(entries) >= limit:
+                return entries
+            end, start = start, (start - timedelta(days=1)).replace(day=1)
+        entries += self.filter(timestamp__lt=end).order_by('-timestamp')[:limit - len(entries)]
+        return entries
+
+
 class ActivityLog(models.Model):
     ACTION_TYPES = [
         ('create', 'Created'),
@@ -558,9 +707,94 @@ class ActivityLog(models.Model):
     description = models.TextField(blank=True, null=True)
     timestamp = models.DateTimeField(default=timezone.now)
 
+    objects = ActivityLogQuerySet.as_manager()
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Feeds: ORDER BY timestamp DESC, id DESC (optionally per user)
+            models.Index(fields=['timestamp', 'id'], name='activity_timestamp_idx'),
+            models.Index(fields=['user', 'timestamp', 'id'], name='activity_user_timestamp_idx'),
+            # History of one object
+            models.Index(fields=['model_name', 'object_id'], name='activity_object_idx'),
+        ]
 
     def __str__(self):
         user_name = self.user.get_full_name() if self.user else "System"
         return f"{self.timestamp:%Y-%m-%d %H:%M} | {user_name} {self.get_action_type_display()} {self.model_name} ({self.related_object_repr})"
+
+
+# -------------------- VERSION STAMPS --------------------
+class VersionStamp(models.Model):
+    """Counter bumped whenever data behind a cached view changes ('clinic', 'doctor:<id>')"""
+    key = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class AppointmentTombstone(models.Model):
+    """An appointment that left the live calendars (deleted or archived), kept for delta sync"""
+    appointment_type = models.CharField(max_length=20)  # 'self' or 'dependent'
+    appointment_id = models.BigIntegerField()
+    # Plain id so the tombstone outlives the doctor
+    doctor_id = models.BigIntegerField(null=True, blank=True)
+    removed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['removed_at', 'id'], name='tombstone_removed_idx'),
+            models.Index(fields=['doctor_id', 'removed_at'], name='tombstone_doctor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.appointment_type} appointment #{self.appointment_id} removed {self.removed_at:%Y-%m-%d %H:%M}"
+
+
+def generate_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeedToken(models.Model):
+    """Secret that authorizes a doctor's .ics subscription URL"""
+    doctor = models.OneToOneField(DoctorInfo, on_delete=models.CASCADE, related_name='calendar_feed_token')
+    token = models.CharField(max_length=64, unique=True, default=generate_feed_token)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Calendar feed for {self.doctor}"
+
+
+# -------------------- PEOPLE SEARCH --------------------
+class PersonSearchToken(models.Model):
+    """
+    One normalized search token of a patient, dependent or doctor.
+    Maintained by website.services.person_search; never edited directly.
+    """
+    PERSON_TYPES = [
+        ('patient', 'Patient'),
+        ('dependent', 'Dependent'),
+        ('doctor', 'Doctor'),
+    ]
+
+    token = models.CharField(max_length=64)
+    person_type = models.CharField(max_length=10, choices=PERSON_TYPES)
+    # PatientInfo / DependentPatient patient_id, or DoctorInfo id
+    person_key = models.CharField(max_length=20)
+    label = models.CharField(max_length=301)
+    detail = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['person_type', 'person_key', 'token'], name='person_token_unique'),
+        ]
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL serve LIKE 'prefix%' from the index
+            # whatever the database collation; other backends ignore opclasses
+            models.Index(fields=['token'], opclasses=['varchar_pattern_ops'], name='person_token_prefix_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} → {self.person_type} {self.person_key}"
@@ -0,0 +1,142 @@
+"""
+Buffered ActivityLog writer
+
+Entries are handed over only when the surrounding transaction commits, so
+a rolled-back change leaves no log behind. Inside `buffered()` (every
+request, via ActivityLogMiddleware) they are collected and written with a
+single bulk_create when the block exits; elsewhere they are written as
+soon as their transaction commits.
+
+ACTIVITY_LOG_WRITER = 'thread' moves the bulk_create off the request onto
+a background thread, which also merges batches that queue up meanwhile.
+"""
+import atexit
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from website.models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def log_activity(user=None, action_type='', model_name='', object_id=None,
+                 related_object_repr=None, description=None):
+    """Record an ActivityLog entry; it is saved once the current transaction commits"""
+    entry = ActivityLog(
+        user=user,
+        action_type=action_type,
+        model_name=model_name,
+        object_id=object_id,
+        related_object_repr=related_object_repr,
+        description=description,
+    )
+    log_activities([entry])
+    return entry
+
+
+def log_activities(entries):
+    """Record several unsaved ActivityLog instances at once"""
+    entries = list(entries)
+    if entries:
+        transaction.on_commit(partial(_accept, entries))
+
+
+def _accept(entries):
+    buffer = getattr(_state, 'buffer', None)
+    if buffer is None:
+        _write(entries)
+    else:
+        buffer.extend(entries)
+
+
+@contextmanager
+def buffered():
+    """Collect committed entries and write them in one bulk_create on exit"""
+    if getattr(_state, 'buffer', None) is not None:
+        # Nested: the outermost block flushes
+        yield
+        return
+
+    _state.buffer = []
+    try:
+        yield
+    finally:
+        entries, _state.buffer = _state.buffer, None
+        # A failed audit write must not replace the block's own exception
+        try:
+            _write(entries)
+        except Exception:
+            logger.exception("Could not write %d activity log entries", len(entries))
+
+
+def _write(entries):
+    if not entries:
+        return
+    if getattr(settings, 'ACTIVITY_LOG_WRITER', 'request') == 'thread':
+        _background_writer().submit(entries)
+    else:
+        ActivityLog.objects.bulk_create(entries)
+
+
+# ---------- Background writer ----------
+class _BackgroundWriter:
+    """Single daemon thread draining a queue of entry batches"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, entries):
+        self.queue.put(entries)
+
+    def stop(self, timeout=5):
+        """Flush what is queued, then end the thread"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            entries = self.queue.get()
+            if entries is None:
+                break
+
+            # Merge batches that arrived while the previous insert ran
+            while True:
+                try:
+                    more = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    running = False
+                    break
+                entries.extend(more)
+
+            close_old_connections()
+            try:
+                ActivityLog.objects.bulk_create(entries)
+            except Exception:
+                logger.exception("Could not write %d activity log entries", len(entries))
+        connection.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _background_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _BackgroundWriter()
+        return _writer
@@ -3,10 +3,13 @@
 """
 Service layer for archiving and deleting records
 """
+from django.conf import settings
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from django.db.models import BooleanField, CharField, F, Value
+from django.db.models.functions import Concat
 
 import json
 
@@ -19,62 +22,49 @@ from website.archive_models import (
     ArchivedMedicalRecord, ArchivedDoctorInfo, DeletedRecord
 )
 from accounts.models import Phone
+from website.services.activity_log import log_activities, log_activity
+from website.services import calendar_sync, cold_storage, versioning
+
+
+# Appointment statuses that are finished and therefore safe to archive
+ARCHIVABLE_STATUSES = ['completed', 'rejected', 'no_show']
+
+# Rows snapshotted and deleted per statement by DeleteService.delete_queryset_with_audit
+DELETE_CHUNK_SIZE = 500
 
 
 class ArchiveService:
     """Service for archiving records"""
     
+    @staticmethod
+    def uses_flags():
+        """True when appointments are soft-archived in place (ARCHIVE_STRATEGY = 'flag')"""
+        return getattr(settings, 'ARCHIVE_STRATEGY', 'copy') == 'flag'
+    
     @staticmethod
     @transaction.atomic
     def archive_patient(patient_id, user, reason=""):
         """Archive a patient and all related data"""
         try:
-            patient = PatientInfo.objects.get(pk=patient_id)
+            patient = (
+                PatientInfo.objects.select_related('user')
+                .prefetch_related('allergies', 'medications', 'vitals')
+                .get(pk=patient_id)
+            )
         except PatientInfo.DoesNotExist:
             raise ValidationError("Patient not found")
         
-        # ========== CRITICAL: Archive appointments FIRST before any deletion ==========
-        # Archive related appointments
-        appointments = list(Appointment.objects.filter(patient=patient.user))
-        for appt in appointments:
-            ArchiveService._archive_appointment(appt, user, reason, 'self')
+        # Archive appointments and medical records FIRST, before any deletion
+        appointments = ArchiveService._archive_appointments(
+            Appointment.all_objects.filter(patient=patient.user), 'self', user, reason
+        )
+        ArchiveService._archive_medical_records(
+            MedicalRecord.objects.filter(patient=patient), user, reason
+        )
         
         # Get phone number
-        phone_number = ""
-        try:
-            phone = Phone.objects.get(user=patient.user)
-            phone_number = phone.number
-        except Phone.DoesNotExist:
-            pass
-        
-        # Collect allergies
-        allergies_data = []
-        for allergy in patient.allergies.all():
-            allergies_data.append({
-                'allergy_name': allergy.allergy_name
-            })
-        
-        # Collect medications
-        medications_data = []
-        for medication in patient.medications.all():
-            medications_data.append({
-                'medication_name': medication.medication_name,
-                'dosage': medication.dosage,
-                'frequency': medication.frequency,
-                'prescribed_at': medication.prescribed_at.isoformat()
-            })
-        
-        # Get latest vitals
-        latest_vitals_obj = patient.vitals.last()
-        latest_vitals_data = None
-        if latest_vitals_obj:
-            latest_vitals_data = {
-                'blood_pressure': latest_vitals_obj.blood_pressure,
-                'heart_rate': latest_vitals_obj.heart_rate,
-                'height_cm': latest_vitals_obj.height_cm,
-                'weight_kg': latest_vitals_obj.weight_kg,
-                'recorded_at': latest_vitals_obj.recorded_at.isoformat() if latest_vitals_obj.recorded_at else None
-            }
+        phone = Phone.objects.filter(user=patient.user).first()
+        phone_number = phone.number if phone else ""
         
         # Archive patient info
         archived_patient = ArchivedPatientInfo.objects.create(
@@ -90,24 +80,11 @@ class ArchiveService:
             phone_number=phone_number,
             archived_by=user,
             archive_reason=reason,
-            additional_data={
-                'vitals_count': patient.vitals.count(),
-                'allergies_count': patient.allergies.count(),
-                'medications_count': patient.medications.count(),
-                'allergies': allergies_data,
-                'medications': medications_data,
-                'latest_vitals': latest_vitals_data,
-                'appointments_count': len(appointments),  # Store count
-            }
+            additional_data=ArchiveService._health_snapshot(patient, len(appointments))
         )
         
-        # Archive related medical records
-        medical_records = list(MedicalRecord.objects.filter(patient=patient))
-        for record in medical_records:
-            ArchiveService._archive_medical_record(record, user, reason)
-        
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action_type='delete',
             model_name='PatientInfo',
@@ -116,7 +93,7 @@ class ArchiveService:
             description=f"Archived patient: {reason}"
         )
         
-        # NOW delete the patient (CASCADE will clean up the rest)
+        # NOW delete the patient (CASCADE will clean up vitals, allergies and medications)
         patient.delete()
         
         return archived_patient
@@ -127,44 +104,21 @@ class ArchiveService:
     def archive_dependent(dependent_id, user, reason=""):
         """Archive a dependent patient and related data"""
         try:
-            dependent = DependentPatient.objects.get(pk=dependent_id)
+            dependent = (
+                DependentPatient.objects.select_related('guardian')
+                .prefetch_related('allergies', 'medications', 'vitals')
+                .get(pk=dependent_id)
+            )
         except DependentPatient.DoesNotExist:
             raise ValidationError("Dependent patient not found")
         
-        # ========== CRITICAL: Archive appointments FIRST before any deletion ==========
-        # Archive related appointments
-        appointments = list(DependentAppointment.objects.filter(dependent_patient=dependent))
-        for appt in appointments:
-            ArchiveService._archive_dependent_appointment(appt, user, reason)
-        
-        # Collect allergies
-        allergies_data = []
-        for allergy in dependent.allergies.all():
-            allergies_data.append({
-                'allergy_name': allergy.allergy_name
-            })
-        
-        # Collect medications
-        medications_data = []
-        for medication in dependent.medications.all():
-            medications_data.append({
-                'medication_name': medication.medication_name,
-                'dosage': medication.dosage,
-                'frequency': medication.frequency,
-                'prescribed_at': medication.prescribed_at.isoformat()
-            })
-        
-        # Get latest vitals
-        latest_vitals_obj = dependent.vitals.last()
-        latest_vitals_data = None
-        if latest_vitals_obj:
-            latest_vitals_data = {
-                'blood_pressure': latest_vitals_obj.blood_pressure,
-                'heart_rate': latest_vitals_obj.heart_rate,
-                'height_cm': latest_vitals_obj.height_cm,
-                'weight_kg': latest_vitals_obj.weight_kg,
-                'recorded_at': latest_vitals_obj.recorded_at.isoformat() if latest_vitals_obj.recorded_at else None
-            }
+        # Archive appointments and medical records FIRST, before any deletion
+        appointments = ArchiveService._archive_appointments(
+            DependentAppointment.all_objects.filter(dependent_patient=dependent), 'dependent', user, reason
+        )
+        ArchiveService._archive_medical_records(
+            MedicalRecord.objects.filter(dependent_patient=dependent), user, reason
+        )
         
         # Archive dependent info
         archived_dependent = ArchivedDependentPatient.objects.create(
@@ -180,24 +134,11 @@ class ArchiveService:
             blood_type=dependent.blood_type or "",
             archived_by=user,
             archive_reason=reason,
-            additional_data={
-                'vitals_count': dependent.vitals.count(),
-                'allergies_count': dependent.allergies.count(),
-                'medications_count': dependent.medications.count(),
-                'allergies': allergies_data,
-                'medications': medications_data,
-                'latest_vitals': latest_vitals_data,
-                'appointments_count': len(appointments),  # Store count
-            }
+            additional_data=ArchiveService._health_snapshot(dependent, len(appointments))
         )
         
-        # Archive related medical records
-        medical_records = list(MedicalRecord.objects.filter(dependent_patient=dependent))
-        for record in medical_records:
-            ArchiveService._archive_medical_record(record, user, reason)
-        
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action_type='delete',
             model_name='DependentPatient',
@@ -206,65 +147,163 @@ class ArchiveService:
             description=f"Archived dependent: {reason}"
         )
         
-        # NOW delete the dependent (CASCADE will clean up the rest)
+        # NOW delete the dependent (CASCADE will clean up vitals, allergies and medications)
         dependent.delete()
         
         return archived_dependent
-        
+    
     @staticmethod
-    def _archive_appointment(appointment, user, reason, appointment_type):
-        """Helper to archive a regular appointment - DO NOT DELETE"""
-        archived = ArchivedAppointment.objects.create(
-            original_appointment_id=appointment.id,
-            appointment_type=appointment_type,
-            patient_name=appointment.patient.get_full_name() if appointment.patient else "Unknown",
-            doctor_name=appointment.doctor.user.get_full_name() if appointment.doctor else "Unknown",
-            doctor_specialization=appointment.doctor.specialization.name if appointment.doctor and appointment.doctor.specialization else None,
-            start_time=appointment.start_time,
-            end_time=appointment.end_time,
-            status=appointment.status,
-            archived_by=user,
-            archive_reason=reason,
-            additional_data={
-                'patient_id': appointment.patient.id if appointment.patient else None,
-                'doctor_id': appointment.doctor.id if appointment.doctor else None,
-                'created_by_id': appointment.created_by.id if appointment.created_by else None
+    def _health_snapshot(person, appointments_count):
+        """Serialize prefetched allergies, medications and vitals of a patient or dependent"""
+        allergies = list(person.allergies.all())
+        medications = list(person.medications.all())
+        vitals = list(person.vitals.all())  # ordered newest first
+        
+        latest_vitals_data = None
+        if vitals:
+            latest = vitals[0]
+            latest_vitals_data = {
+                'blood_pressure': latest.blood_pressure,
+                'heart_rate': latest.heart_rate,
+                'height_cm': latest.height_cm,
+                'weight_kg': latest.weight_kg,
+                'recorded_at': latest.recorded_at.isoformat() if latest.recorded_at else None
             }
-        )
         
-        # IMPORTANT: Delete the original appointment to prevent cascade issues
-        appointment.delete()
-        return archived
+        return {
+            'vitals_count': len(vitals),
+            'allergies_count': len(allergies),
+            'medications_count': len(medications),
+            'allergies': [{'allergy_name': a.allergy_name} for a in allergies],
+            'medications': [
+                {
+                    'medication_name': m.medication_name,
+                    'dosage': m.dosage,
+                    'frequency': m.frequency,
+                    'prescribed_at': m.prescribed_at.isoformat()
+                }
+                for m in medications
+            ],
+            'latest_vitals': latest_vitals_data,
+            'appointments_count': appointments_count,
+        }
+    
+    @staticmethod
+    def _archive_appointments(queryset, appointment_type, user, reason):
+        """
+        Archive every appointment in `queryset` without per-row queries.
+        
+        One select (with patient and doctor joined), one bulk insert and one
+        set-based delete, however many appointments there are. The delete is
+        bounded by the highest loaded pk so rows inserted meanwhile are left alone.
+        """
+        related = ['doctor__user', 'doctor__specialization']
+        related.append('dependent_patient' if appointment_type == 'dependent' else 'patient__patient_profile')
+        appointments = list(queryset.select_related(*related).order_by('pk'))
+        if not appointments:
+            return []
+        
+        ArchivedAppointment.objects.bulk_create([
+            ArchiveService._build_archived_appointment(appt, appointment_type, user, reason)
+            for appt in appointments
+        ])
+        with calendar_sync.bulk_removal(appointment_type, appointments), \
+                versioning.bulk_appointment_changes(appointments):
+            queryset.filter(pk__lte=appointments[-1].pk).delete()
+        return appointments
     
     @staticmethod
-    def _archive_dependent_appointment(appointment, user, reason):
-        """Helper to archive a dependent appointment - DO NOT DELETE"""
-        archived = ArchivedAppointment.objects.create(
+    def _build_archived_appointment(appointment, appointment_type, user, reason):
+        """Build an unsaved ArchivedAppointment from a regular or dependent appointment"""
+        doctor = appointment.doctor
+        original_patient_id = original_dependent_id = None
+        if appointment_type == 'dependent':
+            dependent = appointment.dependent_patient
+            patient_name = dependent.full_name if dependent else "Unknown"
+            original_dependent_id = appointment.dependent_patient_id
+            additional_data = {
+                'dependent_patient_id': dependent.patient_id if dependent else None,
+                'guardian_id': dependent.guardian_id if dependent else None,
+            }
+        else:
+            patient_name = appointment.patient.get_full_name() if appointment.patient else "Unknown"
+            profile = getattr(appointment.patient, 'patient_profile', None)
+            original_patient_id = profile.patient_id if profile else None
+            additional_data = {'patient_id': appointment.patient_id}
+        additional_data['doctor_id'] = appointment.doctor_id
+        additional_data['created_by_id'] = appointment.created_by_id
+        
+        return ArchivedAppointment(
             original_appointment_id=appointment.id,
-            appointment_type='dependent',
-            patient_name=appointment.dependent_patient.full_name if appointment.dependent_patient else "Unknown",
-            doctor_name=appointment.doctor.user.get_full_name() if appointment.doctor else "Unknown",
-            doctor_specialization=appointment.doctor.specialization.name if appointment.doctor and appointment.doctor.specialization else None,
+            appointment_type=appointment_type,
+            original_patient_id=original_patient_id,
+            original_dependent_id=original_dependent_id,
+            original_doctor_id=appointment.doctor_id,
+            patient_name=patient_name,
+            doctor_name=doctor.user.get_full_name() if doctor else "Unknown",
+            doctor_specialization=doctor.specialization.name if doctor and doctor.specialization else None,
             start_time=appointment.start_time,
             end_time=appointment.end_time,
             status=appointment.status,
             archived_by=user,
             archive_reason=reason,
-            additional_data={
-                'dependent_patient_id': appointment.dependent_patient.patient_id if appointment.dependent_patient else None,
-                'guardian_id': appointment.dependent_patient.guardian.id if appointment.dependent_patient else None,
-                'doctor_id': appointment.doctor.id if appointment.doctor else None,
-                'created_by_id': appointment.created_by.id if appointment.created_by else None
-            }
+            additional_data=additional_data
         )
+    
+    @staticmethod
+    def archive_appointment_batch(appointments, appointment_type, user=None, reason=''):
+        """
+        Archive a list of loaded appointments with set-based writes.
+        
+        With ARCHIVE_STRATEGY = 'flag' the rows are stamped with archived_at
+        in one UPDATE instead of being copied and deleted.
+        
+        Load the appointments with select_related on the patient (and its
+        patient_profile) and doctor (user and specialization) so building the
+        archive rows issues no extra queries: the whole batch costs one insert for the archive rows, one for
+        the activity log and one delete.
+        """
+        if not appointments:
+            return []
+        
+        model = DependentAppointment if appointment_type == 'dependent' else Appointment
+        pks = [appt.pk for appt in appointments]
+        
+        if ArchiveService.uses_flags():
+            archived = appointments
+        else:
+            archived = ArchivedAppointment.objects.bulk_create([
+                ArchiveService._build_archived_appointment(appt, appointment_type, user, reason)
+                for appt in appointments
+            ])
+        
+        log_activities([
+            ActivityLog(
+                user=user,
+                action_type='delete',
+                model_name=model.__name__,
+                object_id=str(appt.id),
+                related_object_repr=str(appt)[:200],
+                description=f'Archived appointment (reason: {reason or "Manual archive"})'
+            )
+            for appt in appointments
+        ])
+        
+        if ArchiveService.uses_flags():
+            model.all_objects.filter(pk__in=pks, archived_at__isnull=True).update(archived_at=timezone.now())
+            calendar_sync.record_removed(appointment_type, appointments)
+            versioning.bump_doctors({appt.doctor_id for appt in appointments})
+            versioning.bump_appointment_patients(appointments)
+        else:
+            with calendar_sync.bulk_removal(appointment_type, appointments), \
+                    versioning.bulk_appointment_changes(appointments):
+                model.objects.filter(pk__in=pks).delete()
         
-        # IMPORTANT: Delete the original appointment to prevent cascade issues
-        appointment.delete()
         return archived
     
     @staticmethod
-    def _archive_medical_record(record, user, reason):
-        """Helper to archive a medical record"""
+    def _build_archived_medical_record(record, user, reason):
+        """Build an unsaved ArchivedMedicalRecord; expects prescriptions to be prefetched"""
         # Get patient name
         if record.patient:
             patient_name = record.patient.user.get_full_name()
@@ -284,9 +323,14 @@ class ArchiveService:
                 'prescribed_at': prescription.prescribed_at.isoformat()
             })
         
-        return ArchivedMedicalRecord.objects.create(
+        doctor_info = getattr(record.created_by, 'doctor_info', None) if record.created_by else None
+        
+        return ArchivedMedicalRecord(
             original_record_id=record.id,
             patient_id_str=record.patient_id_str,
+            original_patient_id=record.patient_id,
+            original_dependent_id=record.dependent_patient_id,
+            original_doctor_id=doctor_info.id if doctor_info else None,
             patient_name=patient_name,
             reason_for_visit=record.reason_for_visit,
             symptoms=record.symptoms,
@@ -297,23 +341,41 @@ class ArchiveService:
             archive_reason=reason
         )
     
+    @staticmethod
+    def _archive_medical_records(queryset, user, reason):
+        """Archive every medical record in `queryset` with one insert and one delete"""
+        records = list(
+            queryset.select_related('patient__user', 'dependent_patient', 'created_by__doctor_info')
+            .prefetch_related('prescriptions')
+            .order_by('pk')
+        )
+        if not records:
+            return []
+        
+        ArchivedMedicalRecord.objects.bulk_create([
+            ArchiveService._build_archived_medical_record(record, user, reason)
+            for record in records
+        ])
+        # Prescriptions go with their records through CASCADE
+        queryset.filter(pk__lte=records[-1].pk).delete()
+        return records
+    
     @staticmethod
     @transaction.atomic
     def archive_doctor(doctor_id, user, reason=""):
         """Archive a doctor and related data"""
         try:
-            doctor = DoctorInfo.objects.get(pk=doctor_id)
+            doctor = DoctorInfo.objects.select_related('user', 'specialization').get(pk=doctor_id)
         except DoctorInfo.DoesNotExist:
             raise ValidationError("Doctor not found")
         
         # Archive appointments FIRST
-        self_appointments = list(Appointment.objects.filter(doctor=doctor))
-        for appt in self_appointments:
-            ArchiveService._archive_appointment(appt, user, reason, 'self')
-        
-        dependent_appointments = list(DependentAppointment.objects.filter(doctor=doctor))
-        for appt in dependent_appointments:
-            ArchiveService._archive_dependent_appointment(appt, user, reason)
+        self_appointments = ArchiveService._archive_appointments(
+            Appointment.all_objects.filter(doctor=doctor), 'self', user, reason
+        )
+        dependent_appointments = ArchiveService._archive_appointments(
+            DependentAppointment.all_objects.filter(doctor=doctor), 'dependent', user, reason
+        )
         
         # Archive doctor info
         archived_doctor = ArchivedDoctorInfo.objects.create(
@@ -339,7 +401,7 @@ class ArchiveService:
         )
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action_type='delete',
             model_name='DoctorInfo',
@@ -357,33 +419,29 @@ class ArchiveService:
     @transaction.atomic
     def archive_appointment(appointment_id, user=None, reason=''):
         """Archive a regular appointment"""
-        appointment = Appointment.objects.select_for_update().get(pk=appointment_id)
+        appointment = (
+            Appointment.objects.select_for_update(of=('self',))
+            .select_related('patient__patient_profile', 'doctor__user', 'doctor__specialization')
+            .get(pk=appointment_id)
+        )
         
         # Only archive completed, rejected, or no_show appointments
-        if appointment.status not in ['completed', 'rejected', 'no_show']:
+        if appointment.status not in ARCHIVABLE_STATUSES:
             raise ValidationError("Only completed, rejected, or no-show appointments can be archived")
         
-        # Create archived record
-        archived = ArchivedAppointment.objects.create(
-            original_appointment_id=appointment.id,
-            appointment_type='self',
-            patient_name=appointment.patient.get_full_name(),
-            doctor_name=appointment.doctor.user.get_full_name(),
-            doctor_specialization=appointment.doctor.specialization.name if appointment.doctor.specialization else None,
-            start_time=appointment.start_time,
-            end_time=appointment.end_time,
-            status=appointment.status,
-            archived_by=user,
-            archive_reason=reason or 'Manual archive',
-            additional_data={
-                'patient_id': appointment.patient.id,
-                'doctor_id': appointment.doctor.id,
-                'created_by_id': appointment.created_by.id if appointment.created_by else None
-            }
-        )
+        # Create archived record (or just flag the row in place)
+        if ArchiveService.uses_flags():
+            archived = appointment
+            archived.archived_at = timezone.now()
+            archived.save(update_fields=['archived_at'])
+        else:
+            archived = ArchiveService._build_archived_appointment(
+                appointment, 'self', user, reason or 'Manual archive'
+            )
+            archived.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action_type='delete',
             model_name='Appointment',
@@ -393,7 +451,8 @@ class ArchiveService:
         )
         
         # Delete original
-        appointment.delete()
+        if not ArchiveService.uses_flags():
+            appointment.delete()
         
         return archived
     
@@ -401,34 +460,29 @@ class ArchiveService:
     @transaction.atomic
     def archive_dependent_appointment(appointment_id, user=None, reason=''):
         """Archive a dependent appointment"""
-        appointment = DependentAppointment.objects.select_for_update().get(pk=appointment_id)
+        appointment = (
+            DependentAppointment.objects.select_for_update(of=('self',))
+            .select_related('dependent_patient', 'doctor__user', 'doctor__specialization')
+            .get(pk=appointment_id)
+        )
         
         # Only archive completed, rejected, or no_show appointments
-        if appointment.status not in ['completed', 'rejected', 'no_show']:
+        if appointment.status not in ARCHIVABLE_STATUSES:
             raise ValidationError("Only completed, rejected, or no-show appointments can be archived")
         
-        # Create archived record
-        archived = ArchivedAppointment.objects.create(
-            original_appointment_id=appointment.id,
-            appointment_type='dependent',
-            patient_name=appointment.dependent_patient.full_name,
-            doctor_name=appointment.doctor.user.get_full_name(),
-            doctor_specialization=appointment.doctor.specialization.name if appointment.doctor.specialization else None,
-            start_time=appointment.start_time,
-            end_time=appointment.end_time,
-            status=appointment.status,
-            archived_by=user,
-            archive_reason=reason or 'Manual archive',
-            additional_data={
-                'dependent_patient_id': appointment.dependent_patient.patient_id,
-                'guardian_id': appointment.dependent_patient.guardian.id,
-                'doctor_id': appointment.doctor.id,
-                'created_by_id': appointment.created_by.id if appointment.created_by else None
-            }
-        )
+        # Create archived record (or just flag the row in place)
+        if ArchiveService.uses_flags():
+            archived = appointment
+            archived.archived_at = timezone.now()
+            archived.save(update_fields=['archived_at'])
+        else:
+            archived = ArchiveService._build_archived_appointment(
+                appointment, 'dependent', user, reason or 'Manual archive'
+            )
+            archived.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action_type='delete',
             model_name='DependentAppointment',
@@ -438,104 +492,180 @@ class ArchiveService:
         )
         
         # Delete original
-        appointment.delete()
+        if not ArchiveService.uses_flags():
+            appointment.delete()
         
         return archived
     
     @staticmethod
-    def bulk_archive_old_appointments(days=90, user=None):
-        """Auto-archive appointments older than specified days"""
-        from django.db.models import Q
-        
-        cutoff_date = timezone.now() - timedelta(days=days)
-        count = 0
-        
-        # Archive regular appointments
-        old_appointments = Appointment.objects.filter(
-            Q(status='completed') | Q(status='rejected') | Q(status='no_show'),
-            start_time__lt=cutoff_date
+    def flagged_appointments(appointment_type):
+        """
+        Soft-archived appointments, annotated to read like ArchivedAppointment
+        rows (doctor_name, original_*_id, ...) so archive lists can mix both.
+        The patient's name is annotated as archived_patient_name, since
+        patient_name is a read-only property on the live models.
+        """
+        doctor_fields = dict(
+            appointment_type=Value(appointment_type),
+            doctor_name=Concat('doctor__user__first_name', Value(' '), 'doctor__user__last_name'),
+            doctor_specialization=F('doctor__specialization__name'),
+            archive_reason=Value(None, output_field=CharField()),
+            original_doctor_id=F('doctor_id'),
+            soft_archived=Value(True, output_field=BooleanField()),
         )
-        
-        for appointment in old_appointments:
-            try:
-                ArchiveService.archive_appointment(
-                    appointment.id, 
-                    user=user, 
-                    reason=f'Auto-archived (older than {days} days)'
-                )
-                count += 1
-            except Exception as e:
-                print(f"Error archiving appointment {appointment.id}: {e}")
-        
-        # Archive dependent appointments
-        old_dependent = DependentAppointment.objects.filter(
-            Q(status='completed') | Q(status='rejected') | Q(status='no_show'),
-            start_time__lt=cutoff_date
+        if appointment_type == 'dependent':
+            return DependentAppointment.all_objects.filter(archived_at__isnull=False).select_related(
+                'dependent_patient'
+            ).annotate(
+                archived_patient_name=Concat(
+                    'dependent_patient__first_name', Value(' '), 'dependent_patient__last_name',
+                    output_field=CharField(),
+                ),
+                original_patient_id=Value(None, output_field=CharField()),
+                original_dependent_id=F('dependent_patient_id'),
+                **doctor_fields
+            )
+        return Appointment.all_objects.filter(archived_at__isnull=False).select_related(
+            'patient'
+        ).annotate(
+            archived_patient_name=Concat(
+                'patient__first_name', Value(' '), 'patient__last_name', output_field=CharField(),
+            ),
+            original_patient_id=F('patient__patient_profile__patient_id'),
+            original_dependent_id=Value(None, output_field=CharField()),
+            **doctor_fields
         )
-        
-        for appointment in old_dependent:
-            try:
-                ArchiveService.archive_dependent_appointment(
-                    appointment.id,
-                    user=user,
-                    reason=f'Auto-archived (older than {days} days)'
-                )
-                count += 1
-            except Exception as e:
-                print(f"Error archiving dependent appointment {appointment.id}: {e}")
-        
-        return count
+    
+    @staticmethod
+    def unflag_appointments(appointment_type, appointment_ids):
+        """Restore soft-archived appointments with a single UPDATE"""
+        model = DependentAppointment if appointment_type == 'dependent' else Appointment
+        appointments = model.all_objects.filter(pk__in=appointment_ids, archived_at__isnull=False)
+        versioning.bump_doctors(set(appointments.values_list('doctor_id', flat=True)))
+        versioning.bump_appointment_patients(appointments.only(
+            'pk', 'patient_id' if model is Appointment else 'dependent_patient_id'
+        ))
+        return appointments.update(archived_at=None, updated_at=timezone.now())
     
     @staticmethod
     @transaction.atomic
     def restore_appointment(archived_id):
-        """Restore an archived appointment back to active"""
+        """Restore an archived appointment back to active, from cold storage if it was tiered"""
+        if not ArchivedAppointment.objects.filter(pk=archived_id).exists():
+            cold_storage.rehydrate('appointments', 'pk', archived_id)
         archived = ArchivedAppointment.objects.get(pk=archived_id)
+        restored, skipped = ArchiveService.bulk_restore_appointments([archived.pk])
+        if skipped:
+            raise ValidationError("Cannot restore: missing patient or doctor information")
+        return restored[0]
+    
+    @staticmethod
+    @transaction.atomic
+    def bulk_restore_appointments(archived_ids):
+        """
+        Restore many archived appointments at once.
+        
+        Patients, dependents and doctors are resolved with one in_bulk per
+        model, the appointments are bulk-created and the archive rows removed
+        with a single delete. Returns (restored appointments, skipped archived ids);
+        rows whose patient or doctor no longer exists are skipped and stay archived.
+        """
+        from accounts.models import User
+        
+        archived = list(ArchivedAppointment.objects.filter(pk__in=archived_ids).order_by('pk'))
+        
+        def doctor_id_of(row):
+            return row.original_doctor_id or row.additional_data.get('doctor_id')
+        
+        def dependent_id_of(row):
+            return row.original_dependent_id or row.additional_data.get('dependent_patient_id')
+        
+        user_ids = set()
+        for row in archived:
+            if row.appointment_type == 'self':
+                user_ids.add(row.additional_data.get('patient_id'))
+            user_ids.add(row.additional_data.get('created_by_id'))
+        user_ids.discard(None)
+        
+        doctors = DoctorInfo.objects.in_bulk({doctor_id_of(row) for row in archived} - {None})
+        users = User.objects.in_bulk(user_ids)
+        dependents = DependentPatient.objects.in_bulk(
+            {dependent_id_of(row) for row in archived if row.appointment_type == 'dependent'} - {None}
+        )
         
-        # Check if it was a regular or dependent appointment
-        if archived.appointment_type == 'self':
-            # Get patient and doctor from additional_data
-            patient_id = archived.additional_data.get('patient_id')
-            doctor_id = archived.additional_data.get('doctor_id')
-            
-            if not patient_id or not doctor_id:
-                raise ValidationError("Cannot restore: missing patient or doctor information")
-            
-            from accounts.models import User
-            patient = User.objects.get(pk=patient_id)
-            doctor = DoctorInfo.objects.get(pk=doctor_id)
-            
-            # Restore appointment
-            restored = Appointment.objects.create(
-                patient=patient,
+        self_rows, dependent_rows, restored_ids, skipped = [], [], [], []
+        for row in archived:
+            doctor = doctors.get(doctor_id_of(row))
+            fields = dict(
                 doctor=doctor,
-                start_time=archived.start_time,
-                end_time=archived.end_time,
-                status=archived.status
+                start_time=row.start_time,
+                end_time=row.end_time,
+                status=row.status,
+                created_by=users.get(row.additional_data.get('created_by_id')),
             )
-            
-        else:  # dependent
-            dependent_patient_id = archived.additional_data.get('dependent_patient_id')
-            doctor_id = archived.additional_data.get('doctor_id')
-            
-            if not dependent_patient_id or not doctor_id:
-                raise ValidationError("Cannot restore: missing patient or doctor information")
-            
-            dependent = DependentPatient.objects.get(patient_id=dependent_patient_id)
-            doctor = DoctorInfo.objects.get(pk=doctor_id)
-            
-            restored = DependentAppointment.objects.create(
+            if row.appointment_type == 'self':
+                patient = users.get(row.additional_data.get('patient_id'))
+                if not (doctor and patient):
+                    skipped.append(row.pk)
+                    continue
+                self_rows.append(Appointment(patient=patient, **fields))
+            else:
+                dependent = dependents.get(dependent_id_of(row))
+                if not (doctor and dependent):
+                    skipped.append(row.pk)
+                    continue
+                dependent_rows.append(DependentAppointment(dependent_patient=dependent, **fields))
+            restored_ids.append(row.pk)
+        
+        restored = Appointment.objects.bulk_create(self_rows) + DependentAppointment.objects.bulk_create(dependent_rows)
+        versioning.bump_doctors({appointment.doctor_id for appointment in restored})
+        versioning.bump_appointment_patients(restored)
+        
+        if restored_ids:
+            ArchivedAppointment.objects.filter(pk__in=restored_ids).delete()
+        
+        return restored, skipped
+    
+    @staticmethod
+    @transaction.atomic
+    def bulk_restore_medical_records(archived_records, patient=None, dependent=None):
+        """
+        Restore archived medical records (and their prescriptions) for a restored
+        patient or dependent with two bulk inserts and one delete.
+        """
+        archived_records = list(archived_records)
+        if not archived_records:
+            return []
+        
+        records = MedicalRecord.objects.bulk_create([
+            MedicalRecord(
+                patient=patient,
                 dependent_patient=dependent,
-                doctor=doctor,
-                start_time=archived.start_time,
-                end_time=archived.end_time,
-                status=archived.status
+                patient_id_str=archived.patient_id_str,
+                reason_for_visit=archived.reason_for_visit,
+                symptoms=archived.symptoms,
+                diagnosis=archived.diagnosis,
+                created_at=archived.created_at,
             )
+            for archived in archived_records
+        ])
+        
+        Prescription.objects.bulk_create([
+            Prescription(
+                medical_record=record,
+                medication_name=data.get('medication_name', ''),
+                dosage=data.get('dosage', ''),
+                frequency=data.get('frequency', ''),
+                notes=data.get('notes', ''),
+                prescribed_at=parse_datetime(data['prescribed_at']) if data.get('prescribed_at') else timezone.now(),
+            )
+            for record, archived in zip(records, archived_records)
+            for data in (archived.prescriptions or [])
+        ])
         
-        # Delete archived record
-        archived.delete()
+        ArchivedMedicalRecord.objects.filter(pk__in=[archived.pk for archived in archived_records]).delete()
         
-        return restored
+        return records
 
 
 class DeleteService:
@@ -553,15 +683,7 @@ class DeleteService:
         snapshot = {}
         for field in model_instance._meta.fields:
             field_name = field.name
-            field_value = getattr(model_instance, field_name)
-            
-            # Convert to JSON-serializable format
-            if hasattr(field_value, 'isoformat'):
-                snapshot[field_name] = field_value.isoformat()
-            elif isinstance(field_value, (str, int, float, bool, type(None))):
-                snapshot[field_name] = field_value
-            else:
-                snapshot[field_name] = str(field_value)
+            snapshot[field_name] = DeleteService._snapshot_value(getattr(model_instance, field_name))
         
         # Create deleted record
         deleted_record = DeletedRecord.objects.create(
@@ -574,7 +696,7 @@ class DeleteService:
         )
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action_type='delete',
             model_name=model_name,
@@ -586,4 +708,80 @@ class DeleteService:
         # Delete the instance
         model_instance.delete()
         
-        return deleted_record
\ No newline at end of file
+        return deleted_record
+    
+    @staticmethod
+    def _snapshot_value(value):
+        """Convert a field value to a JSON-serializable format"""
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        if isinstance(value, (str, int, float, bool, type(None))):
+            return value
+        return str(value)
+    
+    @staticmethod
+    def delete_queryset_with_audit(queryset, user, reason="", chunk_size=DELETE_CHUNK_SIZE):
+        """
+        Delete every row of `queryset` with the same audit trail as delete_with_audit.
+        
+        Each row gets a DeletedRecord and an ActivityLog whose repr is
+        str(row), so bulk purges are found by the same name search. Rows are
+        loaded with their direct foreign keys joined, which covers the
+        __str__ of the models purged in bulk; foreign keys snapshot as their
+        ids. Rows are handled in chunks: one bulk insert of DeletedRecords,
+        one of ActivityLogs and one DELETE per chunk (appointments also get
+        one tombstone insert), each chunk in its own transaction. Returns
+        the number of rows deleted.
+        """
+        model = queryset.model
+        model_name = model.__name__
+        fields = model._meta.fields
+        rows = queryset.select_related(
+            *[field.name for field in fields if field.is_relation]
+        ).order_by('pk')
+        
+        deleted = 0
+        last_pk = None
+        while True:
+            chunk = rows.filter(pk__gt=last_pk) if last_pk is not None else rows
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                return deleted
+            last_pk = chunk[-1].pk
+            
+            records, logs, pks = [], [], []
+            for instance in chunk:
+                original_id = str(instance.pk)
+                object_repr = str(instance)
+                pks.append(instance.pk)
+                records.append(DeletedRecord(
+                    model_name=model_name,
+                    original_id=original_id,
+                    object_repr=object_repr,
+                    deleted_by=user,
+                    deletion_reason=reason,
+                    data_snapshot={
+                        field.name: DeleteService._snapshot_value(getattr(instance, field.attname))
+                        for field in fields
+                    }
+                ))
+                logs.append(ActivityLog(
+                    user=user,
+                    action_type='delete',
+                    model_name=model_name,
+                    object_id=original_id,
+                    related_object_repr=object_repr,
+                    description=f"Permanently deleted: {reason}"
+                ))
+            
+            with transaction.atomic():
+                DeletedRecord.objects.bulk_create(records)
+                log_activities(logs)
+                if issubclass(model, (Appointment, DependentAppointment)):
+                    # One tombstone insert and one stamp bump per chunk, not per row
+                    with calendar_sync.bulk_removal(calendar_sync.appointment_type_of(model), chunk), \
+                            versioning.bulk_appointment_changes(chunk):
+                        model._base_manager.filter(pk__in=pks).delete()
+                else:
+                    model._base_manager.filter(pk__in=pks).delete()
+            deleted += len(pks)
@@ -0,0 +1,214 @@
+"""
+Throttled background worker for appointment archival jobs
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from website.models import Appointment, DependentAppointment
+from website.archive_models import ArchiveJob
+from website.services.archive_service import ArchiveService, ARCHIVABLE_STATUSES
+
+
+def parse_quiet_hours(value):
+    """
+    Parse quiet-hours windows such as "22:00-06:00,12:30-13:30".
+
+    Returns a list of (start, end) time pairs. A window whose end is before
+    its start wraps past midnight.
+    """
+    windows = []
+    for chunk in (value or '').split(','):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        try:
+            start_str, end_str = chunk.split('-')
+            start = datetime.strptime(start_str.strip(), '%H:%M').time()
+            end = datetime.strptime(end_str.strip(), '%H:%M').time()
+        except ValueError:
+            raise ValueError(f"Invalid quiet-hours window '{chunk}', expected HH:MM-HH:MM")
+        windows.append((start, end))
+    return windows
+
+
+class ArchiveWorker:
+    """
+    Process queued ArchiveJob rows in small, short-lived transactions.
+
+    Each batch locks at most `batch_size` appointments (skipping rows that a
+    clinic request already holds), archives them with set-based writes and
+    advances the job cursor in the same transaction, so a killed worker
+    resumes exactly where it stopped. Rows skipped because they were locked
+    sit below the cursor; once a pass runs dry the cursors are rewound and
+    the table re-scanned for them, up to `max_rescans` times per run.
+    """
+
+    def __init__(self, rows_per_second=50, batch_size=200, quiet_hours=None, log=None, max_rescans=3, rescan_delay=5):
+        self.rows_per_second = rows_per_second
+        self.batch_size = batch_size
+        self.max_rescans = max_rescans
+        self.rescan_delay = rescan_delay
+        self.quiet_hours = quiet_hours or []
+        self.log = log or (lambda message: None)
+
+    # ---------- Scheduling ----------
+    def in_quiet_hours(self, now=None):
+        """Archival only runs inside the quiet-hours windows (always, if none are set)"""
+        if not self.quiet_hours:
+            return True
+        current = timezone.localtime(now or timezone.now()).time()
+        for start, end in self.quiet_hours:
+            if start <= end:
+                if start <= current < end:
+                    return True
+            elif current >= start or current < end:
+                return True
+        return False
+
+    def next_job(self):
+        """Resume an interrupted job first, otherwise take the oldest queued one"""
+        return ArchiveJob.objects.filter(
+            status__in=['running', 'queued']
+        ).order_by('-status', 'created_at').first()
+
+    # ---------- Job lifecycle ----------
+    @staticmethod
+    def enqueue(days, user=None):
+        """Queue an archival job for appointments older than `days`"""
+        cutoff = timezone.now() - timedelta(days=days)
+        estimate = sum(
+            model.objects.filter(start_time__lt=cutoff, status__in=ARCHIVABLE_STATUSES).count()
+            for model in (Appointment, DependentAppointment)
+        )
+        return ArchiveJob.objects.create(
+            days=days,
+            cutoff=cutoff,
+            total_estimate=estimate,
+            requested_by=user,
+        )
+
+    def _start(self, job):
+        if job.status == 'queued':
+            job.status = 'running'
+            job.started_at = timezone.now()
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.finished_at = timezone.now()
+        job.heartbeat_at = job.finished_at
+        job.last_error = error
+        job.save(update_fields=['status', 'finished_at', 'heartbeat_at', 'last_error'])
+
+    # ---------- Batches ----------
+    SOURCES = [
+        (Appointment, 'self', 'last_appointment_id', ['patient__patient_profile', 'doctor__user', 'doctor__specialization']),
+        (DependentAppointment, 'dependent', 'last_dependent_appointment_id', ['dependent_patient', 'doctor__user', 'doctor__specialization']),
+    ]
+
+    def process_batch(self, job):
+        """Archive the next batch for `job`. Returns the number of rows archived."""
+        reason = f'Auto-archived (older than {job.days} days)'
+
+        for model, appointment_type, cursor_field, related in self.SOURCES:
+            with transaction.atomic():
+                batch = list(
+                    model.objects.select_for_update(skip_locked=True, of=('self',))
+                    .filter(
+                        pk__gt=getattr(job, cursor_field),
+                        start_time__lt=job.cutoff,
+                        status__in=ARCHIVABLE_STATUSES,
+                    )
+                    .select_related(*related)
+                    .order_by('pk')[:self.batch_size]
+                )
+                if not batch:
+                    continue
+
+                ArchiveService.archive_appointment_batch(batch, appointment_type, job.requested_by, reason)
+
+                setattr(job, cursor_field, batch[-1].pk)
+                job.archived_count += len(batch)
+                job.heartbeat_at = timezone.now()
+                job.save(update_fields=[cursor_field, 'archived_count', 'heartbeat_at'])
+                return len(batch)
+
+        return 0
+
+    def rewind(self, job):
+        """
+        Reset the cursors to re-scan for rows a previous pass skipped while
+        they were locked. Archived rows are gone from the source tables, so
+        anything eligible at or below a cursor was skipped. Returns whether
+        any such row exists.
+        """
+        skipped = any(
+            model.objects.filter(
+                pk__lte=getattr(job, cursor_field),
+                start_time__lt=job.cutoff,
+                status__in=ARCHIVABLE_STATUSES,
+            ).exists()
+            for model, _, cursor_field, _ in self.SOURCES
+        )
+        if skipped:
+            job.last_appointment_id = 0
+            job.last_dependent_appointment_id = 0
+            job.save(update_fields=['last_appointment_id', 'last_dependent_appointment_id'])
+        return skipped
+
+    def run_job(self, job, stop_outside_quiet_hours=True):
+        """Run `job` to completion, throttled to `rows_per_second`"""
+        self._start(job)
+        self.log(f"Running {job}")
+
+        rescans = 0
+        try:
+            while True:
+                job.refresh_from_db(fields=['status'])
+                if job.status == 'cancelled':
+                    self.log(f"Job #{job.pk} cancelled")
+                    return job
+
+                if stop_outside_quiet_hours and not self.in_quiet_hours():
+                    self.log(f"Outside quiet hours, pausing job #{job.pk}")
+                    return job
+
+                started = time.monotonic()
+                processed = self.process_batch(job)
+                if not processed:
+                    if rescans < self.max_rescans and self.rewind(job):
+                        rescans += 1
+                        self.log(f"Job #{job.pk}: re-scanning for rows skipped while locked")
+                        # Give the requests holding those locks time to finish
+                        time.sleep(self.rescan_delay)
+                        continue
+                    self._finish(job, 'completed')
+                    self.log(f"Job #{job.pk} completed: {job.archived_count} appointments archived")
+                    return job
+
+                # Throttle: spread the batch over processed / rows_per_second seconds
+                if self.rows_per_second:
+                    elapsed = time.monotonic() - started
+                    time.sleep(max(0, processed / self.rows_per_second - elapsed))
+
+        except Exception as e:
+            self._finish(job, 'failed', error=str(e))
+            self.log(f"Job #{job.pk} failed: {e}")
+            raise
+
+    def run_forever(self, poll_interval=30):
+        """Daemon loop: wait for quiet hours and queued jobs, then process them"""
+        while True:
+            job = self.next_job() if self.in_quiet_hours() else None
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            try:
+                self.run_job(job)
+            except Exception:
+                # Failure is recorded on the job; keep serving other jobs
+                time.sleep(poll_interval)
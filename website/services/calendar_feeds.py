@@ -0,0 +1,169 @@
+"""
+Row builders for the calendar and day-list JSON endpoints
+
+The endpoints read plain tuples with values_list(): patient and doctor
+names are concatenated in SQL, so no model instances are built and the
+payload is assembled in a single pass over the rows.
+
+The calendar feeds can also be sent columnar (`?format=columnar`): one
+array per field instead of one object per event, times as epoch minutes
+and statuses as indexes into a dictionary sent once. The browser expands
+it back into events with static/js/calendar_columnar.js.
+
+The staff month grid only needs counts, so it is drawn from
+month_summary() and a day's events are fetched when it is opened.
+"""
+from django.db.models import CharField, Count, Value
+from django.db.models.functions import Concat, Trim, TruncDate
+
+from website.models import Appointment, DependentAppointment
+from website.services.calendar_sync import event_id
+
+STATUS_COLORS = {
+    'pending': '#ffc107',        # yellow
+    'approved': '#28a745',       # green
+    'completed': '#6c757d',      # gray
+    'rejected': '#dc3545',       # red
+    'no_show': '#17a2b8',        # blue/info
+}
+DEFAULT_COLOR = '#ffc107'
+
+# (appointment_type, model, patient relation)
+SOURCES = (
+    ('self', Appointment, 'patient'),
+    ('dependent', DependentAppointment, 'dependent_patient'),
+)
+
+
+def full_name(relation):
+    """SQL "first last" for `relation`, matching User.get_full_name()"""
+    return Trim(Concat(
+        f'{relation}__first_name', Value(' '), f'{relation}__last_name',
+        output_field=CharField(),
+    ))
+
+
+def _rows(queryset, relation, *extra):
+    return queryset.annotate(
+        patient_full_name=full_name(relation)
+    ).values_list('id', 'patient_full_name', 'start_time', 'end_time', 'status', *extra)
+
+
+def calendar_events(querysets, limit):
+    """
+    FullCalendar events for `querysets`, a {appointment_type: queryset} map
+    already filtered to the visible window; at most `limit` per type.
+    """
+    events = []
+    colors = STATUS_COLORS
+    for appointment_type, _, relation in SOURCES:
+        queryset = querysets.get(appointment_type)
+        if queryset is None:
+            continue
+        prefix = event_id(appointment_type, '')
+        rows = _rows(queryset, relation).order_by('start_time')[:limit]
+        events.extend(
+            {
+                "id": f"{prefix}{pk}",
+                "title": f"{name} ({status})",
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "color": colors.get(status, DEFAULT_COLOR),
+            }
+            for pk, name, start, end, status in rows
+        )
+    return events
+
+
+def calendar_columns(querysets, limit):
+    """
+    calendar_events() in the columnar format: parallel arrays, `start`
+    in epoch minutes, `duration` in minutes, `type` and `status` as
+    indexes into `types` (event id prefixes) and `statuses`.
+    """
+    statuses = [status for status, _ in Appointment.STATUS_CHOICES]
+    status_index = {status: index for index, status in enumerate(statuses)}
+    columns = {key: [] for key in ('type', 'id', 'name', 'status', 'start', 'duration')}
+    types = []
+    for appointment_type, _, relation in SOURCES:
+        queryset = querysets.get(appointment_type)
+        if queryset is None:
+            continue
+        type_index = len(types)
+        types.append(event_id(appointment_type, ''))
+        for pk, name, start, end, status in _rows(queryset, relation).order_by('start_time')[:limit]:
+            if status not in status_index:
+                status_index[status] = len(statuses)
+                statuses.append(status)
+            start_minute = int(start.timestamp()) // 60
+            columns['type'].append(type_index)
+            columns['id'].append(pk)
+            columns['name'].append(name)
+            columns['status'].append(status_index[status])
+            columns['start'].append(start_minute)
+            columns['duration'].append(int(end.timestamp()) // 60 - start_minute)
+
+    return {
+        "format": "columnar",
+        "types": types,
+        "statuses": statuses,
+        "colors": [STATUS_COLORS.get(status, DEFAULT_COLOR) for status in statuses],
+        **columns,
+    }
+
+
+def month_summary(querysets, zone):
+    """
+    Appointment counts per calendar day (in `zone`) and status for
+    `querysets` ({appointment_type: queryset}), from one grouped query:
+    {"YYYY-MM-DD": {status: count}}.
+    """
+    grouped = [
+        queryset.annotate(day=TruncDate('start_time', tzinfo=zone))
+        .values_list('day', 'status').annotate(total=Count('id')).order_by()
+        for queryset in querysets.values()
+    ]
+    if not grouped:
+        return {}
+    rows = grouped[0].union(*grouped[1:], all=True) if len(grouped) > 1 else grouped[0]
+
+    days = {}
+    for day, status, total in rows:
+        counts = days.setdefault(day.isoformat(), {})
+        counts[status] = counts.get(status, 0) + total
+    return days
+
+
+def day_appointments(querysets, with_doctor=False, event_ids=False, zone=None):
+    """
+    Day-list rows for `querysets` ({appointment_type: queryset}), sorted by
+    start time. `with_doctor` adds doctor_name; `event_ids` uses calendar
+    event ids instead of bare primary keys; times are shown in `zone` if given.
+    """
+    extra = ('doctor_full_name',) if with_doctor else ()
+    rows = []
+    for appointment_type, _, relation in SOURCES:
+        queryset = querysets.get(appointment_type)
+        if queryset is None:
+            continue
+        if with_doctor:
+            queryset = queryset.annotate(doctor_full_name=full_name('doctor__user'))
+        prefix = event_id(appointment_type, '') if event_ids else None
+        rows.extend((prefix, row) for row in _rows(queryset, relation, *extra))
+
+    rows.sort(key=lambda item: item[1][2])
+    data = []
+    for prefix, (pk, name, start, end, status, *doctor) in rows:
+        if zone is not None:
+            start, end = start.astimezone(zone), end.astimezone(zone)
+        item = {
+            "id": f"{prefix}{pk}" if prefix else pk,
+            "patient_name": name,
+            "start_time": start.strftime("%I:%M %p"),
+            "end_time": end.strftime("%I:%M %p"),
+            "status": status,
+        }
+        if with_doctor:
+            item["doctor_name"] = doctor[0]
+        data.append(item)
+    return data
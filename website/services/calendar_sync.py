@@ -0,0 +1,127 @@
+"""
+Delta sync for the staff and doctor calendars
+
+Live appointments carry updated_at; appointments that leave the live
+calendars (deleted, or soft-archived in place) leave an
+AppointmentTombstone. A client holding a cursor asks for everything that
+changed since it, and gets the changed events plus the ids to drop.
+
+Cursors are server timestamps. Each poll re-reads a short overlap before
+the cursor so rows committed slightly out of timestamp order are not
+missed; clients apply changes idempotently, so repeats are harmless.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from website.models import Appointment, DependentAppointment, AppointmentTombstone
+
+# Re-read window before each cursor
+OVERLAP = timedelta(seconds=5)
+
+_state = threading.local()
+
+
+def appointment_type_of(model):
+    return 'dependent' if issubclass(model, DependentAppointment) else 'self'
+
+
+def event_id(appointment_type, pk):
+    """Calendar event id shared by the full feeds and the delta feed"""
+    return f"{'dep' if appointment_type == 'dependent' else 'self'}-{pk}"
+
+
+# ---------- Tombstones ----------
+def record_removed(appointment_type, appointments):
+    """Tombstone `appointments` in one insert"""
+    now = timezone.now()
+    AppointmentTombstone.objects.bulk_create([
+        AppointmentTombstone(
+            appointment_type=appointment_type,
+            appointment_id=appointment.pk,
+            doctor_id=appointment.doctor_id,
+            removed_at=now,
+        )
+        for appointment in appointments
+    ])
+
+
+@contextmanager
+def bulk_removal(appointment_type, appointments):
+    """
+    Tombstone `appointments` with one insert and silence the per-row
+    post_delete tombstones while the block deletes them.
+    """
+    record_removed(appointment_type, appointments)
+    previous = getattr(_state, 'suppressed', False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+# ---------- Signal handlers (connected in WebsiteConfig.ready) ----------
+def appointment_deleted(sender, instance, **kwargs):
+    if not getattr(_state, 'suppressed', False):
+        record_removed(appointment_type_of(sender), [instance])
+
+
+def appointment_saved(sender, instance, created=False, **kwargs):
+    # Soft-archiving a single appointment saves archived_at on the row
+    if not created and instance.archived_at is not None:
+        record_removed(appointment_type_of(sender), [instance])
+
+
+# ---------- Reading ----------
+def changes(since, doctor=None, window=None, limit=2000):
+    """
+    Live appointments updated and ids removed since `since`.
+
+    Returns (changed, removed, complete); with a `window`, changed rows
+    outside it are reported as removed. `complete` is False when more
+    than `limit` rows changed and the client should reload instead.
+    """
+    after = since - OVERLAP
+    changed = []
+    for model, related in ((Appointment, 'patient'), (DependentAppointment, 'dependent_patient')):
+        queryset = model.objects.filter(updated_at__gte=after).select_related(related)
+        if doctor is not None:
+            queryset = queryset.filter(doctor=doctor)
+        rows = list(queryset.order_by('updated_at')[:limit + 1])
+        if len(rows) > limit:
+            return [], [], False
+        changed.extend((appointment_type_of(model), row) for row in rows)
+
+    tombstones = AppointmentTombstone.objects.filter(removed_at__gte=after)
+    if doctor is not None:
+        tombstones = tombstones.filter(doctor_id=doctor.pk)
+    removed = {
+        event_id(appointment_type, pk)
+        for appointment_type, pk in tombstones.values_list('appointment_type', 'appointment_id')[:limit + 1]
+    }
+    if len(removed) > limit:
+        return [], [], False
+
+    # A row that is live now was restored after its tombstone
+    removed -= {event_id(appointment_type, row.pk) for appointment_type, row in changed}
+    if window is not None:
+        # Moved out of the visible range: the client drops its stale event
+        inside = []
+        for appointment_type, row in changed:
+            if window[0] <= row.start_time < window[1]:
+                inside.append((appointment_type, row))
+            else:
+                removed.add(event_id(appointment_type, row.pk))
+        changed = inside
+    return changed, sorted(removed), True
+
+
+def prune(older_than):
+    """Delete tombstones older than `older_than`; returns the number deleted"""
+    with transaction.atomic():
+        deleted, _ = AppointmentTombstone.objects.filter(removed_at__lt=older_than).delete()
+    return deleted
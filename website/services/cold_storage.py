@@ -0,0 +1,306 @@
+"""
+Cold-storage tier for aged archive rows
+
+Rows older than a cutoff are moved out of the database into immutable
+segment files under ARCHIVE_COLD_STORAGE_DIR:
+
+    <tier>/<segment>.jsonl.gz      one gzip member per row (JSON line)
+    <tier>/<segment>.<key>.idx     sorted fixed-width (key, offset, length) records
+
+Every row is its own gzip member, so a segment is still a plain gzip
+stream while any single row can be inflated from its offset alone. The
+indexes are binary-searched through mmap, so a lookup touches a few pages
+per segment instead of scanning it.
+"""
+import gzip
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from website.archive_models import ArchivedAppointment, ArchivedMedicalRecord, DeletedRecord
+
+
+SEGMENT_SUFFIX = '.jsonl.gz'
+TOMBSTONES = 'tombstones.log'
+
+# Index record: key (NUL padded), byte offset, compressed length
+KEY_SIZE = 40
+INDEX_RECORD = struct.Struct(f'>{KEY_SIZE}sQI')
+
+SEGMENT_ROWS = 10000
+DELETE_CHUNK = 500
+
+
+class _Encoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder truncates datetimes to milliseconds; keep them exact"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _pk(row):
+    return row['pk']
+
+
+def _owner_id(row):
+    return row['fields'].get('original_patient_id') or row['fields'].get('original_dependent_id')
+
+
+class Tier:
+    """
+    A model that can be moved to cold storage, with the keys it is indexed
+    by; each key function takes a serialized row ({'pk': ..., 'fields': {...}})
+    """
+
+    def __init__(self, name, model, age_field, keys):
+        self.name = name
+        self.model = model
+        self.age_field = age_field
+        self.keys = keys
+
+    @property
+    def directory(self):
+        return os.path.join(settings.ARCHIVE_COLD_STORAGE_DIR, self.name)
+
+
+TIERS = {
+    'appointments': Tier('appointments', ArchivedAppointment, 'archived_at', {
+        'id': lambda row: row['fields']['original_appointment_id'],
+        'patient': _owner_id,
+        # The archive row's own pk, used by the audit and restore views
+        'pk': _pk,
+    }),
+    'medical_records': Tier('medical_records', ArchivedMedicalRecord, 'archived_at', {
+        'id': lambda row: row['fields']['original_record_id'],
+        'patient': _owner_id,
+        'pk': _pk,
+    }),
+    'deleted_records': Tier('deleted_records', DeletedRecord, 'deleted_at', {
+        'id': lambda row: row['fields']['original_id'],
+        'pk': _pk,
+    }),
+}
+
+
+def _encode_key(value):
+    """Fixed-width sortable key; integers are zero padded so they sort numerically"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, int):
+        value = str(value).rjust(20, '0')
+    return str(value).encode()[:KEY_SIZE].ljust(KEY_SIZE, b'\0')
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ColdRow:
+    """A row read back from a segment"""
+
+    def __init__(self, tier, segment, offset, data):
+        self.tier = tier
+        self.segment = segment
+        self.offset = offset
+        self.data = data
+
+    @property
+    def fields(self):
+        return self.data['fields']
+
+    def deserialize(self):
+        return next(serializers.deserialize('python', [self.data]))
+
+    @property
+    def instance(self):
+        """Unsaved model instance, for display alongside live rows"""
+        return self.deserialize().object
+
+
+# ---------- Writing ----------
+def _write_segment(tier, rows):
+    """Write `rows` as a new segment; it becomes visible only once fully on disk"""
+    os.makedirs(tier.directory, exist_ok=True)
+    name = f"{timezone.now():%Y%m%dT%H%M%S}-{rows[0].pk}-{rows[-1].pk}"
+    segment_path = os.path.join(tier.directory, name + SEGMENT_SUFFIX)
+
+    entries = {key_name: [] for key_name in tier.keys}
+    with open(segment_path + '.tmp', 'wb') as out:
+        for data in serializers.serialize('python', rows):
+            payload = gzip.compress(json.dumps(data, cls=_Encoder).encode() + b'\n')
+            offset = out.tell()
+            out.write(payload)
+            for key_name, key_func in tier.keys.items():
+                key = _encode_key(key_func(data))
+                if key is not None:
+                    entries[key_name].append((key, offset, len(payload)))
+        out.flush()
+        os.fsync(out.fileno())
+
+    for key_name, items in entries.items():
+        items.sort()
+        index_path = os.path.join(tier.directory, f'{name}.{key_name}.idx')
+        with open(index_path + '.tmp', 'wb') as out:
+            for item in items:
+                out.write(INDEX_RECORD.pack(*item))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(index_path + '.tmp', index_path)
+
+    # Readers list segments, so publish the segment after its indexes
+    os.replace(segment_path + '.tmp', segment_path)
+    _fsync_dir(tier.directory)
+    return name
+
+
+def tier_rows(tier_name, cutoff, segment_rows=SEGMENT_ROWS, log=None):
+    """
+    Move rows of `tier_name` older than `cutoff` into new segments.
+
+    Rows are deleted from the database only after their segment is durable,
+    so a crash can at worst leave a row in both places (rehydrating it just
+    rewrites the same pk). Returns the number of rows moved.
+    """
+    tier = TIERS[tier_name]
+    queryset = tier.model.objects.filter(**{f'{tier.age_field}__lt': cutoff}).order_by('pk')
+
+    moved = 0
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:segment_rows])
+        if not rows:
+            return moved
+        last_pk = rows[-1].pk
+
+        name = _write_segment(tier, rows)
+        pks = [row.pk for row in rows]
+        for i in range(0, len(pks), DELETE_CHUNK):
+            tier.model.objects.filter(pk__in=pks[i:i + DELETE_CHUNK]).delete()
+
+        moved += len(rows)
+        if log:
+            log(f"{tier.name}: {len(rows)} rows -> {name}")
+
+
+# ---------- Reading ----------
+def _segments(tier):
+    """Segment names, newest first"""
+    if not os.path.isdir(tier.directory):
+        return []
+    return sorted(
+        (f[:-len(SEGMENT_SUFFIX)] for f in os.listdir(tier.directory) if f.endswith(SEGMENT_SUFFIX)),
+        reverse=True
+    )
+
+
+def _tombstones(tier):
+    path = os.path.join(tier.directory, TOMBSTONES)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {tuple(line.split()) for line in f if line.strip()}
+
+
+def _search_index(path, key):
+    """(offset, length) of every entry equal to `key`, by binary search over the mmap'd index"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            width = INDEX_RECORD.size
+            count = size // width
+
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if index[mid * width:mid * width + KEY_SIZE] < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+
+            matches = []
+            while lo < count:
+                entry_key, offset, length = INDEX_RECORD.unpack_from(index, lo * width)
+                if entry_key != key:
+                    break
+                matches.append((offset, length))
+                lo += 1
+            return matches
+
+
+def find(tier_name, key_name, value):
+    """
+    All cold rows of `tier_name` whose `key_name` equals `value`, newest
+    segment first. Segments written before a key existed have no index for
+    it and are skipped.
+    """
+    tier = TIERS[tier_name]
+    key = _encode_key(value)
+    if key is None:
+        return []
+
+    tombstones = _tombstones(tier)
+    results = []
+    for name in _segments(tier):
+        index_path = os.path.join(tier.directory, f'{name}.{key_name}.idx')
+        if not os.path.exists(index_path):
+            continue
+        matches = _search_index(index_path, key)
+        if not matches:
+            continue
+
+        with open(os.path.join(tier.directory, name + SEGMENT_SUFFIX), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as segment:
+                for offset, length in matches:
+                    if (name, str(offset)) in tombstones:
+                        continue
+                    data = json.loads(gzip.decompress(segment[offset:offset + length]))
+                    # Keys are truncated to KEY_SIZE; confirm the full value
+                    if str(tier.keys[key_name](data)) == str(value):
+                        results.append(ColdRow(tier, name, offset, data))
+    return results
+
+
+def rehydrate(tier_name, key_name, value):
+    """
+    Copy matching cold rows back into the database with their original pk.
+
+    The segment stays untouched (segments are append-only); the rows are
+    tombstoned once the transaction commits so they are not returned again.
+    """
+    tier = TIERS[tier_name]
+    rows = find(tier_name, key_name, value)
+    if not rows:
+        return []
+
+    with transaction.atomic():
+        instances = []
+        for row in rows:
+            deserialized = row.deserialize()
+            deserialized.save()
+            instances.append(deserialized.object)
+
+        def write_tombstones():
+            with open(os.path.join(tier.directory, TOMBSTONES), 'a') as f:
+                f.writelines(f"{row.segment} {row.offset}\n" for row in rows)
+                f.flush()
+                os.fsync(f.fileno())
+
+        transaction.on_commit(write_tombstones)
+
+    return instances
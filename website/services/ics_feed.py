@@ -0,0 +1,106 @@
+"""
+iCalendar (.ics) subscription feed of a doctor's approved appointments
+
+The feed covers a bounded window around today and is streamed as it is
+generated. The finished body is cached under the doctor's version stamp
+and today's date, so repeat polls by calendar apps are served from the
+cache until an appointment or the date changes.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from website.models import Appointment, DependentAppointment
+from website.services import versioning
+from website.services.calendar_sync import event_id
+
+CACHE_SECONDS = 24 * 60 * 60
+LINE_LIMIT = 75  # octets per content line (RFC 5545 3.1)
+
+
+def _window():
+    today = timezone.localdate()
+    start = timezone.make_aware(datetime.combine(today, datetime.min.time())) - timedelta(days=getattr(settings, 'ICS_FEED_PAST_DAYS', 30))
+    end = start + timedelta(
+        days=getattr(settings, 'ICS_FEED_PAST_DAYS', 30) + getattr(settings, 'ICS_FEED_FUTURE_DAYS', 180)
+    )
+    return start, end
+
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Fold a content line at LINE_LIMIT octets, never splitting a UTF-8 sequence"""
+    data = line.encode()
+    if len(data) <= LINE_LIMIT:
+        return data + b'\r\n'
+    parts = []
+    limit = LINE_LIMIT
+    while len(data) > limit:
+        cut = limit
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut])
+        data = data[cut:]
+        limit = LINE_LIMIT - 1  # continuation lines start with a space
+    parts.append(data)
+    return b'\r\n '.join(parts) + b'\r\n'
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def generate(doctor, host):
+    """Yield the feed for `doctor` in chunks of encoded lines"""
+    start, end = _window()
+    name = _escape(f"Dr. {doctor.user.get_full_name()} appointments")
+    yield b''.join(_fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//West Point Clinic//Appointments//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{name}',
+    ])
+
+    for model, appointment_type in ((Appointment, 'self'), (DependentAppointment, 'dependent')):
+        rows = model.objects.filter(
+            doctor=doctor, status='approved', start_time__gte=start, start_time__lt=end
+        ).order_by('start_time').values_list('id', 'start_time', 'end_time', 'updated_at')
+
+        for pk, start_time, end_time, updated_at in rows.iterator(chunk_size=500):
+            # Patient names are left out: feed URLs end up on third-party calendar servers
+            yield b''.join(_fold(line) for line in [
+                'BEGIN:VEVENT',
+                f'UID:{event_id(appointment_type, pk)}@{host}',
+                f'DTSTAMP:{_utc(updated_at)}',
+                f'DTSTART:{_utc(start_time)}',
+                f'DTEND:{_utc(end_time)}',
+                'SUMMARY:Patient appointment',
+                'STATUS:CONFIRMED',
+                'END:VEVENT',
+            ])
+
+    yield _fold('END:VCALENDAR')
+
+
+def cache_key(doctor_id, host):
+    """Key for the doctor's feed at the current version stamp and date"""
+    key = versioning.doctor_key(doctor_id)
+    version = versioning.version_of(key)
+    return f'ics:{key}:v{version}:{timezone.localdate():%Y%m%d}:{host}'
+
+
+def caching(chunks, key):
+    """Pass `chunks` through, storing the whole body under `key` once it completes"""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(body), CACHE_SECONDS)
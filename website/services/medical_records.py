@@ -0,0 +1,60 @@
+"""
+Write path for a new medical record with its prescriptions
+
+The record is one INSERT; the prescriptions and the medications they add
+to the patient's list are written with one bulk_create each, and the
+whole change is audited by a single ActivityLog entry, all in one
+transaction. bulk_create skips Prescription.save(), so the medications
+come from Prescription.build_medication() here instead; the record's own
+post_save signal marks the patient as changed for the details cache.
+"""
+from django.db import transaction
+
+from website.models import DependentPatientMedication, PatientMedication, Prescription
+from website.services.activity_log import log_activity
+
+
+def create_medical_record(record_form, prescription_formset, user, patient=None, dependent_patient=None):
+    """
+    Validate the bound record form and prescription formset, then save
+    them for `patient` or `dependent_patient`. Returns the record, or
+    None when either is invalid (errors stay on the forms).
+    """
+    if not (record_form.is_valid() and prescription_formset.is_valid()):
+        return None
+
+    with transaction.atomic():
+        record = record_form.save(commit=False)
+        record.created_by = user
+        record.patient = patient
+        record.dependent_patient = dependent_patient
+        record.save()
+
+        # Filled-in, non-deleted forms, linked to the record but unsaved
+        prescription_formset.instance = record
+        prescriptions = prescription_formset.save(commit=False)
+        for prescription in prescriptions:
+            prescription.created_by = user
+        Prescription.objects.bulk_create(prescriptions)
+
+        medications = [
+            medication for medication in (p.build_medication() for p in prescriptions)
+            if medication is not None
+        ]
+        model = PatientMedication if patient is not None else DependentPatientMedication
+        model.objects.bulk_create(medications)
+
+        description = None
+        if prescriptions:
+            description = "Prescriptions: " + ", ".join(p.medication_name for p in prescriptions)
+            if medications:
+                description += f" ({len(medications)} added to medications)"
+        log_activity(
+            user=user,
+            action_type="create",
+            model_name="MedicalRecord",
+            object_id=str(record.id),
+            related_object_repr=str(record),
+            description=description,
+        )
+    return record
@@ -0,0 +1,153 @@
+"""
+Keyset (seek) pagination for timestamp-ordered lists, and for lists
+ordered by any unique column tuple (union_keyset_page)
+"""
+import base64
+import heapq
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+
+
+PAGE_SIZE = 25
+
+
+def encode_cursor(timestamp, pk, tag=''):
+    """Opaque, URL-safe cursor for the row (timestamp, tag, pk)"""
+    payload = json.dumps([timestamp.isoformat(), tag, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; returns None for a missing or malformed cursor"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, tag, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(tag), pk
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows plus the cursor of the page after it"""
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _seek(queryset, field, cursor, tag):
+    """Rows of `queryset` strictly after `cursor` in (field, tag, pk) descending order"""
+    if cursor is None:
+        return queryset
+    timestamp, cursor_tag, cursor_pk = cursor
+
+    after = Q(**{f'{field}__lt': timestamp})
+    if tag < cursor_tag:
+        after |= Q(**{field: timestamp})
+    elif tag == cursor_tag:
+        after |= Q(**{field: timestamp, 'pk__lt': cursor_pk})
+    return queryset.filter(after)
+
+
+def merged_keyset_page(sources, cursor=None, per_page=PAGE_SIZE, field='archived_at'):
+    """
+    Newest-first page over several querysets sharing a timestamp `field`.
+
+    `sources` is a list of (tag, queryset). Each source is read with an
+    index-friendly `ORDER BY field DESC, id DESC LIMIT per_page + 1` after the
+    cursor, and the sorted chunks are merged, so every page costs one short
+    query per source however deep it is.
+    """
+    cursor = decode_cursor(cursor) if isinstance(cursor, str) else cursor
+
+    chunks = []
+    for tag, queryset in sources:
+        rows = _seek(queryset, field, cursor, tag).order_by(f'-{field}', '-pk')[:per_page + 1]
+        chunks.append([(getattr(obj, field), tag, obj.pk, obj) for obj in rows])
+
+    merged = list(islice(
+        heapq.merge(*chunks, key=lambda row: row[:3], reverse=True),
+        per_page + 1
+    ))
+
+    next_cursor = None
+    if len(merged) > per_page:
+        timestamp, tag, pk, _ = merged[per_page - 1]
+        next_cursor = encode_cursor(timestamp, pk, tag)
+
+    return KeysetPage([row[3] for row in merged[:per_page]], next_cursor)
+
+
+def keyset_page(queryset, cursor=None, per_page=PAGE_SIZE, field='archived_at'):
+    """Newest-first page of a single queryset ordered by `field`"""
+    return merged_keyset_page([('', queryset)], cursor, per_page, field)
+
+
+# ---------- Ordered-key pagination ----------
+def encode_key(values):
+    """Opaque, URL-safe cursor for a row's sort key"""
+    payload = json.dumps(list(values), separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_key(token, size):
+    """Inverse of encode_key; returns None unless the cursor holds `size` values"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) and len(values) == size else None
+
+
+def _after_key(fields, values, descending):
+    """Q for rows strictly after `values` in (fields) order"""
+    op = 'lt' if descending else 'gt'
+    after = Q()
+    for index, field in enumerate(fields):
+        step = Q(**{f'{field}__{op}': values[index]})
+        for earlier, value in zip(fields[:index], values):
+            step &= Q(**{earlier: value})
+        after |= step
+    return after
+
+
+def union_keyset_page(querysets, fields, cursor=None, per_page=PAGE_SIZE, descending=False):
+    """
+    Page over the UNION ALL of `querysets` ordered by `fields`.
+
+    The querysets are values() querysets with the same columns; `fields`
+    must include a column that is unique across all of them last. Each
+    branch is filtered past the cursor and the database merges the
+    ordered branches, so a page is one query however deep it is.
+    """
+    values = decode_key(cursor, len(fields)) if isinstance(cursor, str) else cursor
+    if values is not None:
+        after = _after_key(fields, values, descending)
+        querysets = [queryset.filter(after) for queryset in querysets]
+
+    union = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    ordering = [f'-{field}' if descending else field for field in fields]
+    rows = list(union.order_by(*ordering)[:per_page + 1])
+
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_key(rows[per_page - 1][field] for field in fields)
+    return KeysetPage(rows[:per_page], next_cursor)
@@ -0,0 +1,216 @@
+"""
+Monthly range partitioning for append-only tables (PostgreSQL only)
+
+A partitioned table gets one child per calendar month, named
+<table>_pYYYYMM, plus a <table>_pdefault catch-all so an insert never
+fails for lack of a partition. Queries bounded by the partition column
+are pruned to the matching months, and retention is a DETACH/DROP of a
+whole month instead of a large DELETE.
+
+PostgreSQL requires the partition column in every unique constraint, so
+a converted table's primary key becomes (id, <column>); ids still come
+from the table's identity sequence and stay unique.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from website.models import ActivityLog
+from website.archive_models import ArchivedAppointment
+
+
+class PartitionedTable:
+    """A model whose table can be range partitioned by month on `column`"""
+
+    def __init__(self, name, model, field):
+        self.name = name
+        self.model = model
+        self.field = field
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def column(self):
+        return self.model._meta.get_field(self.field).column
+
+
+TABLES = {
+    'activity_log': PartitionedTable('activity_log', ActivityLog, 'timestamp'),
+    'archived_appointments': PartitionedTable('archived_appointments', ArchivedAppointment, 'archived_at'),
+}
+
+
+def supported():
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value):
+    """First instant (UTC) of the month containing `value`"""
+    value = value.astimezone(dt_timezone.utc) if value.tzinfo else value.replace(tzinfo=dt_timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _partition_name(partitioned, month):
+    return f'{partitioned.table}_p{month:%Y%m}'
+
+
+def _literal(month):
+    # Bounds are generated here, never user input; DDL cannot take bind parameters
+    return f"'{month:%Y-%m-%d %H:%M:%S}+00'"
+
+
+# ---------- Introspection ----------
+def is_partitioned(partitioned):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [partitioned.table]
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(partitioned):
+    """Monthly partitions attached to the table, as {month start: name}, oldest first"""
+    prefix = f'{partitioned.table}_p'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [partitioned.table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = {}
+    for name in names:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            months[datetime.strptime(suffix, '%Y%m').replace(tzinfo=dt_timezone.utc)] = name
+    return dict(sorted(months.items()))
+
+
+# ---------- Maintenance ----------
+def create_partition(partitioned, month):
+    """Create the partition for `month` if it does not exist yet; returns its name"""
+    name = _partition_name(partitioned, month)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{partitioned.table}" '
+            f'FOR VALUES FROM ({_literal(month)}) TO ({_literal(add_months(month, 1))})'
+        )
+    return name
+
+
+def ensure_partitions(partitioned, months_ahead, now=None):
+    """Partitions for the current month and the next `months_ahead`; returns the ones created"""
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    existing = partitions(partitioned)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            with transaction.atomic():
+                created.append(create_partition(partitioned, month))
+    return created
+
+
+def expire_partitions(partitioned, keep_months, drop=False, now=None):
+    """
+    Detach (or drop) partitions that ended more than `keep_months` months ago.
+
+    A detached partition is an ordinary table again, so it can be dumped
+    or dropped later; `drop` removes it straight away. Returns the names.
+    """
+    cutoff = add_months(month_start(now or datetime.now(dt_timezone.utc)), -keep_months)
+    expired = []
+    for month, name in partitions(partitioned).items():
+        if add_months(month, 1) > cutoff:
+            break
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE "{partitioned.table}" DETACH PARTITION "{name}"')
+                if drop:
+                    cursor.execute(f'DROP TABLE "{name}"')
+        expired.append(name)
+    return expired
+
+
+@transaction.atomic
+def convert(partitioned, months_ahead=3):
+    """
+    Rebuild an ordinary table as a monthly partitioned one, keeping its rows,
+    indexes, foreign keys and id sequence. Takes an exclusive lock for the copy.
+    """
+    table = partitioned.table
+    column = partitioned.column
+    old = f'{table}_unpartitioned'
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(%s)",
+            [table]
+        )
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise ValueError(f"{table} is referenced by foreign keys ({', '.join(referencing)})")
+
+        # Everything to recreate once the old table is gone
+        cursor.execute(
+            "SELECT i.indexname, i.indexdef FROM pg_indexes i JOIN pg_index x "
+            "ON x.indexrelid = to_regclass(quote_ident(i.schemaname) || '.' || quote_ident(i.indexname)) "
+            "WHERE i.tablename = %s AND NOT x.indisunique",
+            [table]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE contype = 'f' AND conrelid = to_regclass(%s)",
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT MIN("{column}"), MAX("{column}") FROM "{table}"')
+        oldest, newest = cursor.fetchone()
+        # Tables created before identity columns use a serial sequence owned by the old table
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id'), attidentity = '' FROM pg_attribute "
+            "WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+            [table, table]
+        )
+        sequence, serial = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+        cursor.execute(
+            f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING IDENTITY '
+            f'INCLUDING CONSTRAINTS) PARTITION BY RANGE ("{column}")'
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY ("id", "{column}")')
+        if serial and sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."id"')
+        cursor.execute(f'CREATE TABLE "{table}_pdefault" PARTITION OF "{table}" DEFAULT')
+
+        now = datetime.now(dt_timezone.utc)
+        month = month_start(oldest or now)
+        last = add_months(month_start(max(newest or now, now)), months_ahead)
+        while month <= last:
+            create_partition(partitioned, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+        cursor.execute(f'DROP TABLE "{old}"')
+
+        # Captured before the rename, so the definitions already name `table`
+        for name, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM \"{table}\"",
+            [table]
+        )
@@ -0,0 +1,136 @@
+"""
+Staff patient directory: self patients and dependents in one list
+
+Both kinds are projected to the same columns and read as a single
+UNION ALL ordered by (last name, first name, patient id). Patient ids are
+unique across the two tables ('P…' and 'D…'), which makes the key total.
+
+The doctor's panel (doctor_panel) uses the same projection, restricted to
+the doctor's patients and annotated with per-patient visit aggregates.
+"""
+from django.db.models import (
+    CharField, Count, DateTimeField, Exists, F, IntegerField, Max, Min, OuterRef, Subquery, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from website.models import (
+    Appointment, DependentAppointment, DependentPatient, DependentPatientVitals,
+    PatientInfo, PatientVitals,
+)
+from website.services.calendar_feeds import full_name
+from website.services.pagination import PAGE_SIZE, union_keyset_page
+
+SORT_FIELDS = ('last_name_key', 'first_name_key', 'patient_id_key')
+
+MAX_PAGE_SIZE = 100
+
+
+def _self_patients():
+    return PatientInfo.objects.annotate(
+        last_name_key=F('user__last_name'),
+        first_name_key=F('user__first_name'),
+        patient_id_key=F('patient_id'),
+        patient_type=Value('self', output_field=CharField()),
+        age_value=F('age'),
+        gender_value=F('gender'),
+        guardian_name=Value('', output_field=CharField()),
+    )
+
+
+def _dependents():
+    return DependentPatient.objects.annotate(
+        last_name_key=F('last_name'),
+        first_name_key=F('first_name'),
+        patient_id_key=F('patient_id'),
+        patient_type=Value('dependent', output_field=CharField()),
+        age_value=F('age'),
+        gender_value=F('gender'),
+        guardian_name=full_name('guardian'),
+    )
+
+
+def page(cursor=None, descending=False, per_page=PAGE_SIZE):
+    """One directory page of plain dicts; `cursor` comes from the previous page"""
+    querysets = [
+        queryset.values(*SORT_FIELDS, 'patient_type', 'age_value', 'gender_value', 'guardian_name').order_by()
+        for queryset in (_self_patients(), _dependents())
+    ]
+    result = union_keyset_page(querysets, SORT_FIELDS, cursor, per_page, descending)
+    result.items = [
+        {
+            'patient_id': row['patient_id_key'],
+            'patient_type': row['patient_type'],
+            'first_name': row['first_name_key'],
+            'last_name': row['last_name_key'],
+            'age': row['age_value'],
+            'gender': row['gender_value'],
+            'guardian_name': row['guardian_name'] or None,
+        }
+        for row in result.items
+    ]
+    return result
+
+
+# ---------- Doctor's patient panel ----------
+# ?sort= values and the column each one orders by
+PANEL_SORTS = {
+    'name': 'last_name_key',
+    'last_visit': 'last_visit',
+    'visits': 'visit_count',
+    'next_appointment': 'next_appointment',
+    'latest_vitals': 'latest_vitals',
+}
+PANEL_COLUMNS = SORT_FIELDS + (
+    'patient_type', 'age_value', 'gender_value',
+    'last_visit', 'visit_count', 'next_appointment', 'latest_vitals',
+)
+
+
+def _aggregate(queryset, group_by, aggregate, output_field):
+    """Correlated scalar subquery: `aggregate` over `queryset` for the outer patient"""
+    return Subquery(
+        queryset.order_by().values(group_by).annotate(value=aggregate).values('value')[:1],
+        output_field=output_field,
+    )
+
+
+def _panel_annotations(appointments, group_by, vitals):
+    now = timezone.now()
+    completed = appointments.filter(status='completed')
+    upcoming = appointments.filter(status__in=['pending', 'approved'], start_time__gte=now)
+    return {
+        'last_visit': _aggregate(completed, group_by, Max('start_time'), DateTimeField()),
+        'visit_count': Coalesce(
+            _aggregate(completed, group_by, Count('pk'), IntegerField()), 0,
+            output_field=IntegerField(),
+        ),
+        'next_appointment': _aggregate(upcoming, group_by, Min('start_time'), DateTimeField()),
+        'latest_vitals': _aggregate(vitals, group_by, Max('recorded_at'), DateTimeField()),
+    }
+
+
+def doctor_panel(doctor, sort='name'):
+    """
+    The doctor's patients (self and dependent) as one UNION ALL queryset of
+    dicts with visit aggregates, ordered by `sort` (a PANEL_SORTS key,
+    '-' prefix for descending). Ready for a Paginator.
+    """
+    self_appointments = Appointment.objects.filter(doctor=doctor, patient=OuterRef('user'))
+    dependent_appointments = DependentAppointment.objects.filter(
+        doctor=doctor, dependent_patient=OuterRef('pk')
+    )
+    patients = _self_patients().filter(Exists(self_appointments)).annotate(**_panel_annotations(
+        self_appointments, 'patient', PatientVitals.objects.filter(patient=OuterRef('pk')),
+    ))
+    dependents = _dependents().filter(Exists(dependent_appointments)).annotate(**_panel_annotations(
+        dependent_appointments, 'dependent_patient',
+        DependentPatientVitals.objects.filter(dependent_patient=OuterRef('pk')),
+    ))
+
+    descending = sort.startswith('-')
+    column = PANEL_SORTS.get(sort.lstrip('-'), 'last_name_key')
+    ordering = F(column).desc(nulls_last=True) if descending else F(column).asc(nulls_last=True)
+    return patients.values(*PANEL_COLUMNS).order_by().union(
+        dependents.values(*PANEL_COLUMNS).order_by(), all=True
+    ).order_by(ordering, *SORT_FIELDS)
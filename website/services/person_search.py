@@ -0,0 +1,240 @@
+"""
+Typeahead search over patients, dependents and doctors
+
+Every person is broken into lowercased, accent-stripped tokens (name
+words, patient id, email, phone, license number) stored in
+PersonSearchToken next to a ready-to-show label. A query matches a person
+when each query word is a prefix of one of their tokens: the longest word
+is looked up through the token index, the others through EXISTS on
+(person_type, person_key, token), so a search is one indexed query.
+
+The table is kept current by the signal handlers below (connected in
+WebsiteConfig.ready); `rebuild_person_search` regenerates it after bulk
+loads that bypass signals.
+"""
+import re
+import unicodedata
+
+from django.db.models import Exists, OuterRef
+
+from accounts.models import Phone
+from website.models import DependentPatient, DoctorInfo, PatientInfo, PersonSearchToken
+
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 20
+TOKEN_LENGTH = PersonSearchToken._meta.get_field('token').max_length
+
+_WORD = re.compile(r'[a-z0-9]+')
+_PHONE_QUERY = re.compile(r'^\+?[\d\s()-]+$')
+
+
+# ---------- Tokens ----------
+def normalize(text):
+    """Lowercase and strip accents ('Peña' -> 'pena')"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+
+def _phone_digits(value):
+    digits = re.sub(r'\D', '', value or '')
+    # Stored numbers are 09xxxxxxxxx; accept +63 / 63 prefixes in queries
+    if digits.startswith('63'):
+        digits = '0' + digits[2:]
+    return digits
+
+
+def document_tokens(*texts, email=None, phones=()):
+    """Tokens for one person: every word of `texts`, plus the whole email and phone numbers"""
+    tokens = set()
+    for text in texts:
+        tokens.update(_WORD.findall(normalize(text)))
+    if email:
+        email = normalize(email)
+        tokens.add(email)
+        tokens.update(_WORD.findall(email.split('@')[0]))
+    for phone in phones:
+        digits = _phone_digits(phone)
+        if digits:
+            tokens.add(digits)
+    return {token[:TOKEN_LENGTH] for token in tokens}
+
+
+def query_tokens(query):
+    """Query words, each to be matched as a token prefix; longest first"""
+    query = (query or '').strip()
+    if '@' in query:
+        words = [normalize(query)]
+    elif _PHONE_QUERY.match(query) and len(re.sub(r'\D', '', query)) >= 3:
+        words = [_phone_digits(query)]
+    else:
+        words = _WORD.findall(normalize(query))
+    return sorted({word[:TOKEN_LENGTH] for word in words}, key=len, reverse=True)
+
+
+# ---------- Indexing ----------
+def _store(person_type, person_key, label, detail, tokens):
+    PersonSearchToken.objects.filter(person_type=person_type, person_key=person_key).delete()
+    PersonSearchToken.objects.bulk_create([
+        PersonSearchToken(
+            token=token, person_type=person_type, person_key=person_key,
+            label=label[:301], detail=detail[:255],
+        )
+        for token in tokens
+    ])
+
+
+def _user_phone(user):
+    phone = Phone.objects.filter(user_id=user.pk).values_list('number', flat=True).first()
+    return [phone] if phone else []
+
+
+def _patient_entry(patient, phones=None):
+    user = patient.user
+    label = user.get_full_name() or user.username
+    detail = ' · '.join(part for part in (patient.patient_id, user.email) if part)
+    tokens = document_tokens(
+        user.first_name, user.last_name, patient.patient_id,
+        email=user.email, phones=_user_phone(user) if phones is None else phones,
+    )
+    return 'patient', patient.patient_id, label, detail, tokens
+
+
+def _dependent_entry(dependent, phones=None):
+    guardian = dependent.guardian
+    detail = f"{dependent.patient_id} · Guardian: {guardian.get_full_name() or guardian.username}"
+    tokens = document_tokens(
+        dependent.first_name, dependent.last_name, dependent.patient_id,
+        phones=[dependent.phone] if dependent.phone else [],
+    )
+    return 'dependent', dependent.patient_id, dependent.full_name, detail, tokens
+
+
+def _doctor_entry(doctor, phones=None):
+    user = doctor.user
+    specialization = doctor.specialization.name if doctor.specialization else ''
+    detail = ' · '.join(part for part in (specialization, doctor.license_number) if part)
+    tokens = document_tokens(
+        user.first_name, user.last_name, doctor.license_number,
+        email=user.email, phones=_user_phone(user) if phones is None else phones,
+    )
+    return 'doctor', str(doctor.pk), f"Dr. {user.get_full_name() or user.username}", detail, tokens
+
+
+def index_patient(patient):
+    _store(*_patient_entry(patient))
+
+
+def index_dependent(dependent):
+    _store(*_dependent_entry(dependent))
+
+
+def index_doctor(doctor):
+    _store(*_doctor_entry(doctor))
+
+
+def remove(person_type, person_key):
+    PersonSearchToken.objects.filter(person_type=person_type, person_key=str(person_key)).delete()
+
+
+def index_user(user_id):
+    """Re-index everyone whose tokens or label come from user `user_id`"""
+    for patient in PatientInfo.objects.filter(user_id=user_id).select_related('user'):
+        index_patient(patient)
+    for doctor in DoctorInfo.objects.filter(user_id=user_id).select_related('user', 'specialization'):
+        index_doctor(doctor)
+    # Dependents show their guardian's name
+    for dependent in DependentPatient.objects.filter(guardian_id=user_id).select_related('guardian'):
+        index_dependent(dependent)
+
+
+def rebuild(batch_size=1000):
+    """Regenerate the whole table; returns the number of people indexed"""
+    PersonSearchToken.objects.all().delete()
+    sources = (
+        (PatientInfo.objects.select_related('user'), _patient_entry),
+        (DependentPatient.objects.select_related('guardian'), _dependent_entry),
+        (DoctorInfo.objects.select_related('user', 'specialization'), _doctor_entry),
+    )
+    phones = dict(Phone.objects.values_list('user_id', 'number'))
+    people = 0
+    batch = []
+    for queryset, entry in sources:
+        for person in queryset.iterator(chunk_size=batch_size):
+            # Phones read up front instead of one query per person
+            phone = phones.get(getattr(person, 'user_id', None))
+            person_type, person_key, label, detail, tokens = entry(person, [phone] if phone else [])
+            batch.extend(
+                PersonSearchToken(
+                    token=token, person_type=person_type, person_key=person_key,
+                    label=label[:301], detail=detail[:255],
+                )
+                for token in tokens
+            )
+            people += 1
+            if len(batch) >= batch_size:
+                PersonSearchToken.objects.bulk_create(batch)
+                batch = []
+    PersonSearchToken.objects.bulk_create(batch)
+    return people
+
+
+# ---------- Searching ----------
+def search(query, limit=10, person_types=None):
+    """
+    People matching `query`, as dicts with type, id, label and detail.
+
+    Each query word must prefix one of the person's tokens.
+    """
+    words = query_tokens(query)
+    if not words or len(words[0]) < MIN_QUERY_LENGTH:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+
+    matches = PersonSearchToken.objects.filter(token__startswith=words[0])
+    if person_types:
+        matches = matches.filter(person_type__in=person_types)
+    for word in words[1:]:
+        matches = matches.filter(Exists(PersonSearchToken.objects.filter(
+            person_type=OuterRef('person_type'),
+            person_key=OuterRef('person_key'),
+            token__startswith=word,
+        )))
+
+    # Ordered by token (the prefix index's order) so the cut is stable and
+    # the shortest completions come first; a person can match on several
+    # tokens, so read a few extra and de-duplicate
+    people = {}
+    for person_type, person_key, label, detail in matches.values_list(
+            'person_type', 'person_key', 'label', 'detail').order_by('token', 'pk')[:limit * 4]:
+        people.setdefault((person_type, person_key), {
+            'type': person_type, 'id': person_key, 'label': label, 'detail': detail,
+        })
+    return sorted(people.values(), key=lambda person: person['label'].lower())[:limit]
+
+
+# ---------- Signal handlers (connected in WebsiteConfig.ready) ----------
+def patient_saved(sender, instance, **kwargs):
+    index_patient(instance)
+
+
+def dependent_saved(sender, instance, **kwargs):
+    index_dependent(instance)
+
+
+def doctor_saved(sender, instance, **kwargs):
+    index_doctor(instance)
+
+
+def person_deleted(sender, instance, **kwargs):
+    person_type = {PatientInfo: 'patient', DependentPatient: 'dependent', DoctorInfo: 'doctor'}[sender]
+    remove(person_type, instance.pk)
+
+
+def user_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    # Logins save last_login only
+    if not created and update_fields != frozenset({'last_login'}):
+        index_user(instance.pk)
+
+
+def phone_changed(sender, instance, **kwargs):
+    index_user(instance.user_id)
@@ -0,0 +1,237 @@
+"""
+Ranked full-text search over medical records
+
+PostgreSQL: a generated `search_vector` tsvector column on
+website_medicalrecord (reason and diagnosis weighted above symptoms) with
+a GIN index; queries use websearch_to_tsquery, ts_rank_cd and ts_headline.
+SQLite: an FTS5 table (porter stemming) kept in sync by triggers; queries
+use bm25() and snippet(). Both are created by `install_record_search`
+after migrate; without either, search falls back to icontains.
+
+Snippets are HTML-escaped with the matched words wrapped in <mark>.
+"""
+import logging
+import re
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils.html import escape
+
+from website.models import MedicalRecord
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'website_medicalrecord_fts'
+COLUMNS = ('reason_for_visit', 'symptoms', 'diagnosis')
+MAX_RESULTS = 50
+
+# Highlight markers the database puts around matches; swapped for <mark>
+# after escaping, so record text can never inject markup
+_START, _STOP = '\x02', '\x03'
+_WORD = re.compile(r'\w+')
+
+
+def _highlight(text):
+    return escape(text).replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+# ---------- Index installation ----------
+def _install_postgres(connection):
+    table = MedicalRecord._meta.db_table
+    vector = (
+        "setweight(to_tsvector('english', coalesce(reason_for_visit, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(diagnosis, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(symptoms, '')), 'B')"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS search_vector tsvector '
+            f'GENERATED ALWAYS AS ({vector}) STORED'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{table}_search_vector_gin" ON "{table}" USING gin (search_vector)'
+        )
+
+
+def _install_sqlite(connection):
+    table = MedicalRecord._meta.db_table
+    column_list = ', '.join(COLUMNS)
+    new_values = ', '.join(f'new.{c}' for c in COLUMNS)
+    old_values = ', '.join(f'old.{c}' for c in COLUMNS)
+
+    with connection.cursor() as cursor:
+        if FTS_TABLE in connection.introspection.table_names(cursor):
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5({column_list}, '
+            f"content='{table}', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            f'CREATE TRIGGER "{FTS_TABLE}_ai" AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{FTS_TABLE}"(rowid, {column_list}) VALUES (new.id, {new_values}); END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER "{FTS_TABLE}_ad" AFTER DELETE ON "{table}" BEGIN '
+            f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, {column_list}) VALUES (\'delete\', old.id, {old_values}); END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER "{FTS_TABLE}_au" AFTER UPDATE ON "{table}" BEGIN '
+            f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, {column_list}) VALUES (\'delete\', old.id, {old_values}); '
+            f'INSERT INTO "{FTS_TABLE}"(rowid, {column_list}) VALUES (new.id, {new_values}); END'
+        )
+        cursor.execute(f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES (\'rebuild\')')
+
+
+def install_record_search(using='default', **kwargs):
+    """post_migrate handler: create the medical record search index for the current backend"""
+    connection = connections[using]
+    if MedicalRecord._meta.db_table not in connection.introspection.table_names():
+        return
+
+    if connection.vendor == 'postgresql':
+        installer = _install_postgres
+    elif connection.vendor == 'sqlite' and 'ENABLE_FTS5' in _sqlite_options(connection):
+        installer = _install_sqlite
+    else:
+        return
+    try:
+        with transaction.atomic(using=using):
+            installer(connection)
+    except DatabaseError as e:
+        logger.warning("Could not create medical record search index: %s", e)
+
+
+def _sqlite_options(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return {row[0] for row in cursor.fetchall()}
+
+
+_installed = {}
+
+
+def _backend(connection):
+    """'postgresql', 'sqlite' or None when no index is installed"""
+    if connection.alias in _installed:
+        return _installed[connection.alias]
+    backend = _detect_backend(connection)
+    if backend:
+        _installed[connection.alias] = backend
+    return backend
+
+
+def _detect_backend(connection):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = 'search_vector'",
+                [MedicalRecord._meta.db_table]
+            )
+            return 'postgresql' if cursor.fetchone() else None
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return 'sqlite'
+    return None
+
+
+# ---------- Searching ----------
+def _scope_sql(alias, patient_id, dependent_id):
+    if patient_id:
+        return f' AND {alias}.patient_id = %s', [patient_id]
+    if dependent_id:
+        return f' AND {alias}.dependent_patient_id = %s', [dependent_id]
+    return '', []
+
+
+def _search_postgres(connection, query, limit, patient_id, dependent_id):
+    table = MedicalRecord._meta.db_table
+    scope, scope_params = _scope_sql('r', patient_id, dependent_id)
+    sql = (
+        "SELECT r.id, ts_rank_cd(r.search_vector, q) AS rank, "
+        "ts_headline('english', concat_ws(' · ', r.reason_for_visit, r.diagnosis, r.symptoms), q, %s) "
+        f'FROM "{table}" r, websearch_to_tsquery(\'english\', %s) q '
+        f"WHERE r.search_vector @@ q{scope} "
+        "ORDER BY rank DESC, r.created_at DESC LIMIT %s"
+    )
+    options = f'StartSel={_START}, StopSel={_STOP}, MaxWords=35, MinWords=15, MaxFragments=2'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [options, query, *scope_params, limit])
+        return cursor.fetchall()
+
+
+def _fts_query(query):
+    """Each word as a quoted prefix term, all required"""
+    return ' '.join(f'"{word}"*' for word in _WORD.findall(query))
+
+
+def _search_sqlite(connection, query, limit, patient_id, dependent_id):
+    match = _fts_query(query)
+    if not match:
+        return []
+    table = MedicalRecord._meta.db_table
+    scope, scope_params = _scope_sql('r', patient_id, dependent_id)
+    # bm25 is lower-is-better; weights follow the PostgreSQL A/B split
+    sql = (
+        f"SELECT f.rowid, -bm25(\"{FTS_TABLE}\", 2.0, 1.0, 2.0) AS rank, "
+        f"snippet(\"{FTS_TABLE}\", -1, %s, %s, '…', 16) "
+        f'FROM "{FTS_TABLE}" f JOIN "{table}" r ON r.id = f.rowid '
+        f'WHERE "{FTS_TABLE}" MATCH %s{scope} '
+        "ORDER BY rank DESC, r.created_at DESC LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_START, _STOP, match, *scope_params, limit])
+        return cursor.fetchall()
+
+
+def _search_fallback(queryset, query, limit):
+    words = _WORD.findall(query)
+    for word in words:
+        condition = Q()
+        for column in COLUMNS:
+            condition |= Q(**{f'{column}__icontains': word})
+        queryset = queryset.filter(condition)
+
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE) if words else None
+    rows = []
+    for pk, reason, symptoms, diagnosis in queryset.order_by('-created_at').values_list(
+            'pk', *COLUMNS)[:limit]:
+        text = ' · '.join(part for part in (reason, diagnosis, symptoms) if part)
+        if pattern:
+            text = pattern.sub(lambda m: f'{_START}{m.group(0)}{_STOP}', text)
+        rows.append((pk, 0.0, text[:300]))
+    return rows
+
+
+def search(query, patient=None, dependent_patient=None, limit=20):
+    """
+    Medical records matching `query`, best first, optionally for one
+    patient. Returns (record, rank, snippet_html) with records loaded
+    with their patient and author.
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+    patient_id = patient.pk if patient is not None else None
+    dependent_id = dependent_patient.pk if dependent_patient is not None else None
+
+    connection = connections[MedicalRecord.objects.db]
+    backend = _backend(connection)
+    if backend == 'postgresql':
+        rows = _search_postgres(connection, query, limit, patient_id, dependent_id)
+    elif backend == 'sqlite':
+        rows = _search_sqlite(connection, query, limit, patient_id, dependent_id)
+    else:
+        queryset = MedicalRecord.objects.all()
+        if patient_id:
+            queryset = queryset.filter(patient_id=patient_id)
+        elif dependent_id:
+            queryset = queryset.filter(dependent_patient_id=dependent_id)
+        rows = _search_fallback(queryset, query, limit)
+
+    records = MedicalRecord.objects.select_related(
+        'patient__user', 'dependent_patient', 'created_by'
+    ).in_bulk([row[0] for row in rows])
+    return [
+        (records[pk], rank, _highlight(snippet or ''))
+        for pk, rank, snippet in rows if pk in records
+    ]
@@ -0,0 +1,157 @@
+"""
+Indexed substring search for archive and audit lists
+
+PostgreSQL: pg_trgm GIN indexes on UPPER(column), which serve the
+`UPPER(column) LIKE UPPER(%term%)` that Django emits for icontains.
+SQLite: an FTS5 trigram table per model, kept in sync by triggers.
+Both are created by `install_search_indexes` after migrate.
+"""
+import logging
+import sqlite3
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from website.models import Appointment, DependentAppointment
+from website.archive_models import (
+    ArchivedPatientInfo, ArchivedDependentPatient, ArchivedAppointment,
+    ArchivedDoctorInfo, DeletedRecord
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Columns searched for each model
+SEARCH_FIELDS = {
+    ArchivedPatientInfo: ['user_full_name', 'original_patient_id', 'user_email'],
+    ArchivedDependentPatient: ['first_name', 'last_name', 'original_patient_id'],
+    ArchivedDoctorInfo: ['user_full_name', 'user_email', 'license_number'],
+    ArchivedAppointment: ['patient_name', 'doctor_name', 'doctor_specialization'],
+    DeletedRecord: ['object_repr', 'deletion_reason'],
+    # Soft-archived (flagged) appointments; searched with plain icontains
+    Appointment: [
+        'patient__first_name', 'patient__last_name',
+        'doctor__user__first_name', 'doctor__user__last_name', 'doctor__specialization__name',
+    ],
+    DependentAppointment: [
+        'dependent_patient__first_name', 'dependent_patient__last_name',
+        'doctor__user__first_name', 'doctor__user__last_name', 'doctor__specialization__name',
+    ],
+}
+
+# Trigram indexes cannot match terms shorter than a trigram
+MIN_INDEXED_LENGTH = 3
+
+_fts_tables = set()
+
+
+def _fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def _has_fts(connection, model):
+    """True when the FTS5 table for `model` exists on `connection`"""
+    key = (connection.alias, model)
+    if key not in _fts_tables:
+        if _fts_table(model) not in connection.introspection.table_names():
+            return False
+        _fts_tables.add(key)
+    return True
+
+
+def search(queryset, query):
+    """Filter `queryset` to rows whose search columns contain `query` (case-insensitive)"""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    model = queryset.model
+    connection = connections[queryset.db]
+
+    if (connection.vendor == 'sqlite'
+            and len(query) >= MIN_INDEXED_LENGTH
+            and _has_fts(connection, model)):
+        table = _fts_table(model)
+        phrase = '"' + query.replace('"', '""') + '"'
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM "{table}" WHERE "{table}" MATCH %s', [phrase])
+        )
+
+    conditions = Q()
+    for field in SEARCH_FIELDS[model]:
+        conditions |= Q(**{f'{field}__icontains': query})
+    return queryset.filter(conditions)
+
+
+# ---------- Index installation ----------
+def _install_postgres(connection, model, fields):
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        for field in fields:
+            column = model._meta.get_field(field).column
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{table}_{column}_trgm" '
+                f'ON "{table}" USING gin (UPPER("{column}") gin_trgm_ops)'
+            )
+
+
+def _install_sqlite(connection, model, fields):
+    table = model._meta.db_table
+    fts = _fts_table(model)
+    columns = [model._meta.get_field(field).column for field in fields]
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    new_values = ', '.join(f'new."{c}"' for c in columns)
+    old_values = ', '.join(f'old."{c}"' for c in columns)
+
+    with connection.cursor() as cursor:
+        if fts in connection.introspection.table_names(cursor):
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE "{fts}" USING fts5({column_list}, '
+            f"content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        cursor.execute(
+            f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"(rowid, {column_list}) VALUES (new.id, {new_values}); END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {column_list}) VALUES (\'delete\', old.id, {old_values}); END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {column_list}) VALUES (\'delete\', old.id, {old_values}); '
+            f'INSERT INTO "{fts}"(rowid, {column_list}) VALUES (new.id, {new_values}); END'
+        )
+        # Index rows that existed before the table was created
+        cursor.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')')
+
+
+def install_search_indexes(using='default', **kwargs):
+    """post_migrate handler: create the search indexes for the current backend"""
+    connection = connections[using]
+
+    if connection.vendor == 'postgresql':
+        installer = _install_postgres
+        try:
+            with transaction.atomic(using=using):
+                with connection.cursor() as cursor:
+                    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError as e:
+            logger.warning("pg_trgm unavailable, archive search stays unindexed: %s", e)
+            return
+    elif connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34, 0):
+        installer = _install_sqlite
+    else:
+        return
+
+    table_names = connection.introspection.table_names()
+    for model, fields in SEARCH_FIELDS.items():
+        if model._meta.db_table not in table_names or any('__' in field for field in fields):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                installer(connection, model, fields)
+        except DatabaseError as e:
+            logger.warning("Could not create search index for %s: %s", model.__name__, e)
@@ -0,0 +1,119 @@
+"""
+Clinical timeline of one patient or dependent
+
+Appointments, vitals, medications, allergies, medical records and
+prescriptions as one newest-first stream. Every table is read with its
+own seek query on a (patient, timestamp, id) index, aliased to a common
+`timeline_at` column, and the chunks are merged with heapq.merge by
+pagination.merged_keyset_page, so a page costs one query per table
+however far back it is.
+"""
+from django.db.models import F
+from django.urls import reverse
+
+from website.models import (
+    Appointment, DependentAppointment, DependentPatientAllergy, DependentPatientMedication,
+    DependentPatientVitals, MedicalRecord, PatientAllergy, PatientMedication, PatientVitals,
+    Prescription,
+)
+from website.services.pagination import PAGE_SIZE, merged_keyset_page
+
+MAX_PAGE_SIZE = 100
+
+
+def _sources(patient_type, patient):
+    """(tag, queryset) per table, each annotated with `timeline_at`"""
+    if patient_type == 'self':
+        owner = 'patient'
+        appointments = Appointment.objects.filter(patient_id=patient.user_id)
+        vitals, medications, allergies = PatientVitals, PatientMedication, PatientAllergy
+    else:
+        owner = 'dependent_patient'
+        appointments = DependentAppointment.objects.filter(dependent_patient=patient)
+        vitals, medications, allergies = (
+            DependentPatientVitals, DependentPatientMedication, DependentPatientAllergy
+        )
+
+    sources = (
+        ('appointment', appointments.select_related('doctor__user'), 'start_time'),
+        ('vitals', vitals.objects.filter(**{owner: patient}), 'recorded_at'),
+        ('medication', medications.objects.filter(**{owner: patient}), 'prescribed_at'),
+        ('allergy', allergies.objects.filter(**{owner: patient}), 'recorded_at'),
+        ('record', MedicalRecord.objects.filter(**{owner: patient}).select_related('created_by'), 'created_at'),
+        ('prescription', Prescription.objects.filter(**{f'medical_record__{owner}': patient}), 'prescribed_at'),
+    )
+    return [(tag, queryset.annotate(timeline_at=F(field))) for tag, queryset, field in sources]
+
+
+# ---------- Entries ----------
+def _join(*parts):
+    return ' · '.join(str(part) for part in parts if part)
+
+
+def _appointment(a):
+    return f"Appointment with Dr. {a.doctor.user.get_full_name()}", a.get_status_display(), None
+
+
+def _vitals(v):
+    return "Vitals recorded", _join(
+        v.blood_pressure and f"BP {v.blood_pressure}",
+        v.heart_rate and f"HR {v.heart_rate} bpm",
+        v.weight_kg and f"{v.weight_kg} kg",
+        v.height_cm and f"{v.height_cm} cm",
+    ), None
+
+
+def _medication(m):
+    return f"Medication: {m.medication_name}", _join(m.dosage, m.frequency), None
+
+
+def _allergy(a):
+    return f"Allergy: {a.allergy_name}", '', None
+
+
+def _record(r):
+    return (
+        r.reason_for_visit or "Medical Consultation",
+        _join(r.diagnosis and f"Diagnosis: {r.diagnosis}", r.created_by and r.created_by.get_full_name()),
+        reverse('view_medical_record', args=[r.pk]),
+    )
+
+
+def _prescription(p):
+    return (
+        f"Prescribed {p.medication_name}",
+        _join(p.dosage, p.frequency),
+        reverse('view_medical_record', args=[p.medical_record_id]),
+    )
+
+
+ENTRIES = {
+    'appointment': _appointment,
+    'vitals': _vitals,
+    'medication': _medication,
+    'allergy': _allergy,
+    'record': _record,
+    'prescription': _prescription,
+}
+
+
+def page(patient_type, patient, cursor=None, per_page=PAGE_SIZE):
+    """One newest-first timeline page of plain dicts; `cursor` comes from the previous page"""
+    sources = _sources(patient_type, patient)
+    tags = {queryset.model: tag for tag, queryset in sources}
+
+    result = merged_keyset_page(sources, cursor, per_page, field='timeline_at')
+    items = []
+    for obj in result.items:
+        kind = tags[type(obj)]
+        title, detail, url = ENTRIES[kind](obj)
+        items.append({
+            "type": kind,
+            "id": obj.pk,
+            "at": obj.timeline_at.isoformat(),
+            "title": title,
+            "detail": detail,
+            "url": url,
+        })
+    result.items = items
+    return result
@@ -0,0 +1,190 @@
+"""
+Change version stamps for conditional GETs
+
+Writes to appointments and availability bump a clinic-wide stamp and/or
+the doctor's stamp once their transaction commits (bumping after commit
+means a stamp never runs ahead of the data it describes). Read-only JSON
+views are wrapped in `versioned`, which turns the stamps into an
+ETag/Last-Modified so a matching If-None-Match is answered with 304 after
+a single stamp lookup, before the view runs.
+
+Each patient also has a stamp, bumped when anything shown in their
+details panel changes (profile, vitals, medications, allergies, records,
+appointments); the rendered panel is cached under it.
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from website.models import PatientInfo, VersionStamp
+
+CLINIC = 'clinic'
+
+_state = threading.local()
+
+
+def doctor_key(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def patient_key(patient_id):
+    """Stamp of a PatientInfo or DependentPatient (their ids never collide)"""
+    return f'patient:{patient_id}'
+
+
+def version_of(key):
+    return VersionStamp.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+
+def bump(keys):
+    """Increment the stamps for `keys` now, creating missing ones"""
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    now = timezone.now()
+    updated = VersionStamp.objects.filter(key__in=keys).update(version=F('version') + 1, updated_at=now)
+    if updated < len(keys):
+        VersionStamp.objects.bulk_create(
+            [VersionStamp(key=key, version=1, updated_at=now) for key in keys],
+            ignore_conflicts=True
+        )
+
+
+def bump_on_commit(keys):
+    """Bump `keys` after the current transaction commits; repeated calls are merged"""
+    pending = getattr(_state, 'keys', None)
+    if pending is None:
+        pending = _state.keys = set()
+    pending.update(keys)
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    keys, _state.keys = getattr(_state, 'keys', None), None
+    if keys:
+        bump(keys)
+
+
+def bump_doctors(doctor_ids, clinic=True):
+    """Mark the calendars of `doctor_ids` (and the clinic calendar) as changed"""
+    keys = [doctor_key(doctor_id) for doctor_id in doctor_ids if doctor_id]
+    if clinic:
+        keys.append(CLINIC)
+    bump_on_commit(keys)
+
+
+def bump_patients(patient_ids=(), user_ids=()):
+    """Mark patients as changed, given patient ids and/or the user ids of self patients"""
+    patient_ids = set(patient_ids)
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if user_ids:
+        patient_ids.update(PatientInfo.objects.filter(user_id__in=user_ids).values_list('pk', flat=True))
+    keys = [patient_key(patient_id) for patient_id in patient_ids if patient_id]
+    if keys:
+        bump_on_commit(keys)
+
+
+def bump_appointment_patients(appointments):
+    """Mark the patients of `appointments` (self and/or dependent) as changed"""
+    bump_patients(
+        patient_ids=[getattr(a, 'dependent_patient_id', None) for a in appointments],
+        user_ids=[getattr(a, 'patient_id', None) for a in appointments],
+    )
+
+
+@contextmanager
+def bulk_appointment_changes(appointments):
+    """
+    Bump the doctors and patients of `appointments` once and silence the
+    per-row appointment handlers while the block writes them (a queryset
+    delete() signals every row).
+    """
+    bump_doctors({appointment.doctor_id for appointment in appointments})
+    bump_appointment_patients(appointments)
+    previous = getattr(_state, 'suppressed', False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+# ---------- Signal handlers (connected in WebsiteConfig.ready) ----------
+def appointment_changed(sender, instance, **kwargs):
+    if getattr(_state, 'suppressed', False):
+        return
+    bump_doctors([instance.doctor_id])
+    # Last visit in the patient's details
+    bump_appointment_patients([instance])
+
+
+def patient_changed(sender, instance, **kwargs):
+    bump_patients([instance.pk])
+
+
+def patient_data_changed(sender, instance, **kwargs):
+    """Vitals, medications, allergies and medical records"""
+    bump_patients([getattr(instance, 'patient_id', None), getattr(instance, 'dependent_patient_id', None)])
+
+
+def patient_user_changed(sender, instance, **kwargs):
+    """User (name, email) and Phone rows shown in a self patient's details"""
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        return
+    bump_patients(user_ids=[getattr(instance, 'user_id', instance.pk)])
+
+
+def availability_changed(sender, instance, **kwargs):
+    bump_doctors([instance.doctor_id], clinic=False)
+
+
+# ---------- Conditional views ----------
+def _stamps(request, spec_func):
+    """(keys, vary, {key: (version, updated_at)}) for the request, read once"""
+    if not hasattr(request, '_version_stamps'):
+        spec = spec_func(request)
+        if spec is None:
+            request._version_stamps = None
+        else:
+            keys, vary = spec
+            stamps = {
+                key: (version, updated_at)
+                for key, version, updated_at in VersionStamp.objects.filter(
+                    key__in=keys
+                ).values_list('key', 'version', 'updated_at')
+            }
+            request._version_stamps = (keys, vary, stamps)
+    return request._version_stamps
+
+
+def versioned(spec_func):
+    """
+    condition() keyed on version stamps.
+
+    `spec_func(request)` returns (stamp keys, vary), where `vary` holds
+    anything else the response depends on (e.g. today's date), or None to
+    skip conditional handling. The ETag also covers the URL and the user.
+    """
+    def etag_func(request, *args, **kwargs):
+        stamps = _stamps(request, spec_func)
+        if stamps is None:
+            return None
+        keys, vary, versions = stamps
+        digest = hashlib.md5(
+            repr((request.get_full_path(), request.user.pk, vary)).encode()
+        ).hexdigest()[:12]
+        return '.'.join(str(versions.get(key, (0, None))[0]) for key in keys) + '-' + digest
+
+    def last_modified_func(request, *args, **kwargs):
+        stamps = _stamps(request, spec_func)
+        if stamps is None:
+            return None
+        modified = [updated_at for _, updated_at in stamps[2].values()]
+        return max(modified) if modified else None
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
@@ -0,0 +1,19 @@
+// Expands a ?format=columnar calendar feed back into FullCalendar events.
+// Plain event arrays (the default format) are returned unchanged.
+window.decodeCalendarColumns = function (data) {
+    if (Array.isArray(data)) return data;
+
+    const events = new Array(data.id.length);
+    for (let i = 0; i < events.length; i++) {
+        const status = data.statuses[data.status[i]];
+        const start = data.start[i] * 60000;
+        events[i] = {
+            id: data.types[data.type[i]] + data.id[i],
+            title: data.name[i] + " (" + status + ")",
+            start: new Date(start).toISOString(),
+            end: new Date(start + data.duration[i] * 60000).toISOString(),
+            color: data.colors[data.status[i]]
+        };
+    }
+    return events;
+};
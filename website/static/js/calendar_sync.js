@@ -0,0 +1,46 @@
+// Keeps an open FullCalendar in step with the server by polling the delta feed
+// (calendar/changes/) instead of reloading every event. Calendars that do not
+// show individual events (the staff month summary) pass `onChange`, which is
+// called instead of patching events whenever anything changed.
+window.startCalendarSync = function (calendar, url, intervalSeconds, onChange) {
+    let cursor = null;
+
+    function params() {
+        const view = calendar.view;
+        const query = new URLSearchParams({
+            start: calendar.formatIso(view.activeStart),
+            end: calendar.formatIso(view.activeEnd),
+            timeZone: calendar.getOption("timeZone")
+        });
+        if (cursor) query.set("since", cursor);
+        return query;
+    }
+
+    function poll() {
+        if (document.hidden) return;
+        fetch(url + "?" + params())
+            .then(res => res.json())
+            .then(data => {
+                if (data.reset && cursor) {
+                    calendar.refetchEvents();
+                } else if (onChange) {
+                    if (data.changed.length || data.removed.length) onChange();
+                } else {
+                    data.removed.forEach(id => {
+                        const event = calendar.getEventById(id);
+                        if (event) event.remove();
+                    });
+                    data.changed.forEach(item => {
+                        const event = calendar.getEventById(item.id);
+                        if (event) event.remove();
+                        calendar.addEvent(item);
+                    });
+                }
+                cursor = data.cursor;
+            })
+            .catch(err => console.error("Calendar sync failed:", err));
+    }
+
+    poll();
+    return setInterval(poll, intervalSeconds * 1000);
+};
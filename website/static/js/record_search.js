@@ -0,0 +1,39 @@
+// Full-text search box in the patient details panel. The panel is
+// injected with innerHTML, so the input calls this through oninput and
+// carries its endpoint in data-url.
+window.searchMedicalRecords = function (input) {
+    clearTimeout(input._searchTimer);
+    input._searchTimer = setTimeout(function () {
+        const results = input.nextElementSibling;
+        const list = results.nextElementSibling;
+        const query = input.value.trim();
+        if (!query) {
+            results.innerHTML = "";
+            list.style.display = "";
+            return;
+        }
+
+        fetch(input.dataset.url + "?q=" + encodeURIComponent(query))
+            .then(response => response.json())
+            .then(data => {
+                if (input.value.trim() !== query) return;
+                list.style.display = "none";
+                if (!data.results || !data.results.length) {
+                    results.innerHTML = '<p class="muted">No matching records.</p>';
+                    return;
+                }
+                // Snippets are escaped server-side, with matches in <mark>
+                results.innerHTML = data.results.map(r => `
+                    <div class="medical-record-card">
+                        <div class="record-info">
+                            <div class="record-diagnosis">${r.snippet}</div>
+                        </div>
+                        <div class="record-actions">
+                            <span class="record-date">${new Date(r.created_at).toLocaleDateString()}</span>
+                            <a href="${r.url}" class="record-btn"><i class="bi bi-eye"></i> View</a>
+                        </div>
+                    </div>`).join("");
+            })
+            .catch(err => console.error("Record search failed:", err));
+    }, 250);
+};
@@ -1,3 +1,1595 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Phone, User
+from website.archive_models import (
+    ArchiveJob, ArchivedAppointment, ArchivedDoctorInfo, ArchivedMedicalRecord, ArchivedPatientInfo,
+    DeletedRecord,
+)
+from website.forms import MedicalRecordForm, PrescriptionFormSet
+from website.models import (
+    ActivityLog, Appointment, AppointmentTombstone, CalendarFeedToken, DependentAppointment,
+    DependentPatient, DependentPatientAllergy, DependentPatientMedication, DoctorInfo,
+    MedicalRecord, PatientAllergy, PatientInfo, PatientMedication, PatientVitals, Prescription,
+    Specialization, VersionStamp,
+)
+from website.services import (
+    activity_log, calendar_feeds, calendar_sync, cold_storage, patient_directory, person_search,
+    record_search, timeline, versioning,
+)
+from website.services.archive_service import ArchiveService, DeleteService
+from website.services.archive_worker import ArchiveWorker, parse_quiet_hours
+from website.services.medical_records import create_medical_record
+
+
+def count_queries(func, *args, **kwargs):
+    """Run `func` and return (result, number of queries it issued)"""
+    with CaptureQueriesContext(connection) as context:
+        result = func(*args, **kwargs)
+    return result, len(context)
+
+
+class ClinicTestCase(TestCase):
+    """A staff user, a doctor and a patient with one dependent"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            'staff', 'staff@example.com', 'pw12345678', role='staff', first_name='Sam', last_name='Staff'
+        )
+        cls.specialization = Specialization.objects.create(name='General')
+        cls.doctor = cls.make_doctor('doc', 'Dan', 'Doc', 'L1')
+        cls.patient_user = User.objects.create_user(
+            'pat', 'pat@example.com', 'pw12345678', role='patient', first_name='Pat', last_name='Smith'
+        )
+        cls.patient = PatientInfo.objects.create(user=cls.patient_user, gender='M', birthdate=date(1990, 1, 1))
+        cls.dependent = DependentPatient.objects.create(
+            guardian=cls.patient_user, first_name='Kid', last_name='Smith', gender='F', birthdate=date(2015, 1, 1)
+        )
+
+    @classmethod
+    def make_doctor(cls, username, first_name, last_name, license_number):
+        user = User.objects.create_user(
+            username, f'{username}@example.com', 'pw12345678', role='doctor',
+            first_name=first_name, last_name=last_name
+        )
+        return DoctorInfo.objects.create(
+            user=user, specialization=cls.specialization, license_number=license_number, is_approved=True
+        )
+
+    def make_appointments(self, count, doctor=None, days_ago=200, status='completed', dependent=False):
+        doctor = doctor or self.doctor
+        appointments = []
+        for i in range(count):
+            start = timezone.now() - timedelta(days=days_ago, hours=i)
+            if dependent:
+                appointments.append(DependentAppointment.objects.create(
+                    dependent_patient=self.dependent, doctor=doctor, status=status,
+                    start_time=start, end_time=start + timedelta(minutes=30),
+                ))
+            else:
+                appointments.append(Appointment.objects.create(
+                    patient=self.patient_user, doctor=doctor, status=status,
+                    start_time=start, end_time=start + timedelta(minutes=30),
+                ))
+        return appointments
+
+    def load(self, model, appointments):
+        """Reload `appointments` joined the way the archive batch expects"""
+        related = ['doctor__user', 'doctor__specialization']
+        related.append('dependent_patient' if model is DependentAppointment else 'patient__patient_profile')
+        return list(
+            model.objects.filter(pk__in=[a.pk for a in appointments]).select_related(*related).order_by('pk')
+        )
+
+
+# ---------- Archive worker ----------
+class ArchiveWorkerTests(ClinicTestCase):
+    """Set-based archive batches, the job lifecycle and the job status endpoint"""
+
+    def test_batch_queries_do_not_grow_with_rows(self):
+        for model, appointment_type in ((Appointment, 'self'), (DependentAppointment, 'dependent')):
+            dependent = appointment_type == 'dependent'
+            three = self.load(model, self.make_appointments(3, dependent=dependent))
+            twelve = self.load(model, self.make_appointments(12, dependent=dependent))
+
+            _, three_queries = count_queries(ArchiveService.archive_appointment_batch, three, appointment_type, self.staff)
+            _, twelve_queries = count_queries(ArchiveService.archive_appointment_batch, twelve, appointment_type, self.staff)
+
+            self.assertEqual(three_queries, twelve_queries)
+            self.assertFalse(model.objects.exists())
+        self.assertEqual(ArchivedAppointment.objects.count(), 30)
+
+    def test_worker_batches_cost_the_same_queries(self):
+        self.make_appointments(15)
+        worker = ArchiveWorker(rows_per_second=0, batch_size=3)
+        job = ArchiveWorker.enqueue(days=90)
+
+        _, small_batch = count_queries(worker.process_batch, job)
+        worker.batch_size = 12
+        _, large_batch = count_queries(worker.process_batch, job)
+
+        self.assertEqual(small_batch, large_batch)
+        self.assertEqual(job.archived_count, 15)
+
+    def test_run_job_archives_only_old_finished_appointments(self):
+        old = self.make_appointments(4) + self.make_appointments(2, status='no_show', dependent=True)
+        pending = self.make_appointments(2, status='pending')
+        recent = self.make_appointments(1, days_ago=10)
+        worker = ArchiveWorker(rows_per_second=0, batch_size=3)
+        job = ArchiveWorker.enqueue(days=90)
+        self.assertEqual(job.total_estimate, 6)
+
+        worker.run_job(job, stop_outside_quiet_hours=False)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.archived_count), ('completed', 6))
+        self.assertEqual(
+            set(ArchivedAppointment.objects.values_list('original_appointment_id', flat=True)),
+            {a.pk for a in old},
+        )
+        self.assertEqual(
+            set(Appointment.objects.values_list('pk', flat=True)),
+            {a.pk for a in pending + recent},
+        )
+
+    def test_cancelled_job_stops_between_batches(self):
+        self.make_appointments(6)
+
+        class CancelledAfterFirstBatch(ArchiveWorker):
+            def process_batch(self, job):
+                processed = super().process_batch(job)
+                ArchiveJob.objects.filter(pk=job.pk).update(status='cancelled')
+                return processed
+
+        job = ArchiveWorker.enqueue(days=90)
+        CancelledAfterFirstBatch(rows_per_second=0, batch_size=2).run_job(job, stop_outside_quiet_hours=False)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.archived_count), ('cancelled', 2))
+        self.assertEqual(Appointment.objects.count(), 4)
+
+    def test_quiet_hours(self):
+        worker = ArchiveWorker(quiet_hours=parse_quiet_hours('22:00-06:00, 12:30-13:00'))
+
+        def at(hour, minute=0):
+            return timezone.make_aware(datetime(2026, 1, 5, hour, minute))
+
+        self.assertTrue(worker.in_quiet_hours(at(23)))
+        self.assertTrue(worker.in_quiet_hours(at(5, 59)))
+        self.assertTrue(worker.in_quiet_hours(at(12, 45)))
+        self.assertFalse(worker.in_quiet_hours(at(6)))
+        self.assertFalse(worker.in_quiet_hours(at(13)))
+        with self.assertRaises(ValueError):
+            parse_quiet_hours('22:00')
+
+    def test_job_status_endpoint(self):
+        self.make_appointments(2)
+        job = ArchiveWorker.enqueue(days=90)
+        url = reverse('archive_job_status', args=[job.pk])
+
+        self.client.force_login(self.patient_user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.staff)
+        data = self.client.get(url).json()
+        self.assertEqual((data['status'], data['total_estimate'], data['is_active']), ('queued', 2, True))
+        self.assertEqual(self.client.get(reverse('archive_job_status', args=[job.pk + 1])).status_code, 404)
+
+    def test_only_one_job_is_queued_at_a_time(self):
+        self.client.force_login(self.staff)
+        url = reverse('bulk_archive_appointments')
+
+        self.client.post(url, {'days': 90})
+        self.client.post(url, {'days': 30})
+
+        self.assertEqual(list(ArchiveJob.objects.values_list('days', flat=True)), [90])
+
+
+class ArchivePipelineTests(ClinicTestCase):
+    """archive_patient and archive_doctor cost the same however much history there is"""
+
+    def make_patient(self, username, appointments, records):
+        user = User.objects.create_user(username, f'{username}@example.com', 'pw12345678', role='patient')
+        patient = PatientInfo.objects.create(user=user, gender='F', birthdate=date(1985, 1, 1))
+        for i in range(appointments):
+            start = timezone.now() - timedelta(days=30 + i)
+            Appointment.objects.create(
+                patient=user, doctor=self.doctor, status='completed',
+                start_time=start, end_time=start + timedelta(minutes=30),
+            )
+        for i in range(records):
+            record = MedicalRecord.objects.create(
+                patient=patient, reason_for_visit=f'Visit {i}', symptoms='cough', diagnosis='flu',
+            )
+            Prescription.objects.create(medical_record=record, medication_name='Paracetamol', dosage='500mg', frequency='tid')
+            PatientAllergy.objects.create(patient=patient, allergy_name=f'Allergy {i}')
+            PatientVitals.objects.create(patient=patient, heart_rate=60 + i)
+        return patient
+
+    def test_archive_patient_queries_do_not_grow_with_history(self):
+        light = self.make_patient('light', appointments=1, records=1)
+        heavy = self.make_patient('heavy', appointments=8, records=5)
+
+        _, light_queries = count_queries(ArchiveService.archive_patient, light.pk, self.staff, 'moved')
+        _, heavy_queries = count_queries(ArchiveService.archive_patient, heavy.pk, self.staff, 'moved')
+
+        self.assertEqual(light_queries, heavy_queries)
+        archived = ArchivedPatientInfo.objects.get(original_patient_id=heavy.pk)
+        self.assertEqual(archived.additional_data['appointments_count'], 8)
+        self.assertEqual(archived.additional_data['allergies_count'], 5)
+        # Vitals are newest first, so the snapshot holds the last reading taken
+        self.assertEqual(archived.additional_data['latest_vitals']['heart_rate'], 64)
+        self.assertEqual(ArchivedMedicalRecord.objects.count(), 6)
+        self.assertFalse(MedicalRecord.objects.exists())
+
+    def test_archive_doctor_queries_do_not_grow_with_appointments(self):
+        small = self.make_doctor('doc2', 'Ann', 'Small', 'L2')
+        large = self.make_doctor('doc3', 'Bob', 'Large', 'L3')
+        self.make_appointments(3, doctor=small)
+        self.make_appointments(3, doctor=small, dependent=True)
+        self.make_appointments(12, doctor=large)
+        self.make_appointments(12, doctor=large, dependent=True)
+
+        _, small_queries = count_queries(ArchiveService.archive_doctor, small.pk, self.staff, 'left')
+        _, large_queries = count_queries(ArchiveService.archive_doctor, large.pk, self.staff, 'left')
+
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(ArchivedAppointment.objects.count(), 30)
+        self.assertEqual(
+            ArchivedDoctorInfo.objects.get(original_doctor_id=large.pk).additional_data['appointments_archived'], 24
+        )
+
+    def test_archiving_a_missing_doctor_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            ArchiveService.archive_doctor(self.doctor.pk + 100, self.staff)
+        self.assertFalse(ArchivedDoctorInfo.objects.exists())
+
+
+# ---------- Cold storage ----------
+class ColdStorageTests(ClinicTestCase):
+    """Aged archive rows move to segment files and are looked up through their indexes"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(ARCHIVE_COLD_STORAGE_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cutoff = timezone.now() - timedelta(days=365)
+
+    def archive(self, count, dependent=False):
+        model = DependentAppointment if dependent else Appointment
+        appointments = self.make_appointments(count, dependent=dependent)
+        ArchiveService.archive_appointment_batch(
+            self.load(model, appointments), 'dependent' if dependent else 'self', self.staff
+        )
+        ArchivedAppointment.objects.update(archived_at=self.cutoff - timedelta(days=1))
+        return appointments
+
+    def test_tiered_rows_are_found_by_id_and_patient(self):
+        own = self.archive(7)
+        dependents = self.archive(3, dependent=True)
+        archived_pks = list(ArchivedAppointment.objects.values_list('pk', flat=True))
+
+        moved = cold_storage.tier_rows('appointments', self.cutoff, segment_rows=4)
+
+        self.assertEqual(moved, 10)
+        self.assertFalse(ArchivedAppointment.objects.exists())
+        for appointment in own:
+            # Appointment and DependentAppointment ids overlap, so filter on the type
+            rows = [
+                row for row in cold_storage.find('appointments', 'id', appointment.pk)
+                if row.fields['appointment_type'] == 'self'
+            ]
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(rows[0].instance.start_time, appointment.start_time)
+        self.assertEqual(len(cold_storage.find('appointments', 'patient', self.patient.pk)), 7)
+        self.assertEqual(
+            sorted(row.fields['original_appointment_id'] for row in cold_storage.find('appointments', 'patient', self.dependent.pk)),
+            sorted(a.pk for a in dependents),
+        )
+        self.assertEqual(cold_storage.find('appointments', 'id', 999999), [])
+        for archived_pk in archived_pks:
+            self.assertEqual([row.data['pk'] for row in cold_storage.find('appointments', 'pk', archived_pk)], [archived_pk])
+
+    def test_rows_newer_than_the_cutoff_stay_in_the_database(self):
+        self.archive(2)
+        ArchivedAppointment.objects.update(archived_at=timezone.now())
+
+        self.assertEqual(cold_storage.tier_rows('appointments', self.cutoff), 0)
+        self.assertEqual(ArchivedAppointment.objects.count(), 2)
+
+    def test_keys_longer_than_key_size_are_told_apart(self):
+        prefix = 'x' * cold_storage.KEY_SIZE
+        for suffix in ('a', 'b'):
+            DeletedRecord.objects.create(
+                model_name='Appointment', original_id=prefix + suffix, object_repr=suffix,
+                deleted_at=self.cutoff - timedelta(days=1),
+            )
+
+        cold_storage.tier_rows('deleted_records', self.cutoff)
+
+        for suffix in ('a', 'b'):
+            rows = cold_storage.find('deleted_records', 'id', prefix + suffix)
+            self.assertEqual([row.fields['object_repr'] for row in rows], [suffix])
+        self.assertEqual(cold_storage.find('deleted_records', 'id', prefix), [])
+
+    def test_rehydrate_restores_the_row_and_tombstones_it(self):
+        appointment = self.archive(1)[0]
+        archived_pk = ArchivedAppointment.objects.get().pk
+        cold_storage.tier_rows('appointments', self.cutoff)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            restored = cold_storage.rehydrate('appointments', 'id', appointment.pk)
+
+        self.assertEqual([row.pk for row in restored], [archived_pk])
+        self.assertEqual(ArchivedAppointment.objects.get().original_appointment_id, appointment.pk)
+        self.assertEqual(cold_storage.find('appointments', 'id', appointment.pk), [])
+        self.assertEqual(cold_storage.rehydrate('appointments', 'id', appointment.pk), [])
+
+    def test_audit_and_restore_views_reach_tiered_rows(self):
+        appointment = self.archive(1)[0]
+        archived_pk = ArchivedAppointment.objects.get().pk
+        record = DeletedRecord.objects.create(
+            model_name='Appointment', original_id='4242', object_repr='Appointment #4242',
+            deleted_by=self.staff, deleted_at=self.cutoff - timedelta(days=1),
+            data_snapshot={'status': 'completed'},
+        )
+        for tier_name in ('appointments', 'deleted_records'):
+            cold_storage.tier_rows(tier_name, self.cutoff)
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse('deleted_records'), {'search': '4242'})
+        self.assertContains(response, 'Cold storage')
+        snapshot = self.client.get(reverse('deleted_record_snapshot_ajax', args=[record.pk])).json()
+        self.assertEqual(
+            (snapshot['original_id'], snapshot['deleted_by'], snapshot['data_snapshot']),
+            ('4242', 'Sam Staff', {'status': 'completed'}),
+        )
+        self.assertEqual(self.client.get(reverse('deleted_record_snapshot_ajax', args=[999999])).status_code, 404)
+
+        url = reverse('restore_archived_appointment', args=[archived_pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(reverse('restore_archived_appointment', args=[999999])).status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        self.assertEqual(Appointment.objects.get().start_time, appointment.start_time)
+        self.assertFalse(ArchivedAppointment.objects.exists())
+        self.assertEqual(cold_storage.find('appointments', 'pk', archived_pk), [])
+
+
+class BulkRestoreTests(ClinicTestCase):
+    """Archived appointments restore in a fixed number of queries"""
+
+    def archive_all(self):
+        ArchiveService.archive_appointment_batch(
+            self.load(Appointment, Appointment.objects.all()), 'self', self.staff
+        )
+        return list(ArchivedAppointment.objects.order_by('pk').values_list('pk', flat=True))
+
+    def test_restore_round_trip(self):
+        originals = sorted(
+            (a.start_time, a.status)
+            for a in self.make_appointments(3) + self.make_appointments(12, status='no_show')
+        )
+        archived_ids = self.archive_all()
+
+        (restored, skipped), three_queries = count_queries(ArchiveService.bulk_restore_appointments, archived_ids[:3])
+        self.assertEqual((len(restored), skipped), (3, []))
+        (restored, skipped), twelve_queries = count_queries(ArchiveService.bulk_restore_appointments, archived_ids[3:])
+        self.assertEqual((len(restored), skipped), (12, []))
+
+        self.assertEqual(three_queries, twelve_queries)
+        self.assertFalse(ArchivedAppointment.objects.exists())
+        self.assertEqual(sorted(Appointment.objects.values_list('start_time', 'status')), originals)
+
+    def test_rows_without_their_doctor_stay_archived(self):
+        other = self.make_doctor('doc2', 'Ann', 'Gone', 'L2')
+        kept = self.make_appointments(2)
+        self.make_appointments(1, doctor=other)
+        archived_ids = self.archive_all()
+        other.delete()
+
+        restored, skipped = ArchiveService.bulk_restore_appointments(archived_ids)
+
+        self.assertEqual(sorted(a.start_time for a in restored), sorted(a.start_time for a in kept))
+        self.assertEqual(len(skipped), 1)
+        self.assertEqual(list(ArchivedAppointment.objects.values_list('pk', flat=True)), skipped)
+
+    def test_batch_restore_endpoint(self):
+        self.make_appointments(2)
+        archived_ids = self.archive_all()
+        url = reverse('bulk_restore_archived_appointments')
+
+        self.client.force_login(self.patient_user)
+        self.client.post(url, {'archived_ids': archived_ids})
+        self.assertEqual(ArchivedAppointment.objects.count(), 2)
+
+        self.client.force_login(self.staff)
+        self.client.post(url, {'archived_ids': [str(archived_ids[0]), 'junk']})
+        self.assertEqual(list(ArchivedAppointment.objects.values_list('pk', flat=True)), archived_ids[1:])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+# ---------- Soft archival ----------
+@override_settings(ARCHIVE_STRATEGY='flag')
+class FlagStrategyTests(ClinicTestCase):
+    """ARCHIVE_STRATEGY = 'flag' stamps archived_at in place instead of copying rows"""
+
+    def flag(self, count=3, dependent=False):
+        model = DependentAppointment if dependent else Appointment
+        appointments = self.load(model, self.make_appointments(count, dependent=dependent))
+        ArchiveService.archive_appointment_batch(appointments, 'dependent' if dependent else 'self', self.staff)
+        return [a.pk for a in appointments]
+
+    def test_flagged_rows_are_hidden_from_the_default_manager(self):
+        self.flag()
+        self.flag(2, dependent=True)
+
+        self.assertFalse(ArchivedAppointment.objects.exists())
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(DependentAppointment.objects.exists())
+        self.assertEqual(Appointment.all_objects.filter(archived_at__isnull=False).count(), 3)
+        self.assertEqual(DependentAppointment.all_objects.filter(archived_at__isnull=False).count(), 2)
+
+        flagged = list(ArchiveService.flagged_appointments('self'))
+        self.assertEqual(len(flagged), 3)
+        self.assertEqual(
+            {(a.doctor_name, a.original_patient_id, a.soft_archived) for a in flagged},
+            {('Dan Doc', self.patient.pk, True)},
+        )
+        self.assertEqual(
+            {a.original_dependent_id for a in ArchiveService.flagged_appointments('dependent')},
+            {self.dependent.pk},
+        )
+
+    def test_unflag_restores_rows(self):
+        pks = self.flag()
+
+        self.assertEqual(ArchiveService.unflag_appointments('self', pks[:2] + [999999]), 2)
+        self.assertEqual(sorted(Appointment.objects.values_list('pk', flat=True)), pks[:2])
+        self.assertEqual(ArchiveService.unflag_appointments('self', pks[:2]), 0)
+
+    def test_live_rows_have_partial_indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Appointment._meta.db_table)
+        partial = {index.name: index.condition for index in Appointment._meta.indexes if index.condition}
+        for name in ('appt_live_doctor_idx', 'appt_live_patient_idx', 'appt_live_status_idx'):
+            self.assertIn(name, constraints)
+            self.assertEqual(partial[name].children, [('archived_at__isnull', True)])
+        self.assertEqual(partial['appt_archived_at_idx'].children, [('archived_at__isnull', False)])
+
+    def test_unarchive_and_list_views(self):
+        pks = self.flag(2)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('archived_appointments'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('unarchive_appointment', args=['self', pks[0]]))
+
+        self.client.post(reverse('unarchive_appointment', args=['self', pks[0]]))
+        self.client.post(reverse('bulk_restore_archived_appointments'), {'archived_ids': [f'self:{pks[1]}']})
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_patients_cannot_unarchive(self):
+        pk = self.flag(1)[0]
+
+        self.client.force_login(self.patient_user)
+        self.client.post(reverse('unarchive_appointment', args=['self', pk]))
+
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_flagged_rows_show_patient_names(self):
+        self.flag(1)
+        self.flag(1, dependent=True)
+
+        self.assertEqual(
+            [a.archived_patient_name for a in ArchiveService.flagged_appointments('dependent')], ['Kid Smith']
+        )
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('archived_appointments'))
+        self.assertContains(response, 'Pat Smith')
+        self.assertContains(response, 'Kid Smith')
+
+        pk = Appointment.all_objects.get().pk
+        self.assertContains(self.client.get(reverse('unarchive_appointment', args=['self', pk])), 'Pat Smith')
+
+
+# ---------- Activity log ----------
+def record_form_data(prescriptions, initial=0):
+    """POST data for MedicalRecordForm and PrescriptionFormSet"""
+    data = {
+        'reason_for_visit': 'Checkup', 'symptoms': 'Cough', 'diagnosis': 'Cold',
+        'prescriptions-TOTAL_FORMS': str(len(prescriptions)), 'prescriptions-INITIAL_FORMS': str(initial),
+    }
+    for i, fields in enumerate(prescriptions):
+        data.update({f'prescriptions-{i}-{name}': value for name, value in fields.items()})
+    return data
+
+
+def activity_log_inserts(context):
+    return sum('INSERT INTO "website_activitylog"' in query['sql'] for query in context.captured_queries)
+
+
+class ActivityLogBufferTests(ClinicTestCase):
+    """Entries are written only after commit, and once per buffered block"""
+
+    def test_entries_are_written_when_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            activity_log.log_activity(self.staff, 'create', 'Appointment', 1, description='Booked')
+            self.assertFalse(ActivityLog.objects.exists())
+
+        self.assertEqual(ActivityLog.objects.get().description, 'Booked')
+
+    def test_buffered_block_writes_one_bulk_insert(self):
+        with CaptureQueriesContext(connection) as context:
+            with activity_log.buffered():
+                for i in range(3):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        activity_log.log_activity(self.staff, 'update', 'Appointment', i)
+                self.assertFalse(ActivityLog.objects.exists())
+
+        self.assertEqual(activity_log_inserts(context), 1)
+        self.assertEqual(sorted(ActivityLog.objects.values_list('object_id', flat=True)), ['0', '1', '2'])
+
+    def test_rolled_back_work_leaves_no_log(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    activity_log.log_activity(self.staff, 'delete', 'Appointment', 1)
+                    raise ValidationError("rolled back")
+            except ValidationError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(ActivityLog.objects.exists())
+
+
+    def test_failed_flush_is_logged_not_raised(self):
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=DatabaseError("disk full")):
+            with self.assertLogs('website.services.activity_log', 'ERROR'):
+                with activity_log.buffered():
+                    with self.captureOnCommitCallbacks(execute=True):
+                        activity_log.log_activity(self.staff, 'update', 'Appointment', 1)
+
+    def test_failed_flush_keeps_the_blocks_own_exception(self):
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=DatabaseError("disk full")):
+            with self.assertLogs('website.services.activity_log', 'ERROR'):
+                with self.assertRaisesMessage(ValueError, "view failed"):
+                    with activity_log.buffered():
+                        with self.captureOnCommitCallbacks(execute=True):
+                            activity_log.log_activity(self.staff, 'update', 'Appointment', 1)
+                        raise ValueError("view failed")
+
+class ActivityLogRequestTests(TransactionTestCase):
+    """A request adds at most one activity log INSERT, however many entries it logs"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pw12345678', role='staff')
+        patient_user = User.objects.create_user('pat', 'pat@example.com', 'pw12345678', role='patient')
+        patient = PatientInfo.objects.create(user=patient_user, gender='M', birthdate=date(1990, 1, 1))
+        self.record = MedicalRecord.objects.create(
+            patient=patient, reason_for_visit='Checkup', symptoms='Cough', diagnosis='Cold'
+        )
+        self.prescriptions = [
+            Prescription.objects.create(
+                medical_record=self.record, medication_name=f'Drug {i}', dosage='1 tab', frequency='daily'
+            )
+            for i in range(3)
+        ]
+
+    def test_edit_medical_record_logs_with_one_insert(self):
+        data = record_form_data(
+            [
+                {'id': p.pk, 'medication_name': p.medication_name, 'dosage': '2 tabs', 'frequency': 'daily'}
+                for p in self.prescriptions
+            ],
+            initial=len(self.prescriptions),
+        )
+        self.client.force_login(self.staff)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('edit_medical_record', args=[self.record.pk]), data)
+
+        self.assertRedirects(
+            response, reverse('view_medical_record', args=[self.record.pk]), fetch_redirect_response=False
+        )
+        self.assertEqual(set(Prescription.objects.values_list('dosage', flat=True)), {'2 tabs'})
+        self.assertEqual(activity_log_inserts(context), 1)
+        self.assertEqual(ActivityLog.objects.count(), 4)
+
+    def test_rejected_form_logs_nothing(self):
+        self.client.force_login(self.staff)
+
+        data = dict(record_form_data([]), diagnosis='')
+        # The re-rendered form links back to the referring page
+        response = self.client.post(reverse('edit_medical_record', args=[self.record.pk]), data, HTTP_REFERER='/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ActivityLog.objects.exists())
+
+
+# ---------- Conditional calendar GETs ----------
+class CalendarETagTests(ClinicTestCase):
+    """Calendar JSON carries a version-stamp ETag that changes only on writes"""
+
+    def etag(self, url, user):
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_matching_etag_is_answered_with_304(self):
+        url = reverse('calendar_events')
+        etag = self.etag(url, self.staff)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_appointment_save_changes_the_etag(self):
+        url = reverse('calendar_events')
+        etag = self.etag(url, self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_appointments(1, days_ago=-1, status='pending')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_appointment_delete_changes_the_doctor_etag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.make_appointments(1, days_ago=-1, status='pending')[0]
+            other = self.make_doctor('doc2', 'Ann', 'Other', 'L2')
+        url = reverse('doctor_calendar_events')
+        etag = self.etag(url, self.doctor.user)
+        other_etag = self.etag(url, other.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+
+        self.assertNotEqual(self.etag(url, self.doctor.user), etag)
+        self.assertEqual(self.etag(url, other.user), other_etag)
+
+    def test_bumps_are_merged_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_appointments(3, days_ago=-1, status='pending')
+
+        self.assertEqual(
+            dict(VersionStamp.objects.filter(key__in=[versioning.CLINIC, versioning.doctor_key(self.doctor.pk)])
+                 .values_list('key', 'version')),
+            {versioning.CLINIC: 1, versioning.doctor_key(self.doctor.pk): 1},
+        )
+
+
+# ---------- Calendar delta sync ----------
+class CalendarSyncTests(ClinicTestCase):
+    """changes() returns edited events and the ids a client must drop"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.window = (self.now, self.now + timedelta(days=14))
+        self.appointments = self.make_appointments(4, days_ago=-3, status='approved')
+        self.dependent_appointment = self.make_appointments(1, days_ago=-3, status='approved', dependent=True)[0]
+        # Settled before the client's cursor
+        Appointment.objects.update(updated_at=self.now - timedelta(hours=1))
+        DependentAppointment.objects.update(updated_at=self.now - timedelta(hours=1))
+
+    def ids(self, changed):
+        return {calendar_sync.event_id(appointment_type, row.pk) for appointment_type, row in changed}
+
+    def test_changes_since_cursor(self):
+        edited, rescheduled, deleted, untouched = self.appointments
+        edited.status = 'completed'
+        edited.save()
+        rescheduled.start_time += timedelta(days=1)
+        rescheduled.end_time += timedelta(days=1)
+        rescheduled.save()
+        deleted_id = f'self-{deleted.pk}'
+        deleted.delete()
+        self.dependent_appointment.save()
+
+        changed, removed, complete = calendar_sync.changes(self.now, window=self.window)
+
+        self.assertTrue(complete)
+        self.assertEqual(
+            self.ids(changed),
+            {f'self-{edited.pk}', f'self-{rescheduled.pk}', f'dep-{self.dependent_appointment.pk}'},
+        )
+        self.assertEqual(removed, [deleted_id])
+        self.assertNotIn(f'self-{untouched.pk}', self.ids(changed))
+
+    def test_moved_out_of_the_window_is_removed(self):
+        moved = self.appointments[0]
+        moved.start_time = self.now + timedelta(days=30)
+        moved.end_time = moved.start_time + timedelta(minutes=30)
+        moved.save()
+
+        changed, removed, _ = calendar_sync.changes(self.now, window=self.window)
+
+        self.assertEqual(changed, [])
+        self.assertEqual(removed, [f'self-{moved.pk}'])
+
+    def test_doctor_only_sees_own_changes(self):
+        other = self.make_doctor('doc2', 'Ann', 'Other', 'L2')
+        mine = self.appointments[0]
+        mine.save()
+        theirs = self.make_appointments(1, doctor=other, days_ago=-3, status='approved')[0]
+        theirs.delete()
+
+        changed, removed, _ = calendar_sync.changes(self.now, doctor=self.doctor, window=self.window)
+
+        self.assertEqual(self.ids(changed), {f'self-{mine.pk}'})
+        self.assertEqual(removed, [])
+
+    def test_too_many_changes_asks_for_reload(self):
+        for appointment in self.appointments:
+            appointment.save()
+        self.assertEqual(calendar_sync.changes(self.now, limit=3), ([], [], False))
+
+    def test_more_changes_cost_no_extra_queries(self):
+        self.appointments[0].save()
+        _, few = count_queries(calendar_sync.changes, self.now, window=self.window)
+
+        for appointment in self.make_appointments(10, days_ago=-5, status='approved', dependent=True):
+            appointment.delete()
+        for appointment in self.appointments:
+            appointment.save()
+        _, many = count_queries(calendar_sync.changes, self.now, window=self.window)
+
+        self.assertEqual(few, many)
+
+    def test_client_follows_the_cursor(self):
+        self.client.force_login(self.staff)
+        url = reverse('calendar_changes')
+        params = {'start': self.window[0].isoformat(), 'end': self.window[1].isoformat()}
+
+        start = self.client.get(url, params).json()
+        self.assertEqual((start['changed'], start['removed'], start['reset']), ([], [], False))
+
+        edited, _, deleted, _ = self.appointments
+        edited.save()
+        deleted_id = f'self-{deleted.pk}'
+        deleted.delete()
+        delta = self.client.get(url, {**params, 'since': start['cursor']}).json()
+
+        self.assertFalse(delta['reset'])
+        self.assertEqual([event['id'] for event in delta['changed']], [f'self-{edited.pk}'])
+        self.assertEqual(delta['removed'], [deleted_id])
+        self.assertNotEqual(delta['cursor'], start['cursor'])
+
+    def test_unreadable_cursor_asks_for_reload(self):
+        self.client.force_login(self.staff)
+
+        data = self.client.get(reverse('calendar_changes'), {'since': 'not-a-cursor'}).json()
+
+        self.assertTrue(data['reset'])
+        self.assertEqual((data['changed'], data['removed']), ([], []))
+
+    def test_patients_and_unapproved_doctors_are_refused(self):
+        pending = self.make_doctor('doc2', 'Ann', 'New', 'L2')
+        pending.is_approved = False
+        pending.save()
+
+        for user in (self.patient_user, pending.user):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(reverse('calendar_changes')).status_code, 403)
+
+    def test_doctor_feed_leaves_out_other_doctors(self):
+        other = self.make_doctor('doc2', 'Ann', 'Other', 'L2')
+        self.client.force_login(other.user)
+        url = reverse('calendar_changes')
+        params = {'start': self.window[0].isoformat(), 'end': self.window[1].isoformat()}
+        cursor = self.client.get(url, params).json()['cursor']
+
+        self.appointments[0].save()
+        self.appointments[1].delete()
+        delta = self.client.get(url, {**params, 'since': cursor}).json()
+
+        self.assertEqual((delta['changed'], delta['removed'], delta['reset']), ([], [], False))
+
+
+# ---------- Calendar subscription feed ----------
+class CalendarFeedTests(ClinicTestCase):
+    """Tokenized .ics feed: access by token only, cached under the doctor's stamp"""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.appointment = self.make_appointments(1, days_ago=-3, status='approved')[0]
+        self.token = CalendarFeedToken.objects.create(doctor=self.doctor).token
+
+    def fetch(self, token=None):
+        response = self.client.get(reverse('doctor_ics_feed', args=[token or self.token]))
+        if response.status_code != 200:
+            return response, None
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body.decode()
+
+    def test_feed_lists_approved_appointments(self):
+        self.make_appointments(1, days_ago=-4, status='pending')
+
+        response, body = self.fetch()
+
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:self-{self.appointment.pk}@', body)
+        self.assertNotIn('Smith', body)
+
+    def test_unknown_and_rotated_tokens_are_not_found(self):
+        self.assertEqual(self.fetch('nope')[0].status_code, 404)
+
+        self.client.force_login(self.doctor.user)
+        self.client.post(reverse('rotate_calendar_feed_token'))
+        self.client.logout()
+
+        self.assertEqual(self.fetch()[0].status_code, 404)
+        self.assertEqual(self.fetch(CalendarFeedToken.objects.get().token)[0].status_code, 200)
+
+    def test_repeat_fetch_is_served_from_the_cache(self):
+        _, first = self.fetch()
+
+        with CaptureQueriesContext(connection) as context:
+            response, second = self.fetch()
+
+        self.assertFalse(response.streaming)
+        self.assertEqual(second, first)
+        self.assertFalse([q for q in context.captured_queries if 'website_appointment' in q['sql']])
+
+    def test_matching_etag_is_answered_with_304(self):
+        response, _ = self.fetch()
+
+        repeat = self.client.get(
+            reverse('doctor_ics_feed', args=[self.token]), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_version_bump_regenerates_the_feed(self):
+        response, first = self.fetch()
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.make_appointments(1, days_ago=-5, status='approved')[0]
+
+        repeat, second = self.fetch()
+
+        self.assertNotEqual(repeat['ETag'], response['ETag'])
+        self.assertNotIn(f'UID:self-{added.pk}@', first)
+        self.assertIn(f'UID:self-{added.pk}@', second)
+
+
+# ---------- Calendar day lists ----------
+class CalendarDayTestCase(ClinicTestCase):
+    """Appointments booked at fixed UTC times on `day`"""
+
+    day = date(2030, 3, 4)
+
+    def book(self, hour, minute=0, dependent=False, doctor=None, status='approved', days=0):
+        start = datetime(self.day.year, self.day.month, self.day.day, hour, minute, tzinfo=dt_timezone.utc)
+        start += timedelta(days=days)
+        fields = dict(doctor=doctor or self.doctor, status=status, start_time=start, end_time=start + timedelta(minutes=30))
+        if dependent:
+            return DependentAppointment.objects.create(dependent_patient=self.dependent, **fields)
+        return Appointment.objects.create(patient=self.patient_user, **fields)
+
+
+class DayListTests(CalendarDayTestCase):
+    """Day-list JSON of the staff and doctor calendars"""
+
+    def test_staff_day_list(self):
+        later = self.book(14, 30, status='pending')
+        earlier = self.book(9, dependent=True)
+        self.book(9, doctor=self.make_doctor('doc2', 'Ann', 'Other', 'L2'))
+        self.client.force_login(self.staff)
+
+        data = self.client.get(reverse('staff_day_appointments'), {'date': self.day.isoformat()}).json()
+
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0].keys(), {'id', 'patient_name', 'start_time', 'end_time', 'status', 'doctor_name'})
+        self.assertEqual(
+            [(item['id'], item['patient_name'], item['start_time'], item['end_time'], item['status'], item['doctor_name'])
+             for item in data if item['doctor_name'] == 'Dan Doc'],
+            [(earlier.pk, 'Kid Smith', '09:00 AM', '09:30 AM', 'approved', 'Dan Doc'),
+             (later.pk, 'Pat Smith', '02:30 PM', '03:00 PM', 'pending', 'Dan Doc')],
+        )
+
+    def test_doctor_day_list(self):
+        own = self.book(10)
+        dependent = self.book(8, dependent=True, status='completed')
+        self.book(9, doctor=self.make_doctor('doc2', 'Ann', 'Other', 'L2'))
+        self.client.force_login(self.doctor.user)
+
+        data = self.client.get(reverse('doctor_day_appointments'), {'date': self.day.isoformat()}).json()
+
+        self.assertEqual(
+            [(item['id'], item['patient_name'], item['start_time'], item['status']) for item in data],
+            [(f'dep-{dependent.pk}', 'Kid Smith', '08:00 AM', 'completed'),
+             (f'self-{own.pk}', 'Pat Smith', '10:00 AM', 'approved')],
+        )
+        self.assertTrue(all(item['status_class'] for item in data))
+
+    def test_other_roles_and_missing_dates_get_an_empty_list(self):
+        self.book(10)
+
+        self.client.force_login(self.patient_user)
+        self.assertEqual(self.client.get(reverse('staff_day_appointments'), {'date': self.day.isoformat()}).json(), [])
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('staff_day_appointments')).json(), [])
+
+    def test_days_follow_the_calendar_time_zone(self):
+        # 23:30 UTC the evening before is 08:30 on `day` in Tokyo
+        early = self.book(23, 30, days=-1)
+        params = {'date': self.day.isoformat(), 'timeZone': 'Asia/Tokyo'}
+
+        for user, url, event_id in (
+            (self.staff, 'staff_day_appointments', early.pk),
+            (self.doctor.user, 'doctor_day_appointments', f'self-{early.pk}'),
+        ):
+            self.client.force_login(user)
+            data = self.client.get(reverse(url), params).json()
+            self.assertEqual([(item['id'], item['start_time']) for item in data], [(event_id, '08:30 AM')])
+            self.assertEqual(self.client.get(reverse(url), {'date': self.day.isoformat()}).json(), [])
+            self.assertEqual(self.client.get(reverse(url), {**params, 'timeZone': 'Not/AZone'}).json(), [])
+
+
+class CalendarSummaryTests(CalendarDayTestCase):
+    """Per-day status counts behind the staff month grid"""
+
+    def setUp(self):
+        self.book(9)
+        self.book(9, dependent=True, status='pending')
+        self.book(10, dependent=True)
+        self.book(11, status='completed')
+        self.book(23, 30, days=1)
+
+    def summary(self, **params):
+        self.client.force_login(self.staff)
+        return self.client.get(reverse('calendar_summary'), {'start': '2030-03-01', 'end': '2030-04-01', **params})
+
+    def test_counts_per_day_and_status(self):
+        self.assertEqual(self.summary().json()['days'], {
+            '2030-03-04': {'approved': 2, 'pending': 1},
+            '2030-03-05': {'approved': 1},
+        })
+
+    def test_days_follow_the_calendar_time_zone(self):
+        days = self.summary(timeZone='Asia/Tokyo').json()['days']
+
+        self.assertEqual(days, {
+            '2030-03-04': {'approved': 2, 'pending': 1},
+            '2030-03-06': {'approved': 1},
+        })
+
+    def test_summary_is_one_query_however_many_rows(self):
+        querysets = {'self': Appointment.objects.all(), 'dependent': DependentAppointment.objects.all()}
+        _, few = count_queries(calendar_feeds.month_summary, querysets, dt_timezone.utc)
+        for hour in range(12):
+            self.book(hour, days=2, dependent=bool(hour % 2))
+        days, many = count_queries(calendar_feeds.month_summary, querysets, dt_timezone.utc)
+
+        self.assertEqual((few, many), (1, 1))
+        self.assertEqual(days['2030-03-06'], {'approved': 12})
+
+    def test_only_staff_get_the_summary(self):
+        self.client.force_login(self.patient_user)
+        self.assertEqual(self.client.get(reverse('calendar_summary')).status_code, 403)
+        self.assertEqual(self.summary(timeZone='Not/AZone').status_code, 400)
+
+
+# ---------- Patient directory ----------
+class PatientDirectoryTests(ClinicTestCase):
+    """Directory pages walked by cursor add up to the whole list, one query each"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Shared surnames and first names so the cursor has to break ties on patient id
+        for i, (first_name, last_name) in enumerate([('Ana', 'Cruz'), ('Ana', 'Cruz'), ('Ben', 'Cruz'), ('Cy', 'Abad')]):
+            user = User.objects.create_user(
+                f'p{i}', f'p{i}@example.com', 'pw12345678', role='patient',
+                first_name=first_name, last_name=last_name
+            )
+            PatientInfo.objects.create(user=user, gender='F', birthdate=date(1980 + i, 1, 1))
+            DependentPatient.objects.create(
+                guardian=user, first_name=first_name, last_name=last_name, gender='M', birthdate=date(2010 + i, 1, 1)
+            )
+
+    def walk(self, per_page, descending=False):
+        patients, queries, cursor = [], set(), None
+        while True:
+            page, count = count_queries(patient_directory.page, cursor, descending, per_page)
+            patients.extend(page.items)
+            queries.add(count)
+            if not page.has_next:
+                return patients, queries
+            cursor = page.next_cursor
+
+    def test_cursor_walk_covers_everyone_once(self):
+        everyone = patient_directory.page(per_page=100).items
+        self.assertEqual(len(everyone), 10)
+        self.assertEqual(len({p['patient_id'] for p in everyone}), 10)
+        self.assertEqual(
+            [(p['last_name'], p['first_name']) for p in everyone],
+            sorted((p['last_name'], p['first_name']) for p in everyone),
+        )
+
+        for per_page in (1, 3, 4):
+            patients, queries = self.walk(per_page)
+            self.assertEqual(patients, everyone)
+            self.assertEqual(queries, {1})
+
+        patients, _ = self.walk(3, descending=True)
+        self.assertEqual(patients, everyone[::-1])
+
+    def test_json_pages_for_infinite_scroll(self):
+        self.client.force_login(self.staff)
+        url = reverse('patient_list')
+        ids, cursor = [], None
+        while True:
+            params = {'format': 'json', 'limit': 4}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(url, params).json()
+            ids.extend(p['patient_id'] for p in data['patients'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(ids, [p['patient_id'] for p in patient_directory.page(per_page=100).items])
+
+    def test_unreadable_cursor_starts_from_the_top(self):
+        self.client.force_login(self.staff)
+        url = reverse('patient_list')
+
+        first = self.client.get(url, {'format': 'json', 'limit': 3}).json()
+        garbage = self.client.get(url, {'format': 'json', 'limit': 3, 'cursor': 'not-a-cursor'}).json()
+        bad_limit = self.client.get(url, {'format': 'json', 'limit': 'x'})
+
+        self.assertEqual(garbage, first)
+        self.assertEqual(bad_limit.status_code, 200)
+
+    def test_only_staff_see_the_directory(self):
+        for user in (self.patient_user, self.doctor.user):
+            self.client.force_login(user)
+            self.assertRedirects(
+                self.client.get(reverse('patient_list'), {'format': 'json'}), reverse('home'),
+                fetch_redirect_response=False,
+            )
+
+
+# ---------- People search ----------
+class PeopleSearchTests(ClinicTestCase):
+    """Typeahead over the token prefix index"""
+
+    def found(self, query, **kwargs):
+        return [(person['type'], person['id']) for person in person_search.search(query, **kwargs)]
+
+    def test_every_word_must_prefix_a_token(self):
+        patient, dependent = ('patient', self.patient.pk), ('dependent', self.dependent.pk)
+
+        self.assertEqual(self.found('pat smi'), [patient])
+        self.assertEqual(self.found('SMITH kid'), [dependent])
+        self.assertCountEqual(self.found('smi'), [patient, dependent])
+        self.assertEqual(self.found('pat jones'), [])
+        self.assertEqual(self.found('dr dan'), [])
+        self.assertEqual(self.found('dan doc'), [('doctor', str(self.doctor.pk))])
+
+    def test_ids_email_and_phone(self):
+        Phone.objects.create(user=self.patient_user, number='09171234567')
+        patient = ('patient', self.patient.pk)
+
+        self.assertIn(patient, self.found(self.patient.pk[:-1].lower()))
+        self.assertEqual(self.found(self.patient.pk), [patient])
+        self.assertEqual(self.found(self.dependent.pk), [('dependent', self.dependent.pk)])
+        self.assertEqual(self.found('pat@example.com'), [patient])
+        self.assertEqual(self.found('+63 917 123'), [patient])
+
+    def test_type_filter_and_short_queries(self):
+        self.assertEqual(self.found('smith', person_types=['dependent']), [('dependent', self.dependent.pk)])
+        self.assertEqual(self.found('s'), [])
+        self.assertEqual(self.found('   '), [])
+
+    def test_index_follows_renames(self):
+        self.patient_user.last_name = 'Jones'
+        self.patient_user.save()
+
+        self.assertEqual(self.found('pat jones'), [('patient', self.patient.pk)])
+        self.assertEqual(self.found('pat smith'), [])
+
+    def test_only_staff_and_managers_can_search(self):
+        url = reverse('people_search')
+
+        self.client.force_login(self.patient_user)
+        self.assertEqual(self.client.get(url, {'q': 'smith'}).status_code, 403)
+
+        self.client.force_login(self.staff)
+        data = self.client.get(url, {'q': 'smith', 'limit': 'x'}).json()
+        self.assertEqual([person['label'] for person in data['results']], ['Kid Smith', 'Pat Smith'])
+
+
+class DoctorPanelTests(ClinicTestCase):
+    """The doctor's patient list with visit aggregates and sortable columns"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        brown = User.objects.create_user(
+            'brown', 'brown@example.com', 'pw12345678', role='patient', first_name='Al', last_name='Brown'
+        )
+        cls.brown = PatientInfo.objects.create(user=brown, gender='M', birthdate=date(1970, 1, 1))
+        other = User.objects.create_user(
+            'zed', 'zed@example.com', 'pw12345678', role='patient', first_name='Zed', last_name='Other'
+        )
+        cls.other_patient = PatientInfo.objects.create(user=other, gender='M', birthdate=date(1975, 1, 1))
+        cls.other_doctor = cls.make_doctor('doc2', 'Ann', 'Other', 'L2')
+
+    def setUp(self):
+        self.make_appointments(3, days_ago=10)
+        self.make_appointments(1, days_ago=2, dependent=True)
+        self.make_appointments(1, days_ago=-5, status='approved', dependent=True)
+        self.book(self.brown.user, self.doctor, days_ago=-1, status='pending')
+        self.book(self.other_patient.user, self.other_doctor, days_ago=20, status='completed')
+        PatientVitals.objects.create(patient=self.brown, blood_pressure='120/80', heart_rate=70)
+
+    def book(self, user, doctor, days_ago, status):
+        start = timezone.now() - timedelta(days=days_ago)
+        Appointment.objects.create(
+            patient=user, doctor=doctor, status=status, start_time=start, end_time=start + timedelta(minutes=30)
+        )
+
+    def ids(self, sort):
+        return [row['patient_id_key'] for row in patient_directory.doctor_panel(self.doctor, sort)]
+
+    def test_aggregates(self):
+        rows = {row['patient_id_key']: row for row in patient_directory.doctor_panel(self.doctor)}
+
+        self.assertEqual(set(rows), {self.patient.pk, self.dependent.pk, self.brown.pk})
+        self.assertEqual(
+            {pk: row['visit_count'] for pk, row in rows.items()},
+            {self.patient.pk: 3, self.dependent.pk: 1, self.brown.pk: 0},
+        )
+        self.assertIsNone(rows[self.brown.pk]['last_visit'])
+        self.assertIsNone(rows[self.patient.pk]['next_appointment'])
+        self.assertEqual(rows[self.dependent.pk]['patient_type'], 'dependent')
+
+    def test_sorts(self):
+        patient, dependent, brown = self.patient.pk, self.dependent.pk, self.brown.pk
+
+        self.assertEqual(self.ids('name'), [brown, dependent, patient])
+        # Ties fall back to name order
+        self.assertEqual(self.ids('-name'), [dependent, patient, brown])
+        self.assertEqual(self.ids('-visits'), [patient, dependent, brown])
+        # Nulls last in either direction
+        self.assertEqual(self.ids('-last_visit'), [dependent, patient, brown])
+        self.assertEqual(self.ids('last_visit'), [patient, dependent, brown])
+        self.assertEqual(self.ids('next_appointment'), [brown, dependent, patient])
+        self.assertEqual(self.ids('-latest_vitals')[0], brown)
+        self.assertEqual(self.ids('bogus'), self.ids('name'))
+
+    def test_panel_view(self):
+        self.client.force_login(self.doctor.user)
+        response = self.client.get(reverse('doctor_patient_list'), {'sort': '-visits'})
+
+        self.assertEqual(response.context['sort'], '-visits')
+        self.assertEqual([row['patient_id_key'] for row in response.context['patients']][0], self.patient.pk)
+        self.assertNotContains(response, 'Zed')
+
+        self.client.force_login(self.staff)
+        self.assertRedirects(self.client.get(reverse('doctor_patient_list')), reverse('home'), fetch_redirect_response=False)
+
+
+# ---------- Medical record search ----------
+class RecordSearchTests(ClinicTestCase):
+    """Ranked, highlighted record search and its query count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # post_migrate installs the index; make sure it exists before the rows go in
+        record_search.install_record_search()
+        cls.strong = cls.make_record(cls, 'Migraine', 'severe migraine with aura', 'migraine')
+        cls.weak = cls.make_record(cls, 'Check-up', 'occasional migraine', 'tension headache')
+        cls.other = cls.make_record(cls, 'Cough', 'dry coughing at night', 'bronchitis')
+        cls.dependent_record = MedicalRecord.objects.create(
+            dependent_patient=cls.dependent, reason_for_visit='Migraine', symptoms='migraine',
+            diagnosis='migraine', created_by=cls.doctor.user,
+        )
+
+    def make_record(self, reason, symptoms, diagnosis):
+        return MedicalRecord.objects.create(
+            patient=self.patient, reason_for_visit=reason, symptoms=symptoms,
+            diagnosis=diagnosis, created_by=self.doctor.user,
+        )
+
+    def indexed(self):
+        return record_search._backend(connection) is not None
+
+    def test_ranks_and_highlights(self):
+        if not self.indexed():
+            self.skipTest("No full-text index on this database")
+        results = record_search.search('migraine', patient=self.patient)
+
+        self.assertEqual([record for record, _, _ in results], [self.strong, self.weak])
+        self.assertGreater(results[0][1], results[1][1])
+        self.assertIn('<mark>', results[0][2])
+        # Stemmed: 'coughs' finds 'coughing'
+        self.assertEqual([record for record, _, _ in record_search.search('coughs')], [self.other])
+
+    def test_scope_and_escaping(self):
+        self.make_record('Rash <script>alert(1)</script>', 'itchy rash', 'eczema')
+
+        self.assertEqual(
+            {record for record, _, _ in record_search.search('migraine', dependent_patient=self.dependent)},
+            {self.dependent_record},
+        )
+        self.assertEqual(
+            {record for record, _, _ in record_search.search('migraine')},
+            {self.strong, self.weak, self.dependent_record},
+        )
+        (_, _, snippet), = record_search.search('rash', patient=self.patient)
+        self.assertNotIn('<script>', snippet)
+        self.assertEqual(record_search.search('   '), [])
+
+    def test_more_matches_cost_no_extra_queries(self):
+        # The first search on a connection looks up which index is installed
+        record_search.search('bronchitis')
+        _, few = count_queries(record_search.search, 'bronchitis')
+        for i in range(10):
+            self.make_record(f'Follow-up {i}', 'wheezing', 'bronchitis')
+        results, many = count_queries(record_search.search, 'bronchitis')
+
+        self.assertEqual(len(results), 11)
+        self.assertEqual(few, many)
+
+    def test_search_views(self):
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse('search_medical_records'), {'q': 'migraine'}).json()
+        self.assertEqual(
+            {result['id'] for result in data['results']},
+            {self.strong.pk, self.weak.pk, self.dependent_record.pk},
+        )
+
+        self.client.force_login(self.patient_user)
+        self.assertEqual(self.client.get(reverse('search_medical_records'), {'q': 'migraine'}).status_code, 403)
+        url = reverse('search_patient_medical_records', args=['dependent', self.dependent.pk])
+        data = self.client.get(url, {'q': 'migraine'}).json()
+        self.assertEqual([result['patient_name'] for result in data['results']], ['Kid Smith'])
+
+    def test_scoped_search_is_limited_to_the_patient_and_their_carers(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw12345678', role='patient')
+        self.client.force_login(other)
+
+        for args in (['self', self.patient.pk], ['dependent', self.dependent.pk]):
+            url = reverse('search_patient_medical_records', args=args)
+            self.assertEqual(self.client.get(url, {'q': 'migraine'}).status_code, 403)
+
+        self.client.force_login(self.doctor.user)
+        url = reverse('search_patient_medical_records', args=['self', self.patient.pk])
+        self.assertEqual(len(self.client.get(url, {'q': 'migraine'}).json()['results']), 2)
+        self.assertEqual(self.client.get(reverse('search_patient_medical_records', args=['self', 'P0000'])).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('search_patient_medical_records', args=['other', self.patient.pk])).status_code, 400
+        )
+
+
+# ---------- Adding medical records ----------
+class CreateMedicalRecordTests(ClinicTestCase):
+    """A new record and its prescriptions are written in bulk, with one audit entry"""
+
+    def prescriptions(self, count, add_every=2):
+        return [
+            {'medication_name': f'Drug {i}', 'dosage': '1 tab', 'frequency': 'daily',
+             **({'create_medication': 'on'} if i % add_every == 0 else {})}
+            for i in range(count)
+        ]
+
+    def create(self, data, **owner):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_medical_record(
+                MedicalRecordForm(data), PrescriptionFormSet(data), self.doctor.user, **owner
+            )
+
+    def test_prescriptions_and_medications(self):
+        record = self.create(record_form_data(self.prescriptions(4)), patient=self.patient)
+
+        self.assertEqual(
+            sorted(record.prescriptions.values_list('medication_name', 'created_by')),
+            [(f'Drug {i}', self.doctor.user.pk) for i in range(4)],
+        )
+        self.assertEqual(
+            sorted(PatientMedication.objects.filter(patient=self.patient).values_list('medication_name', flat=True)),
+            ['Drug 0', 'Drug 2'],
+        )
+        self.assertFalse(DependentPatientMedication.objects.exists())
+        self.assertEqual((record.created_by, record.patient_id_str), (self.doctor.user, self.patient.pk))
+
+    def test_dependent_record(self):
+        record = self.create(record_form_data(self.prescriptions(3, add_every=1)), dependent_patient=self.dependent)
+
+        self.assertEqual(record.dependent_patient, self.dependent)
+        self.assertEqual(
+            sorted(DependentPatientMedication.objects.values_list('dependent_patient', 'medication_name')),
+            [(self.dependent.pk, f'Drug {i}') for i in range(3)],
+        )
+        self.assertFalse(PatientMedication.objects.exists())
+
+    def test_one_activity_entry_names_the_prescriptions(self):
+        record = self.create(record_form_data(self.prescriptions(3)), patient=self.patient)
+
+        entry = ActivityLog.objects.get()
+        self.assertEqual((entry.model_name, entry.object_id), ('MedicalRecord', str(record.pk)))
+        self.assertEqual(entry.description, "Prescriptions: Drug 0, Drug 1, Drug 2 (2 added to medications)")
+
+    def test_invalid_forms_write_nothing(self):
+        invalid_prescription = self.prescriptions(2)
+        invalid_prescription[1]['dosage'] = ''
+
+        for data in (record_form_data(invalid_prescription), dict(record_form_data(self.prescriptions(2)), diagnosis='')):
+            self.assertIsNone(self.create(data, patient=self.patient))
+
+        self.assertFalse(MedicalRecord.objects.exists())
+        self.assertFalse(Prescription.objects.exists())
+        self.assertFalse(PatientMedication.objects.exists())
+        self.assertFalse(ActivityLog.objects.exists())
+
+    def test_more_prescriptions_cost_no_extra_queries(self):
+        # The first record also creates the patient's version stamp
+        self.create(record_form_data([]), patient=self.patient)
+        _, one = count_queries(self.create, record_form_data(self.prescriptions(1)), patient=self.patient)
+        _, eight = count_queries(self.create, record_form_data(self.prescriptions(8)), patient=self.patient)
+
+        self.assertEqual(one, eight)
+        self.assertEqual(Prescription.objects.count(), 9)
+        self.assertEqual(PatientMedication.objects.count(), 5)
+
+    def test_add_view(self):
+        self.client.force_login(self.doctor.user)
+        url = reverse('add_medical_record', args=['self', self.patient.pk])
+
+        response = self.client.post(url, record_form_data(self.prescriptions(2)))
+
+        self.assertRedirects(response, reverse('doctor_patient_list'), fetch_redirect_response=False)
+        self.assertEqual(MedicalRecord.objects.get().patient, self.patient)
+
+        self.client.force_login(self.patient_user)
+        self.client.post(url, record_form_data(self.prescriptions(2)))
+        self.assertEqual(MedicalRecord.objects.count(), 1)
+
+
+class TimelineTests(ClinicTestCase):
+    """Timeline pages walked by cursor add up to the whole stream, one query per table each"""
+
+    def setUp(self):
+        # Several tables share timestamps so the merge has to break ties on table and id
+        moment = timezone.now() - timedelta(days=10)
+        for i in range(3):
+            at = moment - timedelta(days=i)
+            record = MedicalRecord.objects.create(
+                patient=self.patient, reason_for_visit=f'Visit {i}', symptoms='cough',
+                diagnosis='flu', created_by=self.doctor.user, created_at=at,
+            )
+            Prescription.objects.create(
+                medical_record=record, medication_name='Paracetamol', dosage='500mg',
+                frequency='tid', prescribed_at=at,
+            )
+            PatientAllergy.objects.create(patient=self.patient, allergy_name=f'Allergy {i}', recorded_at=at)
+            PatientMedication.objects.create(
+                patient=self.patient, medication_name=f'Drug {i}', dosage='1', frequency='daily', prescribed_at=at,
+            )
+        PatientVitals.objects.create(patient=self.patient, blood_pressure='120/80', heart_rate=70)
+        self.make_appointments(4, days_ago=10)
+        # The dependent's entries stay out of the patient's timeline
+        DependentPatientAllergy.objects.create(dependent_patient=self.dependent, allergy_name='Dust')
+
+    def walk(self, per_page):
+        items, queries, cursor = [], set(), None
+        while True:
+            page, count = count_queries(timeline.page, 'self', self.patient, cursor, per_page)
+            items.extend(page.items)
+            queries.add(count)
+            if not page.has_next:
+                return items, queries
+            cursor = page.next_cursor
+
+    def test_cursor_walk_covers_the_stream_once(self):
+        everything = timeline.page('self', self.patient, per_page=100).items
+        self.assertEqual(len(everything), 17)
+        self.assertEqual(len({(item['type'], item['id']) for item in everything}), 17)
+        self.assertEqual(
+            [item['at'] for item in everything],
+            sorted((item['at'] for item in everything), reverse=True),
+        )
+
+        for per_page in (1, 4, 5):
+            items, queries = self.walk(per_page)
+            self.assertEqual(items, everything)
+            # One seek per table (appointments with their doctor joined in)
+            self.assertEqual(queries, {len(timeline.ENTRIES)})
+
+    def test_timeline_view_pages(self):
+        self.client.force_login(self.patient_user)
+        url = reverse('patient_timeline', args=['self', self.patient.pk])
+        items, cursor = [], None
+        while True:
+            data = self.client.get(url, {'limit': 5, **({'cursor': cursor} if cursor else {})}).json()
+            items.extend(data['items'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(items, timeline.page('self', self.patient, per_page=100).items)
+
+        dependent_url = reverse('patient_timeline', args=['dependent', self.dependent.pk])
+        self.assertEqual([item['type'] for item in self.client.get(dependent_url).json()['items']], ['allergy'])
+
+    def test_unreadable_cursor_starts_from_the_top(self):
+        self.client.force_login(self.patient_user)
+        url = reverse('patient_timeline', args=['self', self.patient.pk])
+
+        first = self.client.get(url, {'limit': 5}).json()
+
+        self.assertEqual(self.client.get(url, {'limit': 5, 'cursor': 'garbage'}).json(), first)
+
+    def test_access(self):
+        url = reverse('patient_timeline', args=['self', self.patient.pk])
+
+        self.client.force_login(self.doctor.user)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        other = User.objects.create_user('other', 'other@example.com', 'pw12345678', role='patient')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('patient_timeline', args=['other', self.patient.pk])).status_code, 400)
+
+
+class ArchiveRescanTests(ClinicTestCase):
+    """Rows committed behind the job's cursor are picked up by a rescan"""
+
+    def test_rows_behind_the_cursor_are_rescanned(self):
+        self.make_appointments(3)
+        self.make_appointments(2, dependent=True)
+        job = ArchiveWorker.enqueue(days=90)
+        # As if these rows had been locked by another transaction when the cursor passed them
+        ArchiveJob.objects.filter(pk=job.pk).update(last_appointment_id=10 ** 6, last_dependent_appointment_id=10 ** 6)
+        job.refresh_from_db()
+
+        ArchiveWorker(rows_per_second=0, batch_size=2, rescan_delay=0).run_job(job, stop_outside_quiet_hours=False)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.archived_count), ('completed', 5))
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(DependentAppointment.objects.exists())
+
+    def test_rescans_are_bounded(self):
+        self.make_appointments(1)
+        worker = ArchiveWorker(rows_per_second=0, max_rescans=0, rescan_delay=0)
+        job = ArchiveWorker.enqueue(days=90)
+        ArchiveJob.objects.filter(pk=job.pk).update(last_appointment_id=10 ** 6, last_dependent_appointment_id=10 ** 6)
+        job.refresh_from_db()
+
+        worker.run_job(job, stop_outside_quiet_hours=False)
+
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+class PeopleSearchLimitTests(ClinicTestCase):
+    """The result limit keeps the shortest completions, the same way every time"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Created in reverse token order, so row order and token order disagree
+        names = ['Alyssa', 'Alvin', 'Alonzo', 'Alma', 'Alice', 'Alfred', 'Alex', 'Aletha', 'Aldo', 'Alberta', 'Albert', 'Alan']
+        for i, name in enumerate(names):
+            user = User.objects.create_user(
+                f'u{i}', f'u{i}@example.com', 'pw12345678', role='patient', first_name=name, last_name='Test'
+            )
+            PatientInfo.objects.create(user=user, gender='F', birthdate=date(1980, 1, 1))
+
+    def test_limit_keeps_the_first_completions(self):
+        labels = [person['label'] for person in person_search.search('al', limit=2)]
+
+        self.assertEqual(labels, ['Alan Test', 'Albert Test'])
+        self.assertEqual([person['label'] for person in person_search.search('al', limit=2)], labels)
+        self.assertEqual(len(person_search.search('al test', limit=20)), 12)
+
+
+# ---------- Audited deletes ----------
+class AuditedDeleteTests(ClinicTestCase):
+    """Bulk deletes leave the same audit trail as single ones"""
+
+    def test_bulk_delete_audits_like_a_single_delete(self):
+        single, *bulk = self.make_appointments(4)
+        expected = {str(a.pk): str(a) for a in [single] + bulk}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DeleteService.delete_with_audit(single, self.staff, 'duplicate')
+            deleted = DeleteService.delete_queryset_with_audit(
+                Appointment.objects.filter(pk__in=[a.pk for a in bulk]), self.staff, 'duplicate', chunk_size=2
+            )
+
+        self.assertEqual(deleted, 3)
+        self.assertFalse(Appointment.objects.exists())
+        # Open calendars still learn about the purged events
+        self.assertEqual(
+            set(AppointmentTombstone.objects.values_list('appointment_id', flat=True)), {int(pk) for pk in expected}
+        )
+        records = {r.original_id: r for r in DeletedRecord.objects.all()}
+        self.assertEqual({pk: r.object_repr for pk, r in records.items()}, expected)
+        snapshots = [r.data_snapshot for r in records.values()]
+        self.assertTrue(all(s.keys() == snapshots[0].keys() for s in snapshots))
+        self.assertEqual(
+            sorted(ActivityLog.objects.values_list('object_id', 'related_object_repr')), sorted(expected.items())
+        )
+
+    def test_bulk_deleted_rows_are_found_by_name(self):
+        self.make_appointments(2)
+        DeleteService.delete_queryset_with_audit(Appointment.objects.all(), self.staff)
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse('deleted_records'), {'search': 'Pat Smith'})
+
+        self.assertEqual(len(response.context['deleted_records']), 2)
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        self.make_appointments(3)
+        _, three = count_queries(DeleteService.delete_queryset_with_audit, Appointment.objects.all(), self.staff)
+        self.make_appointments(9)
+        _, nine = count_queries(DeleteService.delete_queryset_with_audit, Appointment.objects.all(), self.staff)
+
+        self.assertEqual(three, nine)
+
+
+class PurgeRecordsCommandTests(ClinicTestCase):
+    """purge_records deletes listed rows through the audited bulk path"""
+
+    def purge(self, *args):
+        with open(os.devnull, 'w') as out:
+            call_command('purge_records', *args, stdout=out)
+
+    def test_purge_by_ids_and_file(self):
+        appointments = self.make_appointments(4)
+        ids_file = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False)
+        self.addCleanup(os.remove, ids_file.name)
+        ids_file.write(f'{appointments[2].pk}\n\n{appointments[3].pk}\n')
+        ids_file.close()
+
+        self.purge('Appointment', '--ids', str(appointments[0].pk), '--ids-file', ids_file.name,
+                   '--reason', 'test data', '--user', 'staff', '--chunk-size', '2')
+
+        self.assertEqual(list(Appointment.objects.values_list('pk', flat=True)), [appointments[1].pk])
+        self.assertEqual(
+            set(DeletedRecord.objects.values_list('deleted_by', 'deletion_reason')), {(self.staff.pk, 'test data')}
+        )
+        self.assertEqual(DeletedRecord.objects.count(), 3)
+
+    def test_dry_run_deletes_nothing(self):
+        appointments = self.make_appointments(2)
+
+        self.purge('Appointment', '--ids', *[str(a.pk) for a in appointments], '--dry-run')
+
+        self.assertEqual(Appointment.objects.count(), 2)
+        self.assertFalse(DeletedRecord.objects.exists())
+
+    def test_bad_arguments(self):
+        for args, message in (
+            (['Nope', '--ids', '1'], "Unknown model 'Nope'"),
+            (['Appointment'], "Pass --ids or --ids-file"),
+            (['Appointment', '--ids', '1', '--user', 'ghost'], "Unknown user 'ghost'"),
+            (['Appointment', '--ids', '1', '--chunk-size', '0'], "--chunk-size must be at least 1"),
+        ):
+            with self.assertRaisesMessage(CommandError, message):
+                self.purge(*args)
@@ -8,6 +8,9 @@ urlpatterns = [
 
     path('medical-records/', views.medical_records, name='medical_records'),
     path('patients/', views.patient_list, name='patient_list'),
+    path('search/people/', views.people_search, name='people_search'),
+    path('medical-records/search/', views.search_medical_records, name='search_medical_records'),
+    path('medical-records/search/<str:patient_type>/<str:pk>/', views.search_medical_records, name='search_patient_medical_records'),
     path('ajax/patient/<str:pk>/', views.patient_details_ajax, name='patient_details_ajax'),
     path("patient/edit/", views.edit_my_patient_info, name="edit_my_patient_info"),
     
@@ -16,6 +19,7 @@ urlpatterns = [
         
     path("vitals/<str:patient_type>/<str:pk>/add/", views.add_patient_vitals, name="add_patient_vitals"),
     path('patients/<str:patient_type>/<str:pk>/vitals/', views.vital_history, name='vital_history'),
+    path('patients/<str:patient_type>/<str:pk>/timeline/', views.patient_timeline, name='patient_timeline'),
 
     path("allergy/<str:patient_type>/<str:pk>/add/", views.add_patient_allergy, name="add_patient_allergy"),
     path("medication/<str:patient_type>/<str:pk>/add/", views.add_patient_medication, name="add_patient_medication"),
@@ -51,11 +55,15 @@ urlpatterns = [
     path("calendar/availability/", views.doctor_daily_availability, name="doctor_daily_availability"),
     path("calendar/available-days/", views.doctor_available_days, name="doctor_available_days"),
     path("calendar/events/", views.calendar_events, name="calendar_events"),
+    path("calendar/changes/", views.calendar_changes, name="calendar_changes"),
+    path("calendar/summary/", views.calendar_summary, name="calendar_summary"),
     path("calendar/book", views.book_appointment, name="book_schedule"),
     path('calendar/day-appointments/', views.staff_day_appointments, name='staff_day_appointments'),
     
     path("doctor/calendar/", views.doctor_calendar, name="doctor_calendar"),
     path("doctor/calendar/events/", views.doctor_calendar_events, name="doctor_calendar_events"),
+    path("doctor/calendar/feed-link/", views.rotate_calendar_feed_token, name="rotate_calendar_feed_token"),
+    path("calendar/feed/<str:token>.ics", views.doctor_ics_feed, name="doctor_ics_feed"),
     path("doctor/calendar/day-appointments/", views.doctor_day_appointments, name="doctor_day_appointments"),
     path("doctor/appointments/", views.doctor_appointments, name="doctor_appointments"),
     path("doctor/appointments/<int:pk>/update_status/<str:action>/",views.update_doctor_appointment_status, name="update_doctor_appointment_status"),
@@ -108,6 +116,7 @@ urlpatterns = [
     path('appointment-recommendations/', views.appointment_recommendations, name='appointment_recommendations'),
 
     path('manager/dashboard/', views.manager_dashboard, name='manager_dashboard'),
+    path('activity/feed/', views.activity_feed, name='activity_feed'),
     path('manager/reports/', views.manager_reports, name='manager_reports'),
     path('manager/reports/export/', views.export_report, name='export_report'), 
 
@@ -14,7 +14,10 @@ urlpatterns = [
     path('appointment/<int:pk>/archive/', views_archive.archive_appointment_view, name='archive_appointment'),
     path('appointment/dependent/<int:pk>/archive/', views_archive.archive_dependent_appointment_view, name='archive_dependent_appointment'),
     path('appointments/bulk-archive/', views_archive.bulk_archive_appointments, name='bulk_archive_appointments'),
+    path('appointments/bulk-archive/jobs/<int:pk>/', views_archive.archive_job_status, name='archive_job_status'),
     path('appointment/archived/<int:pk>/restore/', views_archive.restore_archived_appointment, name='restore_archived_appointment'),
+    path('appointment/<str:appointment_type>/<int:pk>/unarchive/', views_archive.unarchive_appointment, name='unarchive_appointment'),
+    path('appointments/archived/bulk-restore/', views_archive.bulk_restore_archived_appointments, name='bulk_restore_archived_appointments'),
     
     # Appointment Delete
     path('appointment/<int:pk>/delete/', views_archive.delete_appointment, name='delete_appointment'),
@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib import messages
-from django.http import HttpResponseForbidden, HttpResponse
+from django.http import HttpResponseForbidden, HttpResponse, Http404, StreamingHttpResponse
 from django.template.loader import render_to_string
 from datetime import datetime, timedelta, date
 from django.http import JsonResponse
@@ -11,8 +11,9 @@ from django.core.mail import send_mail
 from django.conf import settings
 from calendar import monthrange
 from django.db import transaction
-from django.db.models import Q, Avg, Count
-from django.utils.dateparse import parse_datetime
+from django.db.models import Q, Avg, Count, OuterRef, Prefetch, Subquery
+from django.utils.dateparse import parse_date, parse_datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from django.utils import timezone
 import json
 from django.views.decorators.csrf import csrf_exempt
@@ -21,7 +22,23 @@ from itertools import chain
 from django.core.exceptions import ValidationError
 from website.services.appointment_recommender import get_appointment_recommendations
 from website.services.export_service import ReportExporter
+from website.services.activity_log import log_activity
+from website.services.pagination import PAGE_SIZE, decode_cursor, encode_cursor, keyset_page
+from website.services import calendar_sync, versioning
+from website.services.versioning import versioned
+from website.services import ics_feed
+from website.services import calendar_feeds
+from website.services import patient_directory
+from website.services import person_search
+from website.services import record_search
+from website.services import medical_records as medical_records_service
+from website.services import timeline
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+import hashlib
 from django.contrib.messages import get_messages
+from django.core.paginator import Paginator
 
 
 from accounts.models import Phone, User
@@ -44,7 +61,8 @@ from .models import (
     DependentPatientAllergy,
     PatientMedication,
     DependentPatientMedication,
-    Specialization
+    Specialization,
+    CalendarFeedToken
 )
 
 from .forms import (
@@ -383,7 +401,7 @@ def home(request):
             # -------------------------
             # Recent Activity (Last 10 actions)
             # -------------------------
-            context["recent_activities"] = ActivityLog.objects.select_related('user').order_by('-timestamp')[:10]
+            context["recent_activities"] = ActivityLog.objects.select_related('user').recent(10)
             
             # -------------------------
             # Upcoming Appointments (Next 5)
@@ -502,125 +520,181 @@ def medical_records(request):
         "patients": patients
     })
     
+@login_required
 def patient_list(request):
-    # Include both PatientInfo (self profiles) and DependentPatient entries
-    patients = []
-
-    # PatientInfo entries: mark patient_type = 'self'
-    for p in PatientInfo.objects.all().select_related('user'):
-        setattr(p, 'patient_type', 'self')
-        patients.append(p)
-
-    # Dependents: mark patient_type = 'dependent'
-    for d in DependentPatient.objects.all():
-        setattr(d, 'patient_type', 'dependent')
-        patients.append(d)
-
-    # Optionally sort by name or patient_id; keep insertion order for now
-    return render(request, "staffs/patient_list.html", {"patients": patients})
-
-def patient_details_ajax(request, pk):
     """
-    AJAX view to fetch patient details (self or dependent) for staff/doctor.
-    Always returns JSON with 'html' key.
+    Staff patient directory: self patients and dependents by name, one
+    keyset page at a time. ?format=json returns the next page for
+    infinite scroll; ?sort=-name reverses the order.
     """
+    if request.user.role != "staff":
+        return redirect("home")
+
+    descending = request.GET.get("sort") == "-name"
     try:
-        user_role = getattr(request.user, 'role', None)
-        patient = None
-        patient_type = None
+        per_page = min(int(request.GET.get("limit", PAGE_SIZE)), patient_directory.MAX_PAGE_SIZE)
+    except ValueError:
+        per_page = PAGE_SIZE
+    page = patient_directory.page(request.GET.get("cursor"), descending, max(per_page, 1))
 
-        # ---------- Identify patient ----------
-        if user_role in ['staff', 'doctor']:
-            patient = PatientInfo.objects.filter(pk=pk).first()
-            if patient:
-                patient_type = 'self'
-        else:
-            patient = PatientInfo.objects.filter(pk=pk, user=request.user).first()
-            if patient:
-                patient_type = 'self'
+    if request.GET.get("format") == "json":
+        return JsonResponse({"patients": page.items, "next_cursor": page.next_cursor})
 
-        if not patient:
-            if user_role in ['staff', 'doctor']:
-                patient = DependentPatient.objects.filter(pk=pk).first()
-                if patient:
-                    patient_type = 'dependent'
-            else:
-                patient = DependentPatient.objects.filter(pk=pk, guardian=request.user).first()
-                if patient:
-                    patient_type = 'dependent'
+    return render(request, "staffs/patient_list.html", {
+        "patients": page.items,
+        "next_cursor": page.next_cursor,
+        "sort": "-name" if descending else "name",
+    })
 
-        if not patient:
-            return JsonResponse({'html': '<p class="muted">Patient not found.</p>'})
+@login_required
+def people_search(request):
+    """Typeahead over patients, dependents and doctors (?q=, optional ?type=patient,dependent)"""
+    if request.user.role not in ("staff", "manager"):
+        return JsonResponse({"error": "Forbidden"}, status=403)
 
-        # ---------- Vitals ----------
-        vitals = getattr(patient, 'vitals', None)
-        vitals = vitals.last() if vitals else None
+    person_types = [t for t in request.GET.get("type", "").split(",") if t]
+    try:
+        limit = int(request.GET.get("limit", 10))
+    except ValueError:
+        limit = 10
+    results = person_search.search(request.GET.get("q", ""), limit=limit, person_types=person_types)
+    return JsonResponse({"results": results})
 
-        # ---------- Medications ----------
-        medications = getattr(patient, 'medications', None)
-        medications = medications.all() if medications else []
+@login_required
+def search_medical_records(request, patient_type=None, pk=None):
+    """
+    Ranked full-text search over medical records (?q=). Clinic-wide for
+    staff; with patient_type/pk, one patient's records for staff, doctors,
+    the patient or their guardian.
+    """
+    role = request.user.role
+    patient = dependent = None
+    if patient_type is None:
+        if role != "staff":
+            return JsonResponse({"error": "Forbidden"}, status=403)
+    elif patient_type == "self":
+        patient = get_object_or_404(PatientInfo, pk=pk)
+        if role not in ("staff", "doctor") and patient.user_id != request.user.pk:
+            return JsonResponse({"error": "Forbidden"}, status=403)
+    elif patient_type == "dependent":
+        dependent = get_object_or_404(DependentPatient, pk=pk)
+        if role not in ("staff", "doctor") and dependent.guardian_id != request.user.pk:
+            return JsonResponse({"error": "Forbidden"}, status=403)
+    else:
+        return JsonResponse({"error": "Invalid patient type"}, status=400)
 
-        # ---------- Allergies ----------
-        allergies = getattr(patient, 'allergies', None)
-        allergies = allergies.all() if allergies else []
+    try:
+        limit = int(request.GET.get("limit", 20))
+    except ValueError:
+        limit = 20
+    matches = record_search.search(
+        request.GET.get("q", ""), patient=patient, dependent_patient=dependent, limit=limit
+    )
 
-        # ---------- Medical History ----------
-        if patient_type == 'self':
-            medical_history = MedicalRecord.objects.filter(
-                patient=patient
-            ).order_by('-created_at')
+    results = []
+    for record, rank, snippet in matches:
+        if record.patient:
+            owner_id, owner_name = record.patient.pk, record.patient.user.get_full_name()
+        elif record.dependent_patient:
+            owner_id, owner_name = record.dependent_patient.pk, record.dependent_patient.full_name
         else:
-            medical_history = MedicalRecord.objects.filter(
-                dependent_patient=patient
-            ).order_by('-created_at')
+            owner_id, owner_name = None, ""
+        results.append({
+            "id": record.pk,
+            "url": reverse("view_medical_record", args=[record.pk]),
+            "patient_id": owner_id,
+            "patient_name": owner_name,
+            "reason_for_visit": record.reason_for_visit,
+            "created_at": record.created_at.isoformat(),
+            "rank": round(rank, 4),
+            "snippet": snippet,
+        })
+    return JsonResponse({"results": results})
 
-        # ---------- ✅ LAST VISIT (COMPLETED ONLY) ----------
-        last_visit = None
+def _patient_details_queryset(patient_type):
+    """Patient with everything the details panel shows, prefetched"""
+    if patient_type == 'self':
+        model, vitals_model = PatientInfo, PatientVitals
+        last_visit = Appointment.objects.filter(patient=OuterRef('user'), status='completed')
+        queryset = PatientInfo.objects.select_related('user', 'user__phone')
+    else:
+        model, vitals_model = DependentPatient, DependentPatientVitals
+        last_visit = DependentAppointment.objects.filter(dependent_patient=OuterRef('pk'), status='completed')
+        queryset = DependentPatient.objects.all()
+
+    return queryset.annotate(
+        last_visit=Subquery(last_visit.order_by('-start_time').values('start_time')[:1])
+    ).prefetch_related(
+        Prefetch('vitals', queryset=vitals_model.objects.order_by('-recorded_at')[:1], to_attr='latest_vitals'),
+        'medications',
+        'allergies',
+        Prefetch(
+            'medicalrecord_set',
+            queryset=MedicalRecord.objects.select_related('created_by').order_by('-created_at'),
+            to_attr='medical_history'
+        ),
+    )
 
-        try:
-            if patient_type == 'self' and getattr(patient, 'user', None):
-                last_appointment = Appointment.objects.filter(
-                    patient=patient.user,
-                    status='completed'
-                ).order_by('-start_time').first()
 
-                last_visit = last_appointment.start_time if last_appointment else None
+def _patient_types(pk):
+    """Tables to look in for `pk`, most likely first (P… self, D… dependent)"""
+    return ['dependent', 'self'] if str(pk).startswith('D') else ['self', 'dependent']
 
-            elif patient_type == 'dependent':
-                last_appointment = DependentAppointment.objects.filter(
-                    dependent_patient=patient,
-                    status='completed'
-                ).order_by('-start_time').first()
 
-                last_visit = last_appointment.start_time if last_appointment else None
+def patient_details_ajax(request, pk):
+    """
+    AJAX view to fetch patient details (self or dependent) for staff/doctor.
+    Always returns JSON with 'html' key.
 
-        except Exception as e:
-            print(f"Last visit error for patient {pk}: {e}")
-            last_visit = None
+    The rendered panel is cached per patient version (see
+    versioning.patient_key) and viewer role.
+    """
+    user_role = getattr(request.user, 'role', None)
+    not_found = JsonResponse({'html': '<p class="muted">Patient not found.</p>'})
+
+    # Patients and guardians only see their own records
+    if user_role not in ['staff', 'doctor']:
+        if not request.user.is_authenticated:
+            return not_found
+        owned = (
+            PatientInfo.objects.filter(pk=pk, user=request.user).exists()
+            or DependentPatient.objects.filter(pk=pk, guardian=request.user).exists()
+        )
+        if not owned:
+            return not_found
+
+    cache_key = "patient-details:%s:%s:%s" % (
+        pk, versioning.version_of(versioning.patient_key(pk)), user_role
+    )
+    html = cache.get(cache_key)
+    if html is None:
+        # ---------- Identify and load patient ----------
+        patient = patient_type = None
+        for candidate_type in _patient_types(pk):
+            patient = _patient_details_queryset(candidate_type).filter(pk=pk).first()
+            if patient:
+                patient_type = candidate_type
+                break
+        if not patient:
+            return not_found
 
-        # ---------- Render ----------
         html = render_to_string(
             'patients/partials/patient_details.html',
             {
                 "patient": patient,
                 "patient_type": patient_type,
-                "vitals": vitals,
-                "medications": medications,
-                "allergies": allergies,
-                "medical_history": medical_history,
-                "last_visit": last_visit,
+                "vitals": patient.latest_vitals[0] if patient.latest_vitals else None,
+                "medications": patient.medications.all(),
+                "allergies": patient.allergies.all(),
+                "medical_history": patient.medical_history,
+                "last_visit": patient.last_visit,
                 "user": request.user,
             },
             request=request
         )
+        cache.set(cache_key, html, getattr(settings, "PATIENT_DETAILS_CACHE_SECONDS", 24 * 60 * 60))
 
-        return JsonResponse({'html': html})
-
-    except Exception as e:
-        print(f"AJAX error for patient {pk}: {e}")
-        return JsonResponse({
-            'html': '<p class="muted">Failed to load patient details.</p>'
-        })
+    return JsonResponse({'html': html})
 
 @login_required
 def doctor_patient_list(request):
@@ -630,32 +704,25 @@ def doctor_patient_list(request):
 
     doctor = request.user.doctor_info
 
-    # Self patients (linked via Appointment)
-    user_ids = Appointment.objects.filter(
-        doctor=doctor
-    ).values_list('patient_id', flat=True).distinct()
-
-    # Dependent patients (linked via DependentAppointment)
-    dependent_ids = DependentAppointment.objects.filter(
-        doctor=doctor
-    ).values_list('dependent_patient_id', flat=True).distinct()
-
-    patients = []
-
-    # Fetch self patients
-    for p in PatientInfo.objects.filter(user_id__in=user_ids).select_related('user'):
-        setattr(p, "patient_type", "self")
-        patients.append(p)
-
-    # Fetch dependent patients
-    for d in DependentPatient.objects.filter(patient_id__in=dependent_ids):
-        setattr(d, "patient_type", "dependent")
-        patients.append(d)
-
-    # Sort by name
-    patients.sort(key=lambda x: x.user.get_full_name() if hasattr(x, 'user') else x.full_name)
-
-    return render(request, "doctors/patient_list.html", {"patients": patients})
+    sort = request.GET.get("sort", "name")
+    if sort.lstrip("-") not in patient_directory.PANEL_SORTS:
+        sort = "name"
+
+    paginator = Paginator(patient_directory.doctor_panel(doctor, sort), PAGE_SIZE)
+    page = paginator.get_page(request.GET.get("page"))
+
+    return render(request, "doctors/patient_list.html", {
+        "page": page,
+        "patients": page.object_list,
+        "sort": sort,
+        "sort_options": [
+            ("name", "Name"),
+            ("-last_visit", "Last visit"),
+            ("-visits", "Most visits"),
+            ("next_appointment", "Next appointment"),
+            ("-latest_vitals", "Latest vitals"),
+        ],
+    })
 
 # USER PATIENT PROFILE
 @login_required
@@ -678,7 +745,7 @@ def edit_my_patient_info(request):
             patient_instance.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=user,
                 action_type="update",
                 model_name="PatientInfo",
@@ -712,7 +779,7 @@ def add_dependent(request):
             dependent.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type="create",
                 model_name="DependentPatient",
@@ -746,7 +813,7 @@ def edit_dependent(request, pk):
             dependent = form.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type="update",
                 model_name="DependentPatient",
@@ -791,7 +858,7 @@ def add_patient_vitals(request, patient_type, pk):
                 vitals.dependent_patient = patient
             vitals.save()
 
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type='create',
                 model_name=vitals.__class__.__name__,
@@ -808,6 +875,36 @@ def add_patient_vitals(request, patient_type, pk):
 
 
 
+@login_required
+def patient_timeline(request, patient_type, pk):
+    """
+    JSON timeline of a patient's or dependent's appointments, vitals,
+    medications, allergies, records and prescriptions, newest first;
+    ?cursor= continues from the previous page.
+    """
+    role = request.user.role
+    if role not in ("patient", "staff", "doctor"):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    if patient_type == "self":
+        patients = PatientInfo.objects.all()
+        if role == "patient":
+            patients = patients.filter(user=request.user)
+    elif patient_type == "dependent":
+        patients = DependentPatient.objects.all()
+        if role == "patient":
+            patients = patients.filter(guardian=request.user)
+    else:
+        return JsonResponse({"error": "Invalid patient type"}, status=400)
+    patient = get_object_or_404(patients, pk=pk)
+
+    try:
+        per_page = min(int(request.GET.get("limit", PAGE_SIZE)), timeline.MAX_PAGE_SIZE)
+    except ValueError:
+        per_page = PAGE_SIZE
+    page = timeline.page(patient_type, patient, request.GET.get("cursor"), max(per_page, 1))
+    return JsonResponse({"items": page.items, "next_cursor": page.next_cursor})
+
 @login_required
 def vital_history(request, patient_type, pk):
     # Permission check
@@ -872,7 +969,7 @@ def add_patient_allergy(request, patient_type, pk):
                 allergy.dependent_patient = patient
             allergy.save()
 
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type='create',
                 model_name=allergy.__class__.__name__,
@@ -916,7 +1013,7 @@ def add_patient_medication(request, patient_type, pk):
                 medication.dependent_patient = patient
             medication.save()
 
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type='create',
                 model_name=medication.__class__.__name__,
@@ -975,7 +1072,7 @@ def doctor_edit_info(request):
             doctor_info = form.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type="update" if doctor_info.id else "create",
                 model_name="DoctorInfo",
@@ -1037,7 +1134,7 @@ def manager_approve_doctor(request, doctor_id):
         doctor.save()
 
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type="update",
             model_name="DoctorInfo",
@@ -1072,7 +1169,7 @@ def manager_reject_doctor(request, doctor_id):
         doctor.save()
 
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type="update",
             model_name="DoctorInfo",
@@ -1102,7 +1199,7 @@ def manager_add_specialization(request):
             specialization = form.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type="create",
                 model_name="Specialization",
@@ -1287,7 +1384,7 @@ def book_appointment(request):
                 appointment_id = appointment.id
                 
                 # Log activity
-                ActivityLog.objects.create(
+                log_activity(
                     user=request.user,
                     action_type="create",
                     model_name="Appointment",
@@ -1313,7 +1410,7 @@ def book_appointment(request):
                 appointment_id = appointment.id
                 
                 # Log activity
-                ActivityLog.objects.create(
+                log_activity(
                     user=request.user,
                     action_type="create",
                     model_name="DependentAppointment",
@@ -1351,7 +1448,7 @@ def doctor_schedule(request):
             availability.created_by = request.user
             availability.save()
             
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type="create",
                 model_name="DoctorAvailability",
@@ -1380,7 +1477,7 @@ def delete_availability(request, pk):
     )
     availability.delete()
     
-    ActivityLog.objects.create(
+    log_activity(
         user=request.user,
         action_type="delete",
         model_name="DoctorAvailability",
@@ -1408,7 +1505,7 @@ def doctor_custom_schedule(request):
             custom_avail.created_by = request.user
             custom_avail.save()
             
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type="create",
                 model_name="CustomDoctorAvailability",
@@ -1438,7 +1535,7 @@ def delete_custom_availability(request, pk):
     )
     availability.delete()
 
-    ActivityLog.objects.create(
+    log_activity(
         user=request.user,
         action_type="delete",
         model_name="CustomDoctorAvailability",
@@ -1449,6 +1546,29 @@ def delete_custom_availability(request, pk):
     messages.success(request, "Custom availability removed.")
     return redirect("doctor_custom_schedule")
 
+def _clinic_calendar_version(request):
+    return [versioning.CLINIC], ()
+
+
+def _doctor_calendar_version(request):
+    doctor = getattr(request.user, "doctor_info", None)
+    if doctor is None:
+        return None
+    return [versioning.doctor_key(doctor.id)], ()
+
+
+def _availability_version(request):
+    """Availability also depends on today's date, and for today on the current minute"""
+    doctor_id = request.GET.get("doctor_id", "")
+    if not doctor_id.isdigit():
+        return None
+    today = date.today()
+    vary = (today.isoformat(),)
+    if request.GET.get("date") == today.isoformat():
+        vary += (timezone.now().strftime("%H:%M"),)
+    return [versioning.doctor_key(doctor_id)], vary
+
+
 @login_required
 def doctor_available_days(request):
     """Return available days for a doctor in a given month (excluding past dates)"""
@@ -1551,6 +1671,7 @@ def doctor_available_days(request):
 
 
 @login_required
+@versioned(_availability_version)
 def doctor_daily_availability(request):
     """Return available time slots for a doctor on a specific date (excluding past times)"""
     doctor_id = request.GET.get("doctor_id")
@@ -1656,6 +1777,7 @@ def doctor_daily_availability(request):
     return JsonResponse(slots, safe=False)
 
 @login_required
+@versioned(_availability_version)
 def doctor_available_days(request):
 
     doctor_id = request.GET.get("doctor_id")
@@ -1759,68 +1881,175 @@ def doctor_available_days(request):
 def staff_appointment_calendar(request):
     if request.user.role != "staff":
         return redirect("home")
-    return render(request, "calendar/staff_calendar.html")
+    return render(request, "calendar/staff_calendar.html", {
+        "sync_interval": getattr(settings, "CALENDAR_SYNC_INTERVAL_SECONDS", 5)
+    })
+
+def _calendar_range(request):
+    """
+    Half-open [start, end) window from FullCalendar's start/end params.
+
+    Naive values are read in the `timeZone` param (the calendar's zone).
+    Missing params default to the current month; the window is capped at
+    CALENDAR_MAX_RANGE_DAYS. Returns None for unparseable input.
+    """
+    try:
+        zone = ZoneInfo(request.GET.get("timeZone") or settings.TIME_ZONE)
+    except (ValueError, ZoneInfoNotFoundError):
+        return None
+
+    def parse(value):
+        value = (value or "").strip().replace(" ", "+")
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            parsed = datetime.combine(day, datetime.min.time())
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, zone)
+
+    max_days = getattr(settings, "CALENDAR_MAX_RANGE_DAYS", 62)
+    try:
+        start = parse(request.GET.get("start"))
+        end = parse(request.GET.get("end"))
+    except ValueError:
+        return None
+
+    if start is None:
+        start = timezone.now().astimezone(zone).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if end is None or end > start + timedelta(days=max_days):
+        end = start + timedelta(days=max_days)
+    if end <= start:
+        return None
+    return start, end
+
 
 def get_event_color(status):
     """Return calendar event color based on appointment status"""
-    colors = {
-        'pending': '#ffc107',        # yellow
-        'approved': '#28a745',       # green
-        'completed': '#6c757d',      # gray
-        'rejected': '#dc3545',       # red
-        'no_show': '#17a2b8',        # blue/info
-    }
-    return colors.get(status, '#ffc107')  # default to yellow
+    return calendar_feeds.STATUS_COLORS.get(status, calendar_feeds.DEFAULT_COLOR)
 
 
+def _calendar_builder(request):
+    """Event builder for the feed format asked for with ?format= (default: one object per event)"""
+    if request.GET.get("format") == "columnar":
+        return calendar_feeds.calendar_columns
+    return calendar_feeds.calendar_events
+
+
+# Day-list badge class per status; anything else shows as cancelled
+DAY_STATUS_CLASSES = {
+    "approved": "status-confirmed",
+    "pending": "status-pending",
+}
+
 @login_required
+@versioned(_clinic_calendar_version)
 def calendar_events(request):
     user = request.user
     events = []
 
+    window = _calendar_range(request)
+    if window is None:
+        return JsonResponse({"error": "Invalid date range"}, status=400)
+    start, end = window
+    max_events = getattr(settings, "CALENDAR_MAX_EVENTS", 2000)
+    statuses = [status for status, _ in Appointment.STATUS_CHOICES if status != "completed"]
+    build = _calendar_builder(request)
+
     if user.role == "staff":
-        # Staff sees all appointments (excluding completed)
-        appointments = Appointment.objects.exclude(status="completed").select_related(
-            "patient", "doctor"
-        )
-        dependent_appointments = DependentAppointment.objects.exclude(status="completed").select_related(
-            "dependent_patient", "doctor"
-        )
-        
-        for a in appointments:
-            try:
-                patient_name = a.patient.get_full_name() if a.patient else "Unknown Patient"
-                title = f"{patient_name} ({a.status})"
-                color = get_event_color(a.status)  # USE THE HELPER FUNCTION
-                events.append({
-                    "id": a.id,
-                    "title": title,
-                    "start": a.start_time.isoformat(),
-                    "end": a.end_time.isoformat(),
-                    "color": color
-                })
-            except Exception as e:
-                print(f"Error processing appointment {a.id}: {e}")
-                continue
+        # Staff sees all appointments (excluding completed) in the visible window
+        events = build({
+            "self": Appointment.objects.filter(
+                status__in=statuses, start_time__gte=start, start_time__lt=end
+            ),
+            "dependent": DependentAppointment.objects.filter(
+                status__in=statuses, start_time__gte=start, start_time__lt=end
+            ),
+        }, max_events)
 
-        for a in dependent_appointments:
-            try:
-                patient_name = a.dependent_patient.full_name if a.dependent_patient else "Unknown Patient"
-                title = f"{patient_name} ({a.status})"
-                color = get_event_color(a.status)  # USE THE HELPER FUNCTION
-                events.append({
-                    "id": a.id,
-                    "title": title,
-                    "start": a.start_time.isoformat(),
-                    "end": a.end_time.isoformat(),
-                    "color": color
-                })
-            except Exception as e:
-                print(f"Error processing dependent appointment {a.id}: {e}")
-                continue
-    
     return JsonResponse(events, safe=False)
 
+@login_required
+@versioned(_clinic_calendar_version)
+def calendar_summary(request):
+    """Per-day appointment counts by status for the staff month grid"""
+    if request.user.role != "staff":
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    window = _calendar_range(request)
+    if window is None:
+        return JsonResponse({"error": "Invalid date range"}, status=400)
+    start, end = window
+    statuses = [status for status, _ in Appointment.STATUS_CHOICES if status != "completed"]
+
+    days = calendar_feeds.month_summary({
+        "self": Appointment.objects.filter(
+            status__in=statuses, start_time__gte=start, start_time__lt=end
+        ),
+        "dependent": DependentAppointment.objects.filter(
+            status__in=statuses, start_time__gte=start, start_time__lt=end
+        ),
+    }, ZoneInfo(request.GET.get("timeZone") or settings.TIME_ZONE))
+
+    return JsonResponse({"days": days, "colors": calendar_feeds.STATUS_COLORS})
+
+@login_required
+def calendar_changes(request):
+    """
+    Delta feed for open calendars: events changed and event ids removed since `since`.
+
+    Call without `since` to get a starting cursor. `reset` tells the client
+    to reload the full feed (cursor too old, or too many changes).
+    """
+    user = request.user
+    if user.role == "staff":
+        doctor = None
+    elif user.role == "doctor" and getattr(user, "doctor_info", None) and user.doctor_info.is_approved:
+        doctor = user.doctor_info
+    else:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    window = _calendar_range(request)
+    if window is None:
+        return JsonResponse({"error": "Invalid date range"}, status=400)
+
+    now = timezone.now()
+    cursor = encode_cursor(now, 0, "sync")
+    since = request.GET.get("since")
+    if not since:
+        return JsonResponse({"cursor": cursor, "changed": [], "removed": [], "reset": False})
+
+    decoded = decode_cursor(since)
+    retention = timedelta(days=getattr(settings, "CALENDAR_SYNC_RETENTION_DAYS", 7))
+    if decoded is None or decoded[1] != "sync" or decoded[0] < now - retention:
+        return JsonResponse({"cursor": cursor, "changed": [], "removed": [], "reset": True})
+
+    changed, removed, complete = calendar_sync.changes(
+        decoded[0], doctor=doctor, window=window,
+        limit=getattr(settings, "CALENDAR_MAX_EVENTS", 2000)
+    )
+    if not complete:
+        return JsonResponse({"cursor": cursor, "changed": [], "removed": [], "reset": True})
+
+    events = []
+    for appointment_type, a in changed:
+        event_id = calendar_sync.event_id(appointment_type, a.id)
+        # The staff calendar does not show completed appointments
+        if doctor is None and a.status == "completed":
+            removed.append(event_id)
+            continue
+        events.append({
+            "id": event_id,
+            "title": f"{a.patient_name} ({a.status})",
+            "start": a.start_time.isoformat(),
+            "end": a.end_time.isoformat(),
+            "color": get_event_color(a.status)
+        })
+
+    return JsonResponse({"cursor": cursor, "changed": events, "removed": removed, "reset": False})
+
 @login_required
 def staff_day_appointments(request):
     if request.user.role != "staff":
@@ -1830,46 +2059,19 @@ def staff_day_appointments(request):
     if not date_str:
         return JsonResponse([], safe=False)
 
-    date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-
-    # Normal appointments
-    appointments = Appointment.objects.filter(
-        start_time__date=date_obj
-    ).select_related("patient", "doctor")
-
-    # Dependent appointments
-    dependent_appointments = DependentAppointment.objects.filter(
-        start_time__date=date_obj
-    ).select_related("dependent_patient", "doctor")
-
-    data = []
-
-    for a in appointments:
-        patient_name = a.patient.get_full_name()
-        doctor_name = a.doctor.user.get_full_name() if a.doctor else "Unassigned"
-        data.append({
-            'id': a.id,
-            'patient_name': patient_name,
-            'doctor_name': doctor_name,
-            'start_time': a.start_time.strftime("%I:%M %p"),
-            'end_time': a.end_time.strftime("%I:%M %p"),
-            'status': a.status
-        })
-
-    for a in dependent_appointments:
-        patient_name = a.dependent_patient.full_name
-        doctor_name = a.doctor.user.get_full_name() if a.doctor else "Unassigned"
-        data.append({
-            'id': a.id,
-            'patient_name': patient_name,
-            'doctor_name': doctor_name,
-            'start_time': a.start_time.strftime("%I:%M %p"),
-            'end_time': a.end_time.strftime("%I:%M %p"),
-            'status': a.status
-        })
+    # The day is taken in the calendar's zone so it matches calendar_summary
+    try:
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+        zone = ZoneInfo(request.GET.get("timeZone") or settings.TIME_ZONE)
+    except (ValueError, ZoneInfoNotFoundError):
+        return JsonResponse([], safe=False)
+    day_start = timezone.make_aware(datetime.combine(date_obj, datetime.min.time()), zone)
+    day_end = timezone.make_aware(datetime.combine(date_obj + timedelta(days=1), datetime.min.time()), zone)
 
-    # Sort by start time
-    data.sort(key=lambda x: x['start_time'])
+    data = calendar_feeds.day_appointments({
+        "self": Appointment.objects.filter(start_time__gte=day_start, start_time__lt=day_end),
+        "dependent": DependentAppointment.objects.filter(start_time__gte=day_start, start_time__lt=day_end),
+    }, with_doctor=True, zone=zone)
 
     return JsonResponse(data, safe=False)
 
@@ -1995,7 +2197,7 @@ def update_appointment_status(request, pk, action):
     appointment.save()
 
     # Log activity
-    ActivityLog.objects.create(
+    log_activity(
         user=request.user,
         action_type="update",
         model_name=model_name,
@@ -2253,7 +2455,7 @@ def reschedule_appointment(request, pk):
         appointment.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type="update",
             model_name="DependentAppointment" if appointment_type == 'dependent' else "Appointment",
@@ -2308,7 +2510,7 @@ def cancel_appointment(request, pk):
         appointment.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type="update",
             model_name="DependentAppointment" if is_dependent else "Appointment",
@@ -2357,149 +2559,106 @@ def patient_appointments(request):
 def doctor_calendar(request):
     """Render doctor calendar page"""
     doctor = request.user.doctor_info
-    return render(request, "calendar/doctor_calendar.html", {"doctor": doctor})
+    feed = CalendarFeedToken.objects.filter(doctor=doctor).first()
+    return render(request, "calendar/doctor_calendar.html", {
+        "doctor": doctor,
+        "sync_interval": getattr(settings, "CALENDAR_SYNC_INTERVAL_SECONDS", 5),
+        "feed_url": request.build_absolute_uri(reverse("doctor_ics_feed", args=[feed.token])) if feed else None
+    })
 
 
 @login_required
 @doctor_approved_required
-def doctor_calendar_events(request):
-    """Return all appointments for the doctor as JSON for calendar"""
-    try:
-        doctor = request.user.doctor_info
-        events = []
-
-        def get_event_color(status):
-            """Return calendar event color based on appointment status"""
-            colors = {
-                'pending': '#ffc107',        # yellow
-                'approved': '#28a745',       # green
-                'completed': '#6c757d',      # gray
-                'rejected': '#dc3545',       # red
-                'no_show': '#17a2b8',        # blue/info
-            }
-            return colors.get(status, '#ffc107')
+def rotate_calendar_feed_token(request):
+    """Create (or replace) the doctor's calendar subscription URL"""
+    if request.method != "POST":
+        return redirect("doctor_calendar")
 
-        # Self appointments
-        appointments = Appointment.objects.filter(
-            doctor=doctor
-        ).select_related("patient")
-        
-        for a in appointments:
-            try:
-                patient_name = a.patient.get_full_name() if a.patient else "Unknown Patient"
-                color = get_event_color(a.status)  # Use helper function
-                events.append({
-                    "id": f"self-{a.id}",
-                    "title": f"{patient_name} ({a.status})",
-                    "start": a.start_time.isoformat(),
-                    "end": a.end_time.isoformat(),
-                    "color": color
-                })
-            except Exception as e:
-                print(f"Error processing appointment {a.id}: {e}")
-                continue
+    doctor = request.user.doctor_info
+    with transaction.atomic():
+        CalendarFeedToken.objects.filter(doctor=doctor).delete()
+        CalendarFeedToken.objects.create(doctor=doctor)
+
+    messages.success(request, "New calendar subscription link created. Links created before no longer work.")
+    return redirect("doctor_calendar")
+
+
+def doctor_ics_feed(request, token):
+    """Tokenized iCalendar feed of a doctor's approved appointments (no login: calendar apps poll it)"""
+    feed = CalendarFeedToken.objects.filter(
+        token=token, doctor__is_approved=True
+    ).select_related("doctor__user").first()
+    if feed is None:
+        raise Http404
+
+    host = request.get_host()
+    key = ics_feed.cache_key(feed.doctor_id, host)
+    etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    body = cache.get(key)
+    if body is not None:
+        response = HttpResponse(body, content_type="text/calendar; charset=utf-8")
+    else:
+        response = StreamingHttpResponse(
+            ics_feed.caching(ics_feed.generate(feed.doctor, host), key),
+            content_type="text/calendar; charset=utf-8"
+        )
+    response["ETag"] = etag
+    response["Content-Disposition"] = 'inline; filename="appointments.ics"'
+    return response
 
-        # Dependent appointments
-        dependent_appointments = DependentAppointment.objects.filter(
-            doctor=doctor
-        ).select_related("dependent_patient")
-        
-        for a in dependent_appointments:
-            try:
-                patient_name = a.dependent_patient.full_name if a.dependent_patient else "Unknown Patient"
-                color = get_event_color(a.status)  # Use helper function
-                events.append({
-                    "id": f"dep-{a.id}",
-                    "title": f"{patient_name} ({a.status})",
-                    "start": a.start_time.isoformat(),
-                    "end": a.end_time.isoformat(),
-                    "color": color
-                })
-            except Exception as e:
-                print(f"Error processing dependent appointment {a.id}: {e}")
-                continue
 
-        return JsonResponse(events, safe=False)
+@login_required
+@doctor_approved_required
+@versioned(_doctor_calendar_version)
+def doctor_calendar_events(request):
+    """Return the doctor's appointments in the visible window as JSON for calendar"""
+    window = _calendar_range(request)
+    if window is None:
+        return JsonResponse({"error": "Invalid date range"}, status=400)
+    start, end = window
+    max_events = getattr(settings, "CALENDAR_MAX_EVENTS", 2000)
 
-    except Exception as e:
-        print(f"Error in doctor_calendar_events: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse([], safe=False)
+    doctor = request.user.doctor_info
+    events = _calendar_builder(request)({
+        "self": Appointment.objects.filter(doctor=doctor, start_time__gte=start, start_time__lt=end),
+        "dependent": DependentAppointment.objects.filter(doctor=doctor, start_time__gte=start, start_time__lt=end),
+    }, max_events)
+
+    return JsonResponse(events, safe=False)
 
 @login_required
 @doctor_approved_required
 def doctor_day_appointments(request):
     """Return appointments for a given date"""
-    try:
-        doctor = request.user.doctor_info
-        date_str = request.GET.get("date")
-        
-        if not date_str:
-            return JsonResponse([], safe=False)
-
-        try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
-            return JsonResponse([], safe=False)
-
-        data = []
+    doctor = request.user.doctor_info
+    date_str = request.GET.get("date")
 
-        # Self appointments
-        appointments = Appointment.objects.filter(
-            doctor=doctor,
-            start_time__date=date_obj
-        ).select_related("patient")
-        
-        for a in appointments:
-            try:
-                patient_name = a.patient.get_full_name() if a.patient else "Unknown"
-                status_class = "status-confirmed" if a.status == "approved" else "status-pending" if a.status == "pending" else "status-cancelled"
-                
-                data.append({
-                    "id": f"self-{a.id}",
-                    "patient_name": patient_name,
-                    "start_time": a.start_time.strftime("%I:%M %p"),
-                    "end_time": a.end_time.strftime("%I:%M %p"),
-                    "status": a.status,
-                    "status_class": status_class
-                })
-            except Exception as e:
-                print(f"Error processing appointment {a.id}: {e}")
-                continue
+    if not date_str:
+        return JsonResponse([], safe=False)
 
-        # Dependent appointments
-        dependent_appointments = DependentAppointment.objects.filter(
-            doctor=doctor,
-            start_time__date=date_obj
-        ).select_related("dependent_patient")
-        
-        for a in dependent_appointments:
-            try:
-                patient_name = a.dependent_patient.full_name if a.dependent_patient else "Unknown"
-                status_class = "status-confirmed" if a.status == "approved" else "status-pending" if a.status == "pending" else "status-cancelled"
-                
-                data.append({
-                    "id": f"dep-{a.id}",
-                    "patient_name": patient_name,
-                    "start_time": a.start_time.strftime("%I:%M %p"),
-                    "end_time": a.end_time.strftime("%I:%M %p"),
-                    "status": a.status,
-                    "status_class": status_class
-                })
-            except Exception as e:
-                print(f"Error processing dependent appointment {a.id}: {e}")
-                continue
-
-        # Sort by start time
-        data.sort(key=lambda x: x['start_time'])
-        return JsonResponse(data, safe=False)
-
-    except Exception as e:
-        print(f"Error in doctor_day_appointments: {e}")
-        import traceback
-        traceback.print_exc()
+    # The day is taken in the calendar's zone, as in staff_day_appointments
+    try:
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+        zone = ZoneInfo(request.GET.get("timeZone") or settings.TIME_ZONE)
+    except (ValueError, ZoneInfoNotFoundError):
         return JsonResponse([], safe=False)
+    day_start = timezone.make_aware(datetime.combine(date_obj, datetime.min.time()), zone)
+    day_end = timezone.make_aware(datetime.combine(date_obj + timedelta(days=1), datetime.min.time()), zone)
+
+    data = calendar_feeds.day_appointments({
+        "self": Appointment.objects.filter(doctor=doctor, start_time__gte=day_start, start_time__lt=day_end),
+        "dependent": DependentAppointment.objects.filter(
+            doctor=doctor, start_time__gte=day_start, start_time__lt=day_end
+        ),
+    }, event_ids=True, zone=zone)
+    for item in data:
+        item["status_class"] = DAY_STATUS_CLASSES.get(item["status"], "status-cancelled")
+
+    return JsonResponse(data, safe=False)
 
 def get_status_class(status, for_calendar=False):
     """Return CSS color code for status"""
@@ -2611,44 +2770,12 @@ def add_medical_record(request, patient_type, pk):
         record_form = MedicalRecordForm(request.POST)
         prescription_formset = PrescriptionFormSet(request.POST)
 
-        if record_form.is_valid() and prescription_formset.is_valid():
-            # Save medical record
-            record = record_form.save(commit=False)
-            # AUTO-ASSIGN LOGGED-IN USER
-            record.created_by = request.user
-            
-            if patient_type == 'self':
-                record.patient = patient
-            else:
-                record.dependent_patient = patient
-            record.save()
-
-            # Save prescriptions
-            prescription_formset.instance = record
-            for prescription in prescription_formset.save(commit=False):
-                # AUTO-ASSIGN LOGGED-IN USER
-                prescription.created_by = request.user
-                prescription.save()
-
-            # Log activity for medical record
-            ActivityLog.objects.create(
-                user=request.user,
-                action_type="create",
-                model_name="MedicalRecord",
-                object_id=str(record.id),
-                related_object_repr=str(record)
-            )
-
-            # Log activity for prescriptions
-            for prescription in record.prescriptions.all():
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action_type="create",
-                    model_name="Prescription",
-                    object_id=str(prescription.id),
-                    related_object_repr=str(prescription)
-                )
-
+        record = medical_records_service.create_medical_record(
+            record_form, prescription_formset, request.user,
+            patient=patient if patient_type == 'self' else None,
+            dependent_patient=patient if patient_type == 'dependent' else None,
+        )
+        if record is not None:
             messages.success(request, "Medical record added successfully")
             if request.user.role == 'doctor':
                 return redirect('doctor_patient_list')
@@ -2698,7 +2825,7 @@ def edit_medical_record(request, pk):
                 prescription.save()
 
             # Log activity for update
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type="update",
                 model_name="MedicalRecord",
@@ -2707,7 +2834,7 @@ def edit_medical_record(request, pk):
             )
 
             for prescription in record.prescriptions.all():
-                ActivityLog.objects.create(
+                log_activity(
                     user=request.user,
                     action_type="update",
                     model_name="Prescription",
@@ -2804,7 +2931,7 @@ def submit_doctor_rating(request, doctor_id):
         rating_instance.save()
 
         # Log update
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type="update",
             model_name="DoctorRating",
@@ -2821,7 +2948,7 @@ def submit_doctor_rating(request, doctor_id):
         )
 
         # Log create
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type="create",
             model_name="DoctorRating",
@@ -2865,7 +2992,7 @@ def delete_patient_vitals(request, pk, patient_type='self'):
         vitals.delete()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='delete',
             model_name=vitals.__class__.__name__,
@@ -2912,7 +3039,7 @@ def delete_patient_allergy(request, pk, patient_type='self'):
         allergy.delete()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='delete',
             model_name=allergy.__class__.__name__,
@@ -2963,7 +3090,7 @@ def delete_patient_medication(request, pk, patient_type='self'):
         medication.delete()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='delete',
             model_name=medication.__class__.__name__,
@@ -3010,7 +3137,7 @@ def delete_medical_record(request, pk):
         prescriptions = medical_record.prescriptions.all()
         for prescription in prescriptions:
             # Log each prescription deletion
-            ActivityLog.objects.create(
+            log_activity(
                 user=request.user,
                 action_type='delete',
                 model_name='Prescription',
@@ -3021,7 +3148,7 @@ def delete_medical_record(request, pk):
         medical_record.delete()
         
         # Log activity for medical record
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='delete',
             model_name='MedicalRecord',
@@ -3188,7 +3315,7 @@ def manager_user_details(request, user_id):
             }
     
     # Get activity logs for this user
-    recent_activities = ActivityLog.objects.filter(user=user).order_by('-timestamp')[:10]
+    recent_activities = ActivityLog.objects.filter(user=user).recent(10)
     
     context = {
         'viewed_user': user,
@@ -3226,7 +3353,7 @@ def manager_deactivate_user(request, user_id):
         user.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='update',
             model_name='User',
@@ -3260,7 +3387,7 @@ def manager_activate_user(request, user_id):
         user.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='update',
             model_name='User',
@@ -3306,7 +3433,7 @@ def manager_change_user_role(request, user_id):
         user.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='update',
             model_name='User',
@@ -3389,6 +3516,67 @@ def appointment_recommendations(request):
     
     return render(request, 'calendar/appointment_recommendations.html', context)
 
+ACTIVITY_FEED_MAX_PAGE = 100
+
+
+@login_required
+def activity_feed(request):
+    """
+    JSON activity feed, newest first, keyset paginated.
+
+    Filters: user (id), model, object_id, action; pass back `next_cursor`
+    as `cursor` for the following page.
+    """
+    if request.user.role not in ['staff', 'manager']:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    activities = ActivityLog.objects.select_related('user')
+
+    user_id = request.GET.get('user', '').strip()
+    if user_id:
+        if not user_id.isdigit():
+            return JsonResponse({"error": "Invalid user"}, status=400)
+        activities = activities.filter(user_id=user_id)
+
+    model_name = request.GET.get('model', '').strip()
+    if model_name:
+        activities = activities.filter(model_name=model_name)
+        object_id = request.GET.get('object_id', '').strip()
+        if object_id:
+            activities = activities.filter(object_id=object_id)
+
+    action_type = request.GET.get('action', '').strip()
+    if action_type:
+        if action_type not in dict(ActivityLog.ACTION_TYPES):
+            return JsonResponse({"error": "Invalid action"}, status=400)
+        activities = activities.filter(action_type=action_type)
+
+    try:
+        per_page = min(max(int(request.GET.get('limit', 25)), 1), ACTIVITY_FEED_MAX_PAGE)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+
+    page = keyset_page(activities, request.GET.get('cursor'), per_page=per_page, field='timestamp')
+
+    return JsonResponse({
+        'results': [
+            {
+                'id': activity.id,
+                'timestamp': activity.timestamp.isoformat(),
+                'user_id': activity.user_id,
+                'user_name': activity.user.get_full_name() if activity.user else "System",
+                'action_type': activity.action_type,
+                'model_name': activity.model_name,
+                'object_id': activity.object_id,
+                'related_object_repr': activity.related_object_repr,
+                'description': activity.description,
+            }
+            for activity in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required
 def manager_dashboard(request):
     """Manager dashboard with comprehensive analytics"""
@@ -3517,7 +3705,7 @@ def manager_dashboard(request):
         })
     
     # === RECENT ACTIVITY ===
-    recent_activities = ActivityLog.objects.select_related('user').order_by('-timestamp')[:15]
+    recent_activities = ActivityLog.objects.select_related('user').recent(15)
     
     # === TOP RATED DOCTORS ===
     top_rated_doctors = []
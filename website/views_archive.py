@@ -1,9 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.core.exceptions import ValidationError
-from django.db.models import Q
 from django.utils import timezone
 from accounts.models import User, Phone
 
@@ -24,9 +23,21 @@ from website.models import (PatientInfo,
 )
 from website.archive_models import (
     ArchivedPatientInfo, ArchivedDependentPatient, ArchivedDoctorInfo,
-    ArchivedAppointment, ArchivedMedicalRecord, DeletedRecord
+    ArchivedAppointment, ArchivedMedicalRecord, DeletedRecord, ArchiveJob
 )
 from website.services.archive_service import ArchiveService, DeleteService
+from website.services.activity_log import log_activities, log_activity
+from website.services.archive_worker import ArchiveWorker
+from website.services import cold_storage
+from website.services.pagination import keyset_page, merged_keyset_page
+from website.services.search import search
+
+
+def _archived_patient_links(archived_patient, patient_type):
+    """Lookup kwargs for archive rows linked to an archived patient or dependent"""
+    if patient_type == 'self':
+        return {'original_patient_id': archived_patient.original_patient_id}
+    return {'original_dependent_id': archived_patient.original_patient_id}
 
 
 # ==================== PATIENT ARCHIVE/DELETE ====================
@@ -208,46 +219,27 @@ def archived_patients_list(request):
         messages.error(request, "Access denied.")
         return redirect('home')
     
-    # Get archived self patients
-    archived_self = ArchivedPatientInfo.objects.all()
-    
-    # Get archived dependents
-    archived_dependents = ArchivedDependentPatient.objects.all()
-    
-    # Search functionality
     search_query = request.GET.get('search', '').strip()
-    if search_query:
-        archived_self = archived_self.filter(
-            Q(user_full_name__icontains=search_query) |
-            Q(original_patient_id__icontains=search_query) |
-            Q(user_email__icontains=search_query)
-        )
-        archived_dependents = archived_dependents.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(original_patient_id__icontains=search_query)
-        )
-    
-    # Combine and sort by archived_at (most recent first)
-    all_patients = []
+    archived_self = search(ArchivedPatientInfo.objects.all(), search_query)
+    archived_dependents = search(ArchivedDependentPatient.objects.all(), search_query)
     
-    # Add self patients with type marker
-    for patient in archived_self:
-        patient.patient_type = 'self'
-        all_patients.append(patient)
+    # Most recently archived first, across both tables
+    page = merged_keyset_page(
+        [('self', archived_self), ('dependent', archived_dependents)],
+        cursor=request.GET.get('cursor'),
+    )
+    for patient in page:
+        patient.patient_type = 'self' if isinstance(patient, ArchivedPatientInfo) else 'dependent'
     
-    # Add dependent patients with type marker
-    for patient in archived_dependents:
-        patient.patient_type = 'dependent'
-        all_patients.append(patient)
-    
-    # Sort by archived_at descending
-    all_patients.sort(key=lambda x: x.archived_at, reverse=True)
+    self_count = archived_self.count()
+    dependents_count = archived_dependents.count()
     
     return render(request, 'archive/archived_patients.html', {
-        'archived_self': archived_self,
-        'archived_dependents': archived_dependents,
-        'all_patients': all_patients,
+        'page': page,
+        'all_patients': page.items,
+        'self_count': self_count,
+        'dependents_count': dependents_count,
+        'total_count': self_count + dependents_count,
         'search_query': search_query
     })
 
@@ -259,47 +251,13 @@ def archived_doctors_list(request):
         messages.error(request, "Access denied.")
         return redirect('home')
     
-    archived_doctors = ArchivedDoctorInfo.objects.all()
-    
-    # Search functionality
     search_query = request.GET.get('search', '').strip()
-    if search_query:
-        archived_doctors = archived_doctors.filter(
-            Q(user_full_name__icontains=search_query) |
-            Q(user_email__icontains=search_query) |
-            Q(license_number__icontains=search_query)
-        )
+    archived_doctors = search(ArchivedDoctorInfo.objects.all(), search_query)
+    page = keyset_page(archived_doctors, cursor=request.GET.get('cursor'))
     
     return render(request, 'archive/archived_doctors.html', {
-        'archived_doctors': archived_doctors,
-        'search_query': search_query
-    })
-
-
-@login_required
-def archived_appointments_list(request):
-    """View archived appointments"""
-    if request.user.role not in ['staff', 'doctor']:
-        messages.error(request, "Access denied.")
-        return redirect('home')
-    
-    archived_appointments = ArchivedAppointment.objects.all()
-    
-    # Filter by doctor if doctor role
-    if request.user.role == 'doctor':
-        doctor_name = request.user.get_full_name()
-        archived_appointments = archived_appointments.filter(doctor_name__icontains=doctor_name)
-    
-    # Search functionality
-    search_query = request.GET.get('search', '').strip()
-    if search_query:
-        archived_appointments = archived_appointments.filter(
-            Q(patient_name__icontains=search_query) |
-            Q(doctor_name__icontains=search_query)
-        )
-    
-    return render(request, 'archive/archived_appointments.html', {
-        'archived_appointments': archived_appointments,
+        'page': page,
+        'archived_doctors': page.items,
         'search_query': search_query
     })
 
@@ -320,17 +278,26 @@ def deleted_records_list(request):
     
     # Search functionality
     search_query = request.GET.get('search', '').strip()
-    if search_query:
-        deleted_records = deleted_records.filter(
-            Q(object_repr__icontains=search_query) |
-            Q(deletion_reason__icontains=search_query)
-        )
+    deleted_records = search(deleted_records, search_query)
+    page = keyset_page(deleted_records, cursor=request.GET.get('cursor'), field='deleted_at')
+    
+    # Records tiered to cold storage are found by their original id and
+    # shown above the first page
+    cold_records = []
+    if search_query and not request.GET.get('cursor'):
+        for row in cold_storage.find('deleted_records', 'id', search_query):
+            if model_filter and row.fields['model_name'] != model_filter:
+                continue
+            record = row.instance
+            record.in_cold_storage = True
+            cold_records.append(record)
     
     # Get unique model names for filter
-    model_names = DeletedRecord.objects.values_list('model_name', flat=True).distinct()
+    model_names = DeletedRecord.objects.order_by('model_name').values_list('model_name', flat=True).distinct()
     
     return render(request, 'archive/deleted_records.html', {
-        'deleted_records': deleted_records,
+        'page': page,
+        'deleted_records': cold_records + list(page.items),
         'model_names': model_names,
         'search_query': search_query,
         'model_filter': model_filter
@@ -441,7 +408,7 @@ def archive_dependent_appointment_view(request, pk):
 
 @login_required
 def bulk_archive_appointments(request):
-    """Bulk archive old appointments"""
+    """Queue a background job that archives old appointments"""
     if request.user.role not in ['staff', 'manager']:
         messages.error(request, "Access denied")
         return redirect('home')
@@ -449,14 +416,45 @@ def bulk_archive_appointments(request):
     if request.method == 'POST':
         days = int(request.POST.get('days', 90))
         
+        if ArchiveJob.objects.filter(status__in=['queued', 'running']).exists():
+            messages.error(request, "An archive job is already in progress.")
+            return redirect('bulk_archive_appointments')
+        
         try:
-            count = ArchiveService.bulk_archive_old_appointments(days, request.user)
-            messages.success(request, f"Successfully archived {count} appointments older than {days} days")
-            return redirect('appointments')
+            job = ArchiveWorker.enqueue(days, request.user)
+            messages.success(
+                request,
+                f"Archive job queued for {job.total_estimate} appointments older than {days} days. "
+                f"It runs in the background during quiet hours."
+            )
+            return redirect('bulk_archive_appointments')
         except Exception as e:
-            messages.error(request, f"Error during bulk archive: {str(e)}")
+            messages.error(request, f"Error queuing bulk archive: {str(e)}")
     
-    return render(request, 'archive/bulk_archive_appointments.html')
+    return render(request, 'archive/bulk_archive_appointments.html', {
+        'jobs': ArchiveJob.objects.select_related('requested_by')[:5]
+    })
+
+
+@login_required
+def archive_job_status(request, pk):
+    """AJAX view polled by the bulk archive page for job progress"""
+    if request.user.role not in ['staff', 'manager']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    job = get_object_or_404(ArchiveJob, pk=pk)
+    
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'archived_count': job.archived_count,
+        'total_estimate': job.total_estimate,
+        'progress_percent': job.progress_percent,
+        'is_active': job.is_active,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        'last_error': job.last_error or '',
+    })
 
 
 @login_required
@@ -479,69 +477,160 @@ def restore_archived_appointment(request, pk):
         return redirect('archived_appointments')
     
     # GET request - show confirmation
-    from website.archive_models import ArchivedAppointment
-    archived = get_object_or_404(ArchivedAppointment, pk=pk)
+    archived = ArchivedAppointment.objects.filter(pk=pk).first()
+    if archived is None:
+        cold = cold_storage.find('appointments', 'pk', pk)
+        if not cold:
+            raise Http404("Archived appointment not found")
+        archived = cold[0].instance
     
     return render(request, 'archive/confirm_restore_appointment.html', {
         'archived': archived
     })
 
 
+@login_required
+def bulk_restore_archived_appointments(request):
+    """Restore the selected archived appointments in one batch"""
+    if request.user.role not in ['staff', 'manager']:
+        messages.error(request, "Access denied")
+        return redirect('home')
+    
+    if request.method != 'POST':
+        return redirect('archived_appointments')
+    
+    # Copied rows are posted as "<archived id>", flagged rows as "<type>:<appointment id>"
+    archived_ids, flagged = [], {'self': [], 'dependent': []}
+    for value in request.POST.getlist('archived_ids'):
+        appointment_type, _, pk = value.rpartition(':')
+        if not pk.isdigit():
+            continue
+        if appointment_type in flagged:
+            flagged[appointment_type].append(int(pk))
+        elif not appointment_type:
+            archived_ids.append(int(pk))
+    
+    if not archived_ids and not any(flagged.values()):
+        messages.warning(request, "No archived appointments selected.")
+        return redirect('archived_appointments')
+    
+    try:
+        restored, skipped = ArchiveService.bulk_restore_appointments(archived_ids)
+        unflagged = sum(
+            ArchiveService.unflag_appointments(appointment_type, ids)
+            for appointment_type, ids in flagged.items() if ids
+        )
+    except Exception as e:
+        messages.error(request, f"Error restoring appointments: {str(e)}")
+        return redirect('archived_appointments')
+    
+    if unflagged:
+        messages.success(request, f"{unflagged} soft-archived appointment(s) restored.")
+    
+    if restored:
+        log_activities([
+            ActivityLog(
+                user=request.user,
+                action_type='create',
+                model_name=f"{type(appointment).__name__} (Restored)",
+                object_id=str(appointment.pk),
+                related_object_repr=f"{type(appointment).__name__} #{appointment.pk}",
+                description="Restored archived appointment (batch restore)"
+            )
+            for appointment in restored
+        ])
+        messages.success(request, f"{len(restored)} appointment(s) restored successfully.")
+    if skipped:
+        messages.warning(
+            request,
+            f"{len(skipped)} appointment(s) could not be restored: their patient or doctor no longer exists."
+        )
+    
+    return redirect('archived_appointments')
+
+
 # ==================== UPDATE YOUR archived_appointments_list VIEW ====================
 
 @login_required
 def archived_appointments_list(request):
-    """View archived appointments - UPDATED"""
-    from website.archive_models import ArchivedAppointment
-    
+    """View archived appointments, both copied and soft-archived (flagged)"""
     # Permission check
     if request.user.role == 'patient':
         # Patients see their own archived appointments
-        patient_name = request.user.get_full_name()
-        archived_appointments = ArchivedAppointment.objects.filter(
-            patient_name__icontains=patient_name
-        )
+        profile = getattr(request.user, 'patient_profile', None)
+        links = {'original_patient_id': profile.patient_id} if profile else None
     elif request.user.role == 'doctor':
         # Doctors see their archived appointments
-        doctor_name = request.user.get_full_name()
-        archived_appointments = ArchivedAppointment.objects.filter(
-            doctor_name__icontains=doctor_name
-        )
+        doctor_info = getattr(request.user, 'doctor_info', None)
+        links = {'original_doctor_id': doctor_info.id} if doctor_info else None
     elif request.user.role in ['staff', 'manager']:
         # Staff/Manager see all archived appointments
-        archived_appointments = ArchivedAppointment.objects.all()
+        links = {}
     else:
         messages.error(request, "Access denied")
         return redirect('home')
     
-    # Search functionality
     search_query = request.GET.get('search', '').strip()
-    if search_query:
-        from django.db.models import Q
-        archived_appointments = archived_appointments.filter(
-            Q(patient_name__icontains=search_query) |
-            Q(doctor_name__icontains=search_query) |
-            Q(doctor_specialization__icontains=search_query)
-        )
-    
-    # Filter by status
     status_filter = request.GET.get('status', '').strip()
-    if status_filter:
-        archived_appointments = archived_appointments.filter(status=status_filter)
-    
-    # Filter by appointment type
     type_filter = request.GET.get('type', '').strip()
-    if type_filter:
-        archived_appointments = archived_appointments.filter(appointment_type=type_filter)
+    
+    sources = []
+    for tag, queryset in [
+        ('archived', ArchivedAppointment.objects.all()),
+        ('self', ArchiveService.flagged_appointments('self')),
+        ('dependent', ArchiveService.flagged_appointments('dependent')),
+    ]:
+        queryset = queryset.filter(**links) if links is not None else queryset.none()
+        
+        # Search functionality
+        queryset = search(queryset, search_query)
+        
+        # Filter by status
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        
+        # Filter by appointment type
+        if type_filter:
+            queryset = queryset.filter(appointment_type=type_filter)
+        
+        sources.append((tag, queryset))
+    
+    page = merged_keyset_page(sources, cursor=request.GET.get('cursor'))
     
     return render(request, 'archive/archived_appointments.html', {
-        'archived_appointments': archived_appointments,
+        'page': page,
+        'archived_appointments': page.items,
         'search_query': search_query,
         'status_filter': status_filter,
         'type_filter': type_filter
     })
 
 
+@login_required
+def unarchive_appointment(request, appointment_type, pk):
+    """Restore a soft-archived (flagged) appointment"""
+    if request.user.role not in ['staff', 'manager']:
+        messages.error(request, "Access denied")
+        return redirect('home')
+    
+    if appointment_type not in ['self', 'dependent']:
+        messages.error(request, "Invalid appointment type.")
+        return redirect('archived_appointments')
+    
+    if request.method == 'POST':
+        if ArchiveService.unflag_appointments(appointment_type, [pk]):
+            messages.success(request, "Appointment restored successfully")
+        else:
+            messages.error(request, "Appointment not found or not archived")
+        return redirect('archived_appointments')
+    
+    archived = get_object_or_404(ArchiveService.flagged_appointments(appointment_type), pk=pk)
+    
+    return render(request, 'archive/confirm_restore_appointment.html', {
+        'archived': archived
+    })
+
+
 @login_required
 def deleted_record_snapshot_ajax(request, pk):
     """AJAX view to fetch deleted record snapshot data"""
@@ -549,7 +638,15 @@ def deleted_record_snapshot_ajax(request, pk):
         return JsonResponse({'error': 'Access denied'}, status=403)
     
     try:
-        record = DeletedRecord.objects.get(pk=pk)
+        record = DeletedRecord.objects.filter(pk=pk).first()
+        if record is None:
+            # Tiered to cold storage by tier_archives
+            cold = cold_storage.find('deleted_records', 'pk', pk)
+            if not cold:
+                raise DeletedRecord.DoesNotExist
+            record = cold[0].instance
+            # The deleting user may be gone by now
+            record.deleted_by = User.objects.filter(pk=record.deleted_by_id).first()
         
         # Format the deleted_at datetime
         deleted_at_formatted = record.deleted_at.strftime("%B %d, %Y at %I:%M %p")
@@ -638,15 +735,18 @@ def archived_patient_detailed_records(request, pk, patient_type='self'):
             patient = ArchivedDependentPatient.objects.get(pk=pk)
             patient.patient_type = 'dependent'
         
-        # Get archived medical records
-        medical_records = ArchivedMedicalRecord.objects.filter(
-            patient_id_str=patient.original_patient_id
-        ).order_by('-created_at')
+        links = _archived_patient_links(patient, patient_type)
+        
+        # Get archived medical records and appointments, including rows moved to cold storage
+        medical_records = list(ArchivedMedicalRecord.objects.filter(**links)) + [
+            row.instance for row in cold_storage.find('medical_records', 'patient', patient.original_patient_id)
+        ]
+        medical_records.sort(key=lambda record: record.created_at, reverse=True)
         
-        # Get archived appointments
-        appointments = ArchivedAppointment.objects.filter(
-            patient_name=patient.user_full_name if patient_type == 'self' else f"{patient.first_name} {patient.last_name}"
-        ).order_by('-start_time')
+        appointments = list(ArchivedAppointment.objects.filter(**links)) + [
+            row.instance for row in cold_storage.find('appointments', 'patient', patient.original_patient_id)
+        ]
+        appointments.sort(key=lambda appointment: appointment.start_time, reverse=True)
         
         # Parse additional data
         additional_data = patient.additional_data or {}
@@ -655,8 +755,8 @@ def archived_patient_detailed_records(request, pk, patient_type='self'):
         vitals_count = additional_data.get('vitals_count', 0)
         allergies_count = additional_data.get('allergies_count', 0)
         medications_count = additional_data.get('medications_count', 0)
-        medical_records_count = medical_records.count()
-        appointments_count = appointments.count()
+        medical_records_count = len(medical_records)
+        appointments_count = len(appointments)
         
         # Extract latest vitals
         latest_vitals = None
@@ -736,18 +836,15 @@ def confirm_restore_patient(request, pk, patient_type='self'):
             patient = ArchivedDependentPatient.objects.get(pk=pk)
         
         # Count related archived records
-        if patient_type == 'self':
-            medical_records_count = ArchivedMedicalRecord.objects.filter(
-                patient_id_str=patient.original_patient_id
-            ).count()
-        else:
-            medical_records_count = ArchivedMedicalRecord.objects.filter(
-                patient_id_str=patient.original_patient_id
-            ).count()
-        
-        appointments_count = ArchivedAppointment.objects.filter(
-            patient_name=patient.user_full_name if patient_type == 'self' else f"{patient.first_name} {patient.last_name}"
-        ).count()
+        links = _archived_patient_links(patient, patient_type)
+        medical_records_count = (
+            ArchivedMedicalRecord.objects.filter(**links).count()
+            + len(cold_storage.find('medical_records', 'patient', patient.original_patient_id))
+        )
+        appointments_count = (
+            ArchivedAppointment.objects.filter(**links).count()
+            + len(cold_storage.find('appointments', 'patient', patient.original_patient_id))
+        )
         
         additional_data = patient.additional_data or {}
         vitals_count = additional_data.get('vitals_count', 0)
@@ -845,137 +942,65 @@ def restore_patient(request, pk, patient_type='self'):
         
         # Restore related records if option is checked
         if restore_records:
-            # ========== RESTORE ARCHIVED APPOINTMENTS ==========
-            # Get archived appointments for this patient
-            archived_appointments = ArchivedAppointment.objects.filter(
-                patient_name=patient_name
-            )
+            # Bring back rows that were moved to cold storage first
+            cold_storage.rehydrate('appointments', 'patient', archived_patient.original_patient_id)
+            cold_storage.rehydrate('medical_records', 'patient', archived_patient.original_patient_id)
             
-            for archived_appt in archived_appointments:
-                doctor_id = archived_appt.additional_data.get('doctor_id')
-                
-                # Skip if doctor doesn't exist
-                if not doctor_id:
-                    continue
-                
-                try:
-                    doctor = DoctorInfo.objects.get(pk=doctor_id)
-                except DoctorInfo.DoesNotExist:
-                    print(f"Doctor {doctor_id} not found for appointment {archived_appt.id}")
-                    continue
-                
-                # Restore the appointment
-                try:
-                    if patient_type == 'self':
-                        Appointment.objects.create(
-                            patient=restored_patient.user,
-                            doctor=doctor,
-                            start_time=archived_appt.start_time,
-                            end_time=archived_appt.end_time,
-                            status=archived_appt.status,
-                        )
-                    else:  # dependent
-                        DependentAppointment.objects.create(
-                            dependent_patient=restored_patient,
-                            doctor=doctor,
-                            start_time=archived_appt.start_time,
-                            end_time=archived_appt.end_time,
-                            status=archived_appt.status,
-                        )
-                    
-                    # DELETE the archived appointment after successful restoration
-                    archived_appt.delete()
-                    
-                except Exception as e:
-                    print(f"Error restoring appointment: {e}")
-                    continue
+            links = _archived_patient_links(archived_patient, patient_type)
             
-            # ========== RESTORE MEDICAL RECORDS ==========
-            # Restore medical records
-            archived_medical_records = ArchivedMedicalRecord.objects.filter(
-                patient_id_str=archived_patient.original_patient_id
+            # Appointments whose doctor no longer exists stay archived
+            ArchiveService.bulk_restore_appointments(
+                ArchivedAppointment.objects.filter(**links).values_list('pk', flat=True)
             )
             
-            for archived_record in archived_medical_records:
-                # Restore medical record
-                if patient_type == 'self':
-                    medical_record = MedicalRecord.objects.create(
-                        patient=restored_patient,
-                        patient_id_str=archived_record.patient_id_str,
-                        reason_for_visit=archived_record.reason_for_visit,
-                        symptoms=archived_record.symptoms,
-                        diagnosis=archived_record.diagnosis,
-                        created_at=archived_record.created_at,
-                    )
-                else:
-                    medical_record = MedicalRecord.objects.create(
-                        dependent_patient=restored_patient,
-                        patient_id_str=archived_record.patient_id_str,
-                        reason_for_visit=archived_record.reason_for_visit,
-                        symptoms=archived_record.symptoms,
-                        diagnosis=archived_record.diagnosis,
-                        created_at=archived_record.created_at,
-                    )
-                
-                # Restore prescriptions for this record
-                if archived_record.prescriptions:
-                    for prescription_data in archived_record.prescriptions:
-                        Prescription.objects.create(
-                            medical_record=medical_record,
-                            medication_name=prescription_data.get('medication_name', ''),
-                            dosage=prescription_data.get('dosage', ''),
-                            frequency=prescription_data.get('frequency', ''),
-                            notes=prescription_data.get('notes', ''),
-                            prescribed_at=prescription_data.get('prescribed_at', timezone.now()),
-                        )
+            ArchiveService.bulk_restore_medical_records(
+                ArchivedMedicalRecord.objects.filter(**links),
+                patient=restored_patient if patient_type == 'self' else None,
+                dependent=restored_patient if patient_type == 'dependent' else None,
+            )
         
         # Restore medications and allergies from additional_data
         additional_data = archived_patient.additional_data or {}
         
         # Restore allergies
-        if additional_data.get('allergies'):
-            for allergy_data in additional_data['allergies']:
-                if patient_type == 'self':
-                    PatientAllergy.objects.create(
-                        patient=restored_patient,
-                        allergy_name=allergy_data.get('allergy_name', ''),
-                    )
-                else:
-                    DependentPatientAllergy.objects.create(
-                        dependent_patient=restored_patient,
-                        allergy_name=allergy_data.get('allergy_name', ''),
-                    )
+        if patient_type == 'self':
+            PatientAllergy.objects.bulk_create([
+                PatientAllergy(patient=restored_patient, allergy_name=allergy_data.get('allergy_name', ''))
+                for allergy_data in additional_data.get('allergies') or []
+            ])
+        else:
+            DependentPatientAllergy.objects.bulk_create([
+                DependentPatientAllergy(dependent_patient=restored_patient, allergy_name=allergy_data.get('allergy_name', ''))
+                for allergy_data in additional_data.get('allergies') or []
+            ])
         
         # Restore medications
-        if additional_data.get('medications'):
-            for med_data in additional_data['medications']:
-                prescribed_at = med_data.get('prescribed_at', '')
-                try:
-                    # Parse ISO format datetime string
-                    if prescribed_at:
-                        from dateutil import parser
-                        prescribed_at = parser.isoparse(prescribed_at)
-                    else:
-                        prescribed_at = timezone.now()
-                except:
-                    prescribed_at = timezone.now()
-                
-                if patient_type == 'self':
-                    PatientMedication.objects.create(
-                        patient=restored_patient,
-                        medication_name=med_data.get('medication_name', ''),
-                        dosage=med_data.get('dosage', ''),
-                        frequency=med_data.get('frequency', ''),
-                        prescribed_at=prescribed_at,
-                    )
+        medications = []
+        for med_data in additional_data.get('medications') or []:
+            prescribed_at = med_data.get('prescribed_at', '')
+            try:
+                # Parse ISO format datetime string
+                if prescribed_at:
+                    from dateutil import parser
+                    prescribed_at = parser.isoparse(prescribed_at)
                 else:
-                    DependentPatientMedication.objects.create(
-                        dependent_patient=restored_patient,
-                        medication_name=med_data.get('medication_name', ''),
-                        dosage=med_data.get('dosage', ''),
-                        frequency=med_data.get('frequency', ''),
-                        prescribed_at=prescribed_at,
-                    )
+                    prescribed_at = timezone.now()
+            except:
+                prescribed_at = timezone.now()
+            
+            fields = dict(
+                medication_name=med_data.get('medication_name', ''),
+                dosage=med_data.get('dosage', ''),
+                frequency=med_data.get('frequency', ''),
+                prescribed_at=prescribed_at,
+            )
+            if patient_type == 'self':
+                medications.append(PatientMedication(patient=restored_patient, **fields))
+            else:
+                medications.append(DependentPatientMedication(dependent_patient=restored_patient, **fields))
+        
+        if medications:
+            type(medications[0]).objects.bulk_create(medications)
         
         # Restore vitals
         if additional_data.get('latest_vitals') and restore_records:
@@ -1010,7 +1035,7 @@ def restore_patient(request, pk, patient_type='self'):
                 )
         
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action_type='create',
             model_name=f"{'PatientInfo' if patient_type == 'self' else 'DependentPatient'} (Restored)",
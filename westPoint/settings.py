@@ -114,6 +114,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'website.middleware.ActivityLogMiddleware',
 ]
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -204,3 +205,41 @@ STATICFILES_DIRS = [
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Background archival (python manage.py archive_worker)
+ARCHIVE_WORKER_ROWS_PER_SEC = 50
+ARCHIVE_WORKER_BATCH_SIZE = 200
+ARCHIVE_WORKER_QUIET_HOURS = os.environ.get('ARCHIVE_WORKER_QUIET_HOURS', '22:00-06:00')
+
+# Cold-storage tier for aged archive rows (python manage.py tier_archives)
+ARCHIVE_COLD_STORAGE_DIR = os.environ.get('ARCHIVE_COLD_STORAGE_DIR', str(BASE_DIR / 'cold_storage'))
+ARCHIVE_COLD_AFTER_DAYS = 365
+
+# How appointments are archived: 'copy' moves them into ArchivedAppointment,
+# 'flag' stamps archived_at on the live row (single UPDATE, instant restore)
+ARCHIVE_STRATEGY = os.environ.get('ARCHIVE_STRATEGY', 'copy')
+
+# Monthly partitioning of append-only tables on PostgreSQL (python manage.py manage_partitions)
+PARTITION_MONTHS_AHEAD = 3
+# Months of partitions to keep per table; None keeps everything
+PARTITION_RETENTION_MONTHS = {'activity_log': 24, 'archived_appointments': None}
+# Recent-activity feeds read one month at a time, looking back at most this far
+RECENT_ACTIVITY_MONTHS = 12
+
+# Where buffered activity log entries are written: 'request' (one bulk insert
+# at the end of each request) or 'thread' (handed to a background writer)
+ACTIVITY_LOG_WRITER = os.environ.get('ACTIVITY_LOG_WRITER', 'request')
+
+# Calendar event feeds: widest window served per request, and per-source event cap
+CALENDAR_MAX_RANGE_DAYS = 62
+CALENDAR_MAX_EVENTS = 2000
+# Delta sync (calendar/changes/): client poll interval and how long tombstones are kept
+CALENDAR_SYNC_INTERVAL_SECONDS = 5
+CALENDAR_SYNC_RETENTION_DAYS = 7
+
+# Doctor .ics subscription feeds: days of appointments before and after today
+ICS_FEED_PAST_DAYS = 30
+ICS_FEED_FUTURE_DAYS = 180
+
+# Rendered patient details panels; entries are keyed by the patient's version stamp
+PATIENT_DETAILS_CACHE_SECONDS = 24 * 60 * 60